@@ -0,0 +1,460 @@
+"""
+Latency and query plans of every Database method at production scale.
+
+Generates a dataset of --messages messages (most sharing a pool of
+announcement payloads), --templates templates, --welcome welcome configs
+plus retries, idempotency keys, sessions, import jobs, channel health,
+channel webhooks and analytics rows, then times each public Database
+method over --samples calls (schema setup is timed as one 'open';
+store_payload and hydrate_messages only run inside the methods that use
+them). The SQL each method runs is captured
+through a trace callback and checked with EXPLAIN QUERY PLAN: full table
+scans, full index scans and temporary sort B-trees are flagged.
+
+Results are compared against bench/baselines/bench_db.json; a method is a
+regression when its median is more than --tolerance slower than the
+baseline (and by more than --floor ms), or when it gains a scan the
+baseline did not have. The script exits non-zero on regressions. Timings
+are machine-specific: record a baseline on the machine you compare on.
+
+    python bench/bench_db.py --db /tmp/bench.db               # generate once, reuse afterwards
+    python bench/bench_db.py --db /tmp/bench.db --update-baseline
+    python bench/bench_db.py --messages 100000 --templates 10000 --welcome 1000 --samples 50
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import time
+import uuid
+
+from common import REPO_ROOT, load_main, percentile
+from payload_storage import WORDS, make_payloads
+
+BASELINE_PATH = os.path.join(REPO_ROOT, 'bench', 'baselines', 'bench_db.json')
+
+# Plan steps that are the point of the query rather than a missing index
+EXPECTED_PLAN = {
+    'get_user_ids': ('SCAN users',),  # returns every user by design
+    'get_live_workers': ('SCAN shard_workers', 'USE TEMP B-TREE FOR ORDER BY'),  # one row per worker process
+    'get_channel_webhooks': ('SCAN channel_webhooks',),  # loaded whole once per process
+    'get_channel_health all': ('SCAN channel_health',),
+    'search_messages': ('USE TEMP B-TREE FOR ORDER BY',),  # bm25 rank is computed per match
+    'search_templates': ('USE TEMP B-TREE FOR ORDER BY',),
+}
+
+SCAN_RE = re.compile(r'^SCAN ([\w.]+)(?: USING (?:COVERING )?INDEX (\w+))?')
+# Statements issued by SQLite itself (trigger bodies, FTS5 shadow tables) are not ours to plan
+SKIP_SQL = ('--', 'BEGIN', 'COMMIT', 'ROLLBACK', 'PRAGMA', 'SAVEPOINT', 'RELEASE', 'CREATE', 'DROP', 'ANALYZE')
+SHADOW_TABLE_RE = re.compile(r"'?\w+_fts_(?:config|data|idx|docsize|content)'?")
+USER_BASE = 10**17
+
+
+def populate(db, args, rng):
+    """Bulk-load the dataset through executemany in 10k-row batches"""
+    now = int(time.time())
+    payloads = make_payloads(rng, 300)
+    conn = db.get_connection()
+    c = conn.cursor()
+
+    c.executemany('INSERT INTO users (id, username, access_token, refresh_token, expires_at) VALUES (?, ?, ?, ?, ?)',
+                  [(USER_BASE + u, f"user{u}", 'token', 'refresh', now + rng.randint(-3600, 7 * 86400))
+                   for u in range(args.users)])
+
+    def batches(rows, sql):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= 10000:
+                c.executemany(sql, batch)
+                batch = []
+        if batch:
+            c.executemany(sql, batch)
+
+    def messages():
+        for i in range(args.messages):
+            if rng.random() < 0.1:
+                content, embed_json, files_json = f"One-off {i} " + ' '.join(rng.choice(WORDS) for _ in range(8)), '[]', '[]'
+            else:
+                content, embed_json, files_json = rng.choice(payloads)
+            digest = db.store_payload(c, content, embed_json, files_json)
+            roll = rng.random()
+            # ~2% scheduled for later, a trickle due now, the rest delivered or failed
+            if roll < 0.02:
+                status, scheduled = 'pending', now + rng.randint(60, 30 * 86400)
+            elif roll < 0.025:
+                status, scheduled = 'pending', now - rng.randint(1, 3600)
+            elif roll < 0.05:
+                status, scheduled = 'failed', None
+            else:
+                status, scheduled = 'sent', None
+            guild_id = str(rng.randrange(args.welcome) << 22 | rng.randrange(1 << 22))
+            channels = json.dumps([str(rng.randrange(1000)) for _ in range(rng.randint(1, 3))])
+            yield (USER_BASE + rng.randrange(args.users), guild_id, channels, digest, scheduled, status,
+                   now - (args.messages - i) * 3)
+
+    batches(messages(), '''INSERT INTO messages (user_id, guild_id, channel_id, payload_hash, scheduled_time, status, created_at)
+                           VALUES (?, ?, ?, ?, ?, ?, ?)''')
+    batches(((USER_BASE + rng.randrange(args.users), f"Template {t} " + rng.choice(WORDS),
+              ' '.join(rng.choice(WORDS) for _ in range(rng.randint(10, 60))), rng.choice(payloads)[1])
+             for t in range(args.templates)),
+            'INSERT INTO templates (user_id, name, content, embed_data) VALUES (?, ?, ?, ?)')
+    batches(((str(g), str(rng.randrange(1000)), 'Welcome {user} to {server}!', '[]', int(rng.random() < 0.8),
+              USER_BASE + rng.randrange(args.users)) for g in range(args.welcome)),
+            '''INSERT INTO welcome_config (guild_id, channel_id, message, embed_data, enabled, created_by)
+               VALUES (?, ?, ?, ?, ?, ?)''')
+    batches(((rng.randrange(1, args.messages + 1), USER_BASE + rng.randrange(args.users), '1', '1', 'Retry', '[]', '[]',
+              rng.randint(1, 5), now + rng.randint(-600, 3600), '503', rng.choice(('pending', 'pending', 'dead', 'sent')))
+             for _ in range(args.messages // 50)),
+            '''INSERT INTO delivery_retries (message_id, user_id, guild_id, channel_id, content, embed_data, files,
+                                             attempts, next_attempt_at, last_error, status)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''')
+    batches(((USER_BASE + rng.randrange(args.users), '/api/send', str(uuid.UUID(int=rng.getrandbits(128))), 'hash',
+              200, '{}', now - rng.randint(0, 2 * 86400)) for _ in range(args.messages // 20)),
+            '''INSERT OR IGNORE INTO idempotency_keys (user_id, endpoint, key, request_hash, status_code, response, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)''')
+    batches(((uuid.UUID(int=rng.getrandbits(128)).hex, USER_BASE + rng.randrange(args.users), '{}',
+              now + rng.randint(-86400, 30 * 86400)) for _ in range(args.users * 2)),
+            'INSERT INTO sessions (id, user_id, data, expires_at) VALUES (?, ?, ?, ?)')
+    batches(((str(uuid.UUID(int=rng.getrandbits(128))), USER_BASE + rng.randrange(args.users), 'jsonl', 'done',
+              rng.randint(1000, 10**7)) for _ in range(args.users)),
+            'INSERT INTO import_jobs (id, user_id, format, status, rows_imported) VALUES (?, ?, ?, ?, ?)')
+    batches(((str(c_id), str(rng.randrange(args.welcome)), rng.randint(1, 8), 'Channel not found', now + 3600)
+             for c_id in rng.sample(range(10**6), args.welcome // 10)),
+            'INSERT INTO channel_health (channel_id, guild_id, failures, reason, probe_at) VALUES (?, ?, ?, ?, ?)')
+    batches(((str(c_id), str(rng.randrange(args.welcome)), str(c_id + 1), 'token', rng.choice(('bot', 'webhook', None)))
+             for c_id in rng.sample(range(10**6), args.welcome)),
+            '''INSERT INTO channel_webhooks (channel_id, guild_id, webhook_id, webhook_token, backend)
+               VALUES (?, ?, ?, ?, ?)''')
+    c.executemany('INSERT INTO analytics (date, messages_sent, files_sent) VALUES (?, ?, ?)',
+                  [(time.strftime('%Y-%m-%d', time.localtime(now - d * 86400)), rng.randint(0, 5000), rng.randint(0, 50))
+                   for d in range(365)])
+    conn.commit()
+    c.execute('ANALYZE')
+    conn.commit()
+    conn.close()
+
+
+def cases(db, args, rng):
+    """(name, make) pairs; make() sets up untimed state and returns the call to time
+
+    A make may instead return (call, after): after(result) restores state untimed.
+    """
+    now = int(time.time())
+    user = lambda: USER_BASE + rng.randrange(args.users)
+    message_id = lambda: rng.randrange(1, args.messages + 1)
+    guild = lambda: str(rng.randrange(args.welcome))
+    word = lambda: rng.choice(WORDS)
+
+    def owned_message():
+        conn = db.get_connection()
+        row = conn.execute('SELECT id, user_id FROM messages WHERE id = ?', (message_id(),)).fetchone()
+        conn.close()
+        return tuple(row)
+
+    def page_two():
+        uid = user()
+        first = db.get_message_history(uid)
+        cursor = (first[-1]['created_at'], first[-1]['id']) if first else (now, 1 << 62)
+        return lambda: db.get_message_history(uid, before=cursor)
+
+    def claim_messages():
+        # Put claimed rows back so every sample sees the same backlog
+        def after(rows):
+            for row in rows:
+                db.release_message(row['id'], 'bench', 'pending')
+        return lambda: db.claim_pending_messages('bench', 300, 50), after
+
+    def release_message():
+        msg_id = message_id()
+        db.update_message_status(msg_id, 'in_flight')
+        return lambda: db.release_message(msg_id, 'bench', 'sent', now)
+
+    def delete_template():
+        uid = user()
+        template_id = db.save_template(uid, 'Scratch', 'Delete me', [])
+        return lambda: db.delete_template(template_id, uid)
+
+    def claimed_retry():
+        retry_id = db.enqueue_retry(user(), '1', '1', 'Retry', [], [], '503', now - 1, message_id())
+        conn = db.get_connection()
+        conn.execute("UPDATE delivery_retries SET status = 'in_flight', lease_owner = 'bench' WHERE id = ?", (retry_id,))
+        conn.commit()
+        conn.close()
+        return retry_id
+
+    def requeue_delivery():
+        uid = user()
+        retry_id = db.enqueue_retry(uid, '1', '1', 'Retry', [], [], '503', now, message_id())
+        conn = db.get_connection()
+        conn.execute("UPDATE delivery_retries SET status = 'dead' WHERE id = ?", (retry_id,))
+        conn.commit()
+        conn.close()
+        return lambda: db.requeue_delivery(retry_id, uid)
+
+    def reserved_key(then):
+        uid, key = user(), str(uuid.uuid4())
+        db.reserve_idempotency_key(uid, '/api/send', key, 'hash')
+        return lambda: then(uid, '/api/send', key)
+
+    def claim_retries():
+        def after(rows):
+            for row in rows:
+                db.reschedule_retry(row['id'], 'bench', row['next_attempt_at'] - 60, row['last_error'])
+        return lambda: db.claim_due_retries('bench', 60, 50), after
+
+    def renew_leases():
+        def after(rows):
+            for row in rows:
+                db.release_message(row['id'], 'bench', 'pending')
+        rows = db.claim_pending_messages('bench', 300, 50)
+        return (lambda: db.renew_message_leases([row['id'] for row in rows] or [0], 'bench', 300)), lambda _: after(rows)
+
+    def cancel_series():
+        uid = user()
+        msg_id = db.save_message(uid, '1', ['1'], 'Every week', [], [], now + 86400, '{"cron": "0 9 * * 1"}')
+        return lambda: db.cancel_series(msg_id, uid)
+
+    def import_rows():
+        uid = user()
+        rows = [('1', '["1"]', f"Imported {word()} {i}", '[]', '[]', now + 86400) for i in range(100)]
+        return lambda: db.import_messages(uid, rows)
+
+    def disable_welcome():
+        g = guild()
+        db.save_welcome_config(g, f"bench-{g}", 'Hi {user}', [], True, 1)
+        return lambda: db.disable_welcome_config(f"bench-{g}", 'Channel not found')
+
+    def import_job(then):
+        uid, job_id = user(), str(uuid.uuid4())
+        # Jobs left 'queued' would block the next create for the same user
+        db.create_import_job(job_id, uid, 'jsonl')
+        db.update_import_job(job_id, 'done')
+        return lambda: then(job_id, uid)
+
+    def create_job():
+        job_id = str(uuid.uuid4())
+        return (lambda: db.create_import_job(job_id, user(), 'jsonl')), lambda _: db.update_import_job(job_id, 'done')
+
+    def session(then):
+        session_id = uuid.uuid4().hex
+        db.save_session(session_id, user(), '{}', now + 86400)
+        return lambda: then(session_id)
+
+    def claim_tokens():
+        def after(rows):
+            conn = db.get_connection()
+            conn.executemany('UPDATE users SET refresh_after = NULL WHERE id = ?', [(row['id'],) for row in rows])
+            conn.commit()
+            conn.close()
+        return lambda: db.claim_expiring_tokens(now + 86400, 300, 50), after
+
+    return [
+        ('open (schema + indexes)', lambda: lambda: type(db)(db.db_path)),
+        ('save_user', lambda: (lambda uid: lambda: db.save_user(uid, 'bench', None, 'token', 'refresh', now + 3600))(user())),
+        ('get_user', lambda: (lambda uid: lambda: db.get_user(uid))(user())),
+        ('get_user_ids', lambda: db.get_user_ids),
+        ('claim_expiring_tokens', claim_tokens),
+        ('save_refreshed_token', lambda: (lambda uid: lambda: db.save_refreshed_token(uid, 'refresh', 'token', 'refresh',
+                                                                                      now + 3600))(user())),
+        ('token_refresh_failed', lambda: (lambda uid: lambda: db.token_refresh_failed(uid, now + 300))(user())),
+        ('drop_refresh_token', lambda: (lambda uid: lambda: db.drop_refresh_token(uid, 'no-such-token'))(user())),
+        ('save_message', lambda: (lambda uid: lambda: db.save_message(uid, '1', ['1', '2'], f"Bench {word()}", [], []))(user())),
+        ('save_message scheduled', lambda: (lambda uid: lambda: db.save_message(uid, '1', ['1'], 'Later', [], [], now + 86400))(user())),
+        ('import_messages 100 rows', import_rows),
+        ('claim_pending_messages', claim_messages),
+        ('renew_message_leases', renew_leases),
+        ('release_message', release_message),
+        ('get_message', lambda: (lambda row: lambda: db.get_message(row[0], row[1]))(owned_message())),
+        ('cancel_series', cancel_series),
+        ('update_message_status', lambda: (lambda mid: lambda: db.update_message_status(mid, 'sent', now))(message_id())),
+        ('get_user_messages', lambda: (lambda uid: lambda: db.get_user_messages(uid))(user())),
+        ('get_message_history', lambda: (lambda uid: lambda: db.get_message_history(uid))(user())),
+        ('get_message_history page 2', page_two),
+        ('get_message_history status', lambda: (lambda uid: lambda: db.get_message_history(uid, status='failed'))(user())),
+        ('get_message_history channel', lambda: (lambda uid: lambda: db.get_message_history(uid, channel_id='7'))(user())),
+        ('search_messages', lambda: (lambda uid, w: lambda: db.search_messages(uid, w))(user(), word())),
+        ('save_template', lambda: (lambda uid: lambda: db.save_template(uid, f"Bench {word()}", 'Body', []))(user())),
+        ('get_user_templates', lambda: (lambda uid: lambda: db.get_user_templates(uid))(user())),
+        ('search_templates', lambda: (lambda uid, w: lambda: db.search_templates(uid, w))(user(), word())),
+        ('delete_template', delete_template),
+        ('save_welcome_config', lambda: (lambda g: lambda: db.save_welcome_config(g, '1', 'Hi {user}', [], True, 1))(guild())),
+        ('get_welcome_config', lambda: (lambda g: lambda: db.get_welcome_config(g))(guild())),
+        ('disable_welcome_config', disable_welcome),
+        ('get_channel_health', lambda: (lambda g: lambda: db.get_channel_health(g))(guild())),
+        ('get_channel_health all', lambda: db.get_channel_health),
+        ('save_channel_health', lambda: lambda: db.save_channel_health(rng.randrange(10**6), guild(), 1, 'Channel not found',
+                                                                       now + 60)),
+        ('clear_channel_health', lambda: lambda: db.clear_channel_health(rng.randrange(10**6))),
+        ('get_channel_webhooks', lambda: db.get_channel_webhooks),
+        ('save_channel_webhook', lambda: lambda: db.save_channel_webhook(rng.randrange(10**6), guild(), 1, 'token')),
+        ('set_channel_backend', lambda: lambda: db.set_channel_backend(rng.randrange(10**6), guild(), 'webhook')),
+        ('enqueue_retry', lambda: lambda: db.enqueue_retry(user(), '1', '1', 'Retry', [], [], '503', now + 60, message_id())),
+        ('claim_due_retries', claim_retries),
+        ('reschedule_retry', lambda: (lambda rid: lambda: db.reschedule_retry(rid, 'bench', now + 60, '503'))(claimed_retry())),
+        ('finish_retry', lambda: (lambda rid: lambda: db.finish_retry(rid, 'bench', 'dead', '404'))(claimed_retry())),
+        ('get_dead_deliveries', lambda: (lambda uid: lambda: db.get_dead_deliveries(uid))(user())),
+        ('requeue_delivery', requeue_delivery),
+        ('reserve_idempotency_key', lambda: lambda: db.reserve_idempotency_key(user(), '/api/send', str(uuid.uuid4()), 'hash')),
+        ('complete_idempotency_key', lambda: reserved_key(lambda *key: db.complete_idempotency_key(*key, 200, {'ok': True}))),
+        ('release_idempotency_key', lambda: reserved_key(db.release_idempotency_key)),
+        ('purge_idempotency_keys', lambda: lambda: db.purge_idempotency_keys(now - 86400)),
+        ('create_import_job', create_job),
+        ('update_import_job', lambda: import_job(lambda job_id, uid: db.update_import_job(job_id, 'done', rows_read=10,
+                                                                                            rows_imported=10, errors=[]))),
+        ('get_import_job', lambda: import_job(db.get_import_job)),
+        ('save_session', lambda: lambda: db.save_session(uuid.uuid4().hex, user(), '{}', now + 86400)),
+        ('get_session', lambda: session(db.get_session)),
+        ('touch_session', lambda: session(lambda sid: db.touch_session(sid, now + 2 * 86400))),
+        ('delete_session', lambda: session(db.delete_session)),
+        ('delete_user_sessions', lambda: (lambda uid: lambda: db.delete_user_sessions(uid))(user())),
+        ('purge_sessions', lambda: lambda: db.purge_sessions(now - 86400)),
+        ('save_worker_heartbeat', lambda: lambda: db.save_worker_heartbeat(f"worker-{rng.randrange(4)}", 'http://w', 4,
+                                                                           [0, 1], True, {})),
+        ('get_live_workers', lambda: db.get_live_workers),
+        ('update_analytics', lambda: lambda: db.update_analytics(1, 0)),
+        ('get_analytics', lambda: db.get_analytics),
+    ]
+
+
+def traced(db, statements):
+    """Wrap db.get_connection so every statement it runs is appended to statements"""
+    original = db.get_connection
+
+    def get_connection():
+        conn = original()
+        conn.set_trace_callback(statements.append)
+        return conn
+    db.get_connection = get_connection
+    return original
+
+
+def plan_flags(conn, statements):
+    """EXPLAIN QUERY PLAN each distinct statement; returns sorted scan/sort flags"""
+    flags = set()
+    for sql in dict.fromkeys(s.strip() for s in statements):
+        if not sql or sql.upper().startswith(SKIP_SQL) or SHADOW_TABLE_RE.search(sql):
+            continue
+        try:
+            rows = conn.execute('EXPLAIN QUERY PLAN ' + sql).fetchall()
+        except sqlite3.Error:
+            continue
+        for row in rows:
+            detail = row[3]
+            match = SCAN_RE.match(detail)
+            # SCAN CONSTANT ROW is an INSERT ... SELECT without a FROM, not a table
+            if match and 'VIRTUAL TABLE' not in detail and not match.group(1).startswith(('json_each', 'CONSTANT')):
+                flags.add(f"SCAN {match.group(1)}")
+            elif 'USE TEMP B-TREE' in detail:
+                flags.add(detail)
+    return sorted(flags)
+
+
+def unpack(made):
+    return made if isinstance(made, tuple) else (made, lambda result: None)
+
+
+def measure(db, args, rng):
+    results = {}
+    for name, make in cases(db, args, rng):
+        timings = []
+        for _ in range(args.samples):
+            call, after = unpack(make())
+            started = time.perf_counter()
+            result = call()
+            timings.append((time.perf_counter() - started) * 1000)
+            after(result)
+        timings.sort()
+
+        call, after = unpack(make())
+        statements = []
+        original = traced(db, statements)
+        try:
+            result = call()
+        finally:
+            db.get_connection = original
+        after(result)
+        conn = db.get_connection()
+        flags = [f for f in plan_flags(conn, statements) if f not in EXPECTED_PLAN.get(name, ())]
+        conn.close()
+        results[name] = {'p50_ms': round(percentile(timings, 50), 3), 'p99_ms': round(percentile(timings, 99), 3),
+                         'plan': flags}
+    return results
+
+
+def compare(results, baseline, args):
+    regressions = []
+    print(f"{'method':32} {'p50 ms':>9} {'p99 ms':>9} {'base p50':>9}  plan")
+    for name, result in results.items():
+        base = baseline.get('methods', {}).get(name)
+        notes = []
+        if base:
+            if result['p50_ms'] > base['p50_ms'] * (1 + args.tolerance) and result['p50_ms'] - base['p50_ms'] > args.floor:
+                notes.append(f"SLOWER x{result['p50_ms'] / max(base['p50_ms'], 1e-6):.1f}")
+            new_flags = [f for f in result['plan'] if f not in base['plan']]
+            if new_flags:
+                notes.append('NEW ' + '; '.join(new_flags))
+        if notes:
+            regressions.append(name)
+        print(f"{name:32} {result['p50_ms']:9.3f} {result['p99_ms']:9.3f} "
+              f"{base['p50_ms'] if base else float('nan'):9.3f}  {'; '.join(result['plan']) or 'ok'}"
+              + (f"  <-- {', '.join(notes)}" if notes else ''))
+    return regressions
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--templates', type=int, default=100000)
+    parser.add_argument('--welcome', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--db', help='dataset file; generated if missing, reused otherwise')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed relative slowdown of the median')
+    parser.add_argument('--floor', type=float, default=0.2, help='ignore slowdowns smaller than this many ms')
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    main = load_main()
+    path = os.path.abspath(args.db) if args.db else os.path.join(os.getcwd(), 'bench_db.db')
+    fresh = not os.path.exists(path)
+    db = main.Database(path)
+    if fresh:
+        started = time.perf_counter()
+        populate(db, args, rng)
+        print(f"generated {args.messages} messages, {args.templates} templates, {args.welcome} welcome configs "
+              f"in {time.perf_counter() - started:.1f}s ({os.path.getsize(path) / 1024 / 1024:.0f} MB)")
+    else:
+        print(f"reusing {path} ({os.path.getsize(path) / 1024 / 1024:.0f} MB)")
+
+    scale = {k: getattr(args, k) for k in ('messages', 'templates', 'welcome', 'users', 'samples')}
+    results = measure(db, args, rng)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('scale') != scale:
+            print(f"baseline was recorded at {baseline.get('scale')}; timings are not comparable, plans still are")
+            baseline = {'methods': {name: {**m, 'p50_ms': float('inf')} for name, m in baseline.get('methods', {}).items()}}
+    regressions = compare(results, baseline, args)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({'scale': scale, 'sqlite': sqlite3.sqlite_version, 'methods': results}, f, indent=2)
+            f.write('\n')
+        print(f"\nbaseline written to {args.baseline}")
+    elif regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_()
@@ -0,0 +1,193 @@
+"""
+End-to-end benchmark against the offline Discord stand-in.
+
+Starts bench/fake_discord.py in-process, points main.py at it through
+DISCORD_API_BASE / DISCORD_GATEWAY_URL, runs the real bot over the fake
+gateway, logs users in through the OAuth callback, then drives the
+dashboard API with concurrent clients:
+
+- guilds:   GET /api/guilds
+- send:     POST /api/send to --channels-per-send channels
+- schedule: POST /api/schedule due in two seconds, plus fire lag until
+            the fake receives each message
+- welcome:  GUILD_MEMBER_ADD over the gateway until the welcome message
+            reaches the fake REST API (one welcome channel per guild)
+
+Reports throughput and p50/p99 latency per phase. No network needed.
+
+    python bench/bench_e2e.py --users 20 --requests 200 --concurrency 8
+"""
+import argparse
+import itertools
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from common import load_main, percentile
+from fake_discord import FakeDiscord
+
+
+def run_phase(clients, requests, concurrency, call):
+    """Run call(client, n) requests times over concurrency threads; returns (seconds, latencies_ms, errors)"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = itertools.count()
+
+    def worker(client):
+        while True:
+            n = next(counter)
+            if n >= requests:
+                return
+            started = time.perf_counter()
+            status = call(client, n)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                if status >= 400:
+                    errors.append(status)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i in range(concurrency):
+            pool.submit(worker, clients[i % len(clients)])
+    return time.perf_counter() - started, sorted(latencies), errors
+
+
+def report(name, count, seconds, latencies, errors=()):
+    print(f"{name:10} {count:6d} in {seconds:6.2f}s  {count / seconds:8.1f}/s  "
+          f"p50 {percentile(latencies, 50):8.2f} ms  p99 {percentile(latencies, 99):8.2f} ms  errors {len(errors)}")
+
+
+def wait_for(predicate, timeout, interval=0.05):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(interval)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--guilds', type=int, default=5)
+    parser.add_argument('--channels', type=int, default=20)
+    parser.add_argument('--members', type=int, default=200)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--channels-per-send', type=int, default=3)
+    parser.add_argument('--joins', type=int, default=50)
+    parser.add_argument('--channel-limit', type=int, default=5, help='fake Discord messages per channel per window')
+    parser.add_argument('--channel-window', type=float, default=5.0)
+    parser.add_argument('--global-limit', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.005, help='fake Discord REST latency in seconds')
+    args = parser.parse_args()
+
+    fake = FakeDiscord(args.guilds, args.channels, args.members, args.users, args.channel_limit,
+                       args.channel_window, args.global_limit, args.latency).start_in_thread()
+    dashboard = load_main(
+        DISCORD_API_BASE=fake.api_base,
+        DISCORD_GATEWAY_URL=fake.gateway_url,
+        SCHEDULER_POLL_INTERVAL=0.5,
+        QUOTA_SEND_PER_MINUTE=10**6,
+        QUOTA_SEND_BURST=10**6,
+        QUOTA_SCHEDULE_PER_MINUTE=10**6,
+        QUOTA_SCHEDULE_BURST=10**6,
+        MAX_OUTBOUND_DEPTH=10**6,
+    )
+    dashboard.app.config['SESSION_COOKIE_SECURE'] = False
+
+    started = time.perf_counter()
+    threading.Thread(target=dashboard.bot_manager.run, daemon=True).start()
+    if not wait_for(lambda: dashboard.bot_manager.ready, 60):
+        raise SystemExit('bot did not become ready against the fake gateway')
+    # bot.run() installs discord.py's INFO logging; the fake's counters report handled 429s instead
+    logging.getLogger('discord').setLevel(logging.ERROR)
+    print(f"bot ready over fake gateway in {time.perf_counter() - started:.2f}s "
+          f"({args.guilds} guilds, {args.channels} channels, {args.members + args.users} members each)")
+
+    # OAuth login through the real callback
+    clients = []
+    login_times = []
+    for user_id in fake.user_ids:
+        client = dashboard.app.test_client()
+        t = time.perf_counter()
+        response = client.get(f"/callback?code=user-{user_id}")
+        login_times.append((time.perf_counter() - t) * 1000)
+        if response.status_code != 302 or '/dashboard' not in response.headers.get('Location', ''):
+            raise SystemExit(f"OAuth login failed for {user_id}: {response.status_code}")
+        clients.append(client)
+    report('login', len(login_times), sum(login_times) / 1000, sorted(login_times))
+
+    guilds = fake.guilds
+    channel_cycle = itertools.count()
+
+    def pick_channels(n):
+        guild = guilds[n % len(guilds)]
+        offset = next(channel_cycle)
+        channels = [str(guild['channels'][(offset + i) % len(guild['channels'])]) for i in range(args.channels_per_send)]
+        return str(guild['id']), channels
+
+    def get_guilds(client, n):
+        return client.get('/api/guilds').status_code
+
+    def send(client, n):
+        guild_id, channel_ids = pick_channels(n)
+        return client.post('/api/send', json={
+            'guild_id': guild_id, 'channel_ids': channel_ids, 'content': f"bench send {n}"
+        }, headers={'Idempotency-Key': str(uuid.uuid4())}).status_code
+
+    scheduled = {}
+
+    def schedule(client, n):
+        guild_id, channel_ids = pick_channels(n)
+        due = int(time.time()) + 2
+        scheduled[f"bench schedule {n}"] = due
+        return client.post('/api/schedule', json={
+            'guild_id': guild_id, 'channel_ids': channel_ids[:1], 'content': f"bench schedule {n}", 'scheduled_time': due
+        }, headers={'Idempotency-Key': str(uuid.uuid4())}).status_code
+
+    print()
+    report('guilds', args.requests, *run_phase(clients, args.requests, args.concurrency, get_guilds))
+
+    before = len(fake.messages)
+    seconds, latencies, errors = run_phase(clients, args.requests, args.concurrency, send)
+    report('send', args.requests, seconds, latencies, errors)
+    print(f"{'':10} {len(fake.messages) - before} channel messages delivered, "
+          f"{(len(fake.messages) - before) / seconds:.1f}/s")
+
+    seconds, latencies, errors = run_phase(clients, args.requests, args.concurrency, schedule)
+    report('schedule', args.requests, seconds, latencies, errors)
+    fired = lambda: sum(1 for _, _, content in fake.messages if content in scheduled)
+    wait_for(lambda: fired() >= len(scheduled), 60 + args.requests / 10)
+    wall_offset = time.time() - time.perf_counter()
+    lags = sorted((received + wall_offset - scheduled[content]) * 1000
+                  for received, _, content in fake.messages if content in scheduled)
+    print(f"{'fire lag':10} {len(lags):6d} fired of {len(scheduled)}  "
+          f"p50 {percentile(lags, 50):8.2f} ms  p99 {percentile(lags, 99):8.2f} ms  (due time to Discord receipt)")
+
+    # Welcome: every guild configured, members join round-robin over the gateway
+    for guild in guilds:
+        response = clients[0].post('/api/welcome/config', json={
+            'guild_id': str(guild['id']), 'channel_id': str(guild['channels'][0]),
+            'message': 'Welcome {user} to {server}!', 'embeds': [], 'enabled': True
+        })
+        if response.status_code != 200:
+            raise SystemExit(f"welcome config failed: {response.status_code} {response.get_data(as_text=True)}")
+    started = time.perf_counter()
+    for n in range(args.joins):
+        fake.call(fake.member_add(n % len(guilds)))
+    wait_for(lambda: len(fake.welcome_latencies) >= args.joins, 60 + args.joins)
+    seconds = time.perf_counter() - started
+    report('welcome', len(fake.welcome_latencies), seconds, sorted(l * 1000 for l in fake.welcome_latencies))
+
+    print(f"\nfake Discord 429s: {json.dumps(dict(fake.rate_limited))}")
+    print(f"outbound queue: {json.dumps(dashboard.outbound_queue.metrics())}")
+
+
+if __name__ == '__main__':
+    main()
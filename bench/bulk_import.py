@@ -0,0 +1,93 @@
+"""
+Bulk import throughput and memory versus one /api/schedule call per row.
+
+Writes --rows campaign rows as JSONL and as CSV, streams each file into
+POST /api/import through the Flask test client, polls the job until it is
+done and reports wall time, rows/s and peak RSS growth. For comparison it
+schedules --baseline-rows rows one /api/schedule request at a time and
+extrapolates to --rows.
+
+    python bench/bulk_import.py --rows 100000
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+
+from common import load_main
+from payload_storage import WORDS
+
+
+def write_rows(path, fmt, rows, rng):
+    now = int(time.time())
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f) if fmt == 'csv' else None
+        if writer:
+            writer.writerow(['guild_id', 'channel_ids', 'content', 'embeds', 'scheduled_time'])
+        for i in range(rows):
+            channels = [str(1000 + rng.randrange(50)) for _ in range(rng.randint(1, 3))]
+            content = f"Campaign {i % 20}: " + ' '.join(rng.choice(WORDS) for _ in range(rng.randint(10, 40)))
+            due = now + 3600 + i
+            if writer:
+                writer.writerow(['1', ';'.join(channels), content, '', due])
+            else:
+                f.write(json.dumps({'guild_id': '1', 'channel_ids': channels, 'content': content, 'scheduled_time': due}) + '\n')
+    return os.path.getsize(path)
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--baseline-rows', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # Quotas are lifted so this measures import throughput; under the defaults imports are paced by them
+    dashboard = load_main(QUOTA_SCHEDULE_PER_MINUTE=10**9, QUOTA_SCHEDULE_BURST=10**9, IMPORT_MAX_ROWS=10**7)
+    dashboard.app.config['SESSION_COOKIE_SECURE'] = False
+    dashboard.shard_router.bot_ready = lambda: True
+    client = dashboard.app.test_client()
+    with client.session_transaction() as s:
+        s['user_id'], s['username'], s['avatar'] = 42, 'bench', None
+
+    workdir = tempfile.mkdtemp(prefix='bulk-import-')
+    for fmt, content_type in (('jsonl', 'application/x-ndjson'), ('csv', 'text/csv')):
+        path = os.path.join(workdir, f"rows.{fmt}")
+        size = write_rows(path, fmt, args.rows, rng)
+        rss_before = max_rss_mb()
+        started = time.perf_counter()
+        with open(path, 'rb') as body:
+            response = client.post('/api/import', input_stream=body, content_length=size, content_type=content_type)
+        if response.status_code != 202:
+            raise SystemExit(f"import rejected: {response.status_code} {response.get_data(as_text=True)}")
+        accepted = time.perf_counter() - started
+        while True:
+            job = client.get(response.json['status_url']).json['job']
+            if job['status'] in ('done', 'failed'):
+                break
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        print(f"{fmt:5} {size / 1024 / 1024:6.1f} MB  accepted in {accepted * 1000:6.0f} ms  "
+              f"{job['rows_imported']} rows in {elapsed:5.2f}s  {job['rows_imported'] / elapsed:8.0f} rows/s  "
+              f"rejected {job['rows_failed']}  peak RSS +{max_rss_mb() - rss_before:.0f} MB")
+
+    now = int(time.time())
+    started = time.perf_counter()
+    for i in range(args.baseline_rows):
+        client.post('/api/schedule', json={'guild_id': '1', 'channel_ids': ['1000'], 'content': f"Campaign row {i}",
+                                           'scheduled_time': now + 3600 + i})
+    per_row = (time.perf_counter() - started) / args.baseline_rows
+    print(f"\n/api/schedule per row: {per_row * 1000:.2f} ms -> {args.rows} rows in ~{per_row * args.rows:.0f}s")
+
+
+if __name__ == '__main__':
+    main_()
@@ -0,0 +1,33 @@
+"""Shared helpers for the benchmark scripts: import main.py against a scratch directory."""
+import os
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BENCH_ENV = {
+    'DISCORD_CLIENT_ID': 'bench-client',
+    'DISCORD_CLIENT_SECRET': 'bench-secret',
+    'DISCORD_BOT_TOKEN': 'bench-token',
+    'FLASK_SECRET_KEY': 'bench-secret-key-with-enough-length',
+    'DISCORD_REDIRECT_URI': 'http://127.0.0.1/callback',
+}
+
+
+def load_main(workdir=None, **env):
+    """Import main.py with placeholder credentials; its dashboard.db lands in workdir"""
+    workdir = workdir or tempfile.mkdtemp(prefix='dashboard-bench-')
+    os.chdir(workdir)
+    for key, value in {**BENCH_ENV, **env}.items():
+        os.environ.setdefault(key, str(value))
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    import main
+    return main
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, -(-q * len(sorted_values) // 100) - 1))
+    return sorted_values[int(index)]
@@ -0,0 +1,69 @@
+"""
+Time-to-first-byte and bytes-per-page-load of /dashboard.
+
+Renders the dashboard through the Flask test client for a logged-in
+user, follows every <link href>/<script src> the page references, and
+reports server time until the response is ready plus bytes on the wire
+for a cold load (page + assets) and a warm load (assets already cached),
+with and without compression.
+
+    python bench/dashboard_page.py --requests 500
+"""
+import argparse
+import re
+import time
+import zlib
+
+from common import load_main, percentile
+
+ASSET_RE = re.compile(r'(?:href|src)="(/assets/[^"]+)"')
+
+
+def decoded(response):
+    encoding = response.headers.get('Content-Encoding')
+    if encoding == 'gzip':
+        return zlib.decompress(response.data, 31).decode()
+    if encoding == 'br':
+        import brotli
+        return brotli.decompress(response.data).decode()
+    return response.get_data(as_text=True)
+
+
+def page_load(client, encoding):
+    headers = {'Accept-Encoding': encoding} if encoding else {}
+    page = client.get('/dashboard', headers=headers)
+    assets = [client.get(url, headers=headers) for url in ASSET_RE.findall(decoded(page))]
+    cacheable = all('immutable' in a.headers.get('Cache-Control', '') for a in assets)
+    cold = len(page.data) + sum(len(a.data) for a in assets)
+    return cold, len(page.data), cacheable
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    dashboard = load_main()
+    dashboard.app.config['SESSION_COOKIE_SECURE'] = False
+    dashboard.shard_router.bot_ready = lambda: True
+    for i in range(10):
+        dashboard.db.save_template(42, f"Template {i}", 'Announcement text ' * 20, [])
+
+    client = dashboard.app.test_client()
+    with client.session_transaction() as s:
+        s['user_id'], s['username'], s['avatar'] = 42, 'bench', None
+
+    for encoding in (None, 'gzip', 'br'):
+        timings = []
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            client.get('/dashboard', headers={'Accept-Encoding': encoding} if encoding else {})
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        cold, warm, cacheable = page_load(client, encoding)
+        print(f"{encoding or 'identity':8} ttfb p50 {percentile(timings, 50):6.2f} ms  p99 {percentile(timings, 99):6.2f} ms  "
+              f"cold {cold / 1024:7.1f} KB  warm {(warm if cacheable else cold) / 1024:7.1f} KB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,517 @@
+"""
+Local stand-in for Discord: REST, OAuth2 and a minimal gateway.
+
+Serves enough of the Discord API for main.py to log in, receive guilds,
+channels and members over the gateway, send messages, and complete the
+OAuth callback, all without network access.
+
+- REST: /gateway(/bot), /users/@me, /users/@me/guilds, /oauth2/token,
+  GET /channels/{id} and POST /channels/{id}/messages with per-channel and global rate limits
+  (X-RateLimit-* headers, 429 with Retry-After).
+- Webhooks: GET/POST /channels/{id}/webhooks and POST /webhooks/{id}/{token},
+  limited per webhook only, outside the bot's global limit.
+- Gateway: HELLO, heartbeat ACKs, READY, GUILD_CREATE per shard, member
+  chunk requests, and GUILD_MEMBER_ADD on demand via member_add().
+- OAuth: the authorization code "user-<id>" logs in as that user; refresh
+  tokens rotate and are single use.
+
+Run standalone and point the dashboard at it:
+
+    python bench/fake_discord.py --port 8765 --guilds 5 --users 20
+    DISCORD_API_BASE=http://127.0.0.1:8765/api/v10 \\
+    DISCORD_GATEWAY_URL=ws://127.0.0.1:8765/gateway python main.py
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from aiohttp import WSMsgType, web
+
+DISCORD_EPOCH = 1420070400000
+BOT_USER_ID = 900000000000000001
+FIRST_USER_ID = 100000000000000000
+SEND_PERMISSIONS = str((1 << 10) | (1 << 11))  # VIEW_CHANNEL | SEND_MESSAGES
+
+
+SNOWFLAKE_BASE = (int(time.time() * 1000) - DISCORD_EPOCH) << 22
+
+
+def snowflake(offset):
+    """Distinct snowflake ids whose shard ((id >> 22) % shards) varies with offset"""
+    return SNOWFLAKE_BASE + (offset << 22)
+
+
+def user_payload(user_id, bot=False):
+    return {
+        'id': str(user_id),
+        'username': 'dashboard-bot' if bot else f"user{user_id % 100000}",
+        'discriminator': '0',
+        'global_name': None,
+        'avatar': None,
+        'bot': bot,
+    }
+
+
+def member_payload(user_id):
+    return {
+        'user': user_payload(user_id),
+        'nick': None,
+        'roles': [],
+        'joined_at': '2024-01-01T00:00:00+00:00',
+        'deaf': False,
+        'mute': False,
+        'flags': 0,
+    }
+
+
+def json_response(data, status=200, headers=None):
+    # discord.py only decodes bodies whose Content-Type is exactly application/json
+    # and treats a 429 without a Via header as a Cloudflare ban rather than a rate limit
+    return web.Response(body=json.dumps(data).encode(), status=status,
+                        headers={**(headers or {}), 'Content-Type': 'application/json', 'Via': '1.1 google'})
+
+
+class RateLimiter:
+    """Fixed-window counters per bucket, reported the way Discord does"""
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.windows = {}  # bucket -> (window_start, count)
+
+    def hit(self, bucket):
+        """Return (allowed, remaining, reset_after)"""
+        now = time.monotonic()
+        start, count = self.windows.get(bucket, (now, 0))
+        if now - start >= self.window:
+            start, count = now, 0
+        reset_after = self.window - (now - start)
+        if count >= self.limit:
+            return False, 0, reset_after
+        self.windows[bucket] = (start, count + 1)
+        return True, self.limit - count - 1, reset_after
+
+
+class FakeDiscord:
+    """Discord REST, OAuth and gateway simulation backed by in-memory state"""
+
+    def __init__(self, guilds=5, channels=10, members=50, users=20, channel_limit=5, channel_window=5.0,
+                 global_limit=50, latency=0.0, webhook_limit=5, webhook_window=2.0):
+        self.latency = latency
+        self.channel_limits = RateLimiter(channel_limit, channel_window)
+        self.global_limits = RateLimiter(global_limit, 1.0)
+        self.webhook_limits = RateLimiter(webhook_limit, webhook_window)
+        self.user_ids = [FIRST_USER_ID + i for i in range(users)]
+        self.guilds = []
+        self.channel_guild = {}
+        for g in range(guilds):
+            guild_id = snowflake(g * 1000)
+            channel_ids = [snowflake(g * 1000 + 1 + c) for c in range(channels)]
+            for channel_id in channel_ids:
+                self.channel_guild[channel_id] = guild_id
+            member_ids = self.user_ids + [FIRST_USER_ID + users + g * members + m for m in range(members)]
+            self.guilds.append({'id': guild_id, 'name': f"Guild {g}", 'channels': channel_ids, 'members': member_ids})
+
+        self.sessions = {}  # id -> identified gateway connection
+        self.next_user_id = FIRST_USER_ID + users + guilds * members
+        self.next_message_id = 1
+        self.messages = []  # (received_at, channel_id, content)
+        self.webhooks = {}  # webhook_id -> {'channel_id', 'token', 'name'}
+        self.webhook_messages = 0
+        self.used_refresh_tokens = set()
+        self.token_refreshes = 0
+        self.pending_joins = {}  # user_id -> dispatched_at
+        self.welcome_latencies = []
+        self.rate_limited = defaultdict(int)  # 'channel' | 'global' | 'webhook' -> 429s returned
+        self.port = None
+        self.loop = None
+        self.runner = None
+
+    # ---- lifecycle -------------------------------------------------------
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/gateway', self.gateway)
+        app.router.add_get('/api/v10/gateway', self.get_gateway)
+        app.router.add_get('/api/v10/gateway/bot', self.get_gateway)
+        app.router.add_get('/api/v10/users/@me', self.get_me)
+        app.router.add_get('/api/v10/users/@me/guilds', self.get_my_guilds)
+        app.router.add_get('/api/v10/oauth2/applications/@me', self.get_application)
+        app.router.add_post('/api/v10/oauth2/token', self.oauth_token)
+        app.router.add_get('/api/v10/channels/{channel_id}', self.get_channel)
+        app.router.add_post('/api/v10/channels/{channel_id}/messages', self.create_message)
+        app.router.add_get('/api/v10/channels/{channel_id}/webhooks', self.get_webhooks)
+        app.router.add_post('/api/v10/channels/{channel_id}/webhooks', self.create_webhook)
+        app.router.add_post('/api/v10/webhooks/{webhook_id}/{token}', self.execute_webhook)
+        app.router.add_route('*', '/{tail:.*}', self.not_found)
+        return app
+
+    async def start(self, host='127.0.0.1', port=0):
+        self.loop = asyncio.get_running_loop()
+        self.runner = web.AppRunner(self.app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    def start_in_thread(self):
+        """Run on a private event loop thread; returns once the port is bound"""
+        started = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            started.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        started.wait()
+        return self
+
+    def call(self, coro):
+        """Run a coroutine on the fake's loop from another thread"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    @property
+    def api_base(self):
+        return f"http://127.0.0.1:{self.port}/api/v10"
+
+    @property
+    def gateway_url(self):
+        return f"ws://127.0.0.1:{self.port}/gateway"
+
+    # ---- REST ------------------------------------------------------------
+
+    def oauth_user(self, request):
+        token = request.headers.get('Authorization', '')
+        if token.startswith('Bearer token-user-'):
+            return int(token.rsplit('-', 1)[1])
+        return None
+
+    async def get_gateway(self, request):
+        return json_response({
+            'url': self.gateway_url,
+            'shards': 1,
+            'session_start_limit': {'total': 1000, 'remaining': 1000, 'reset_after': 0, 'max_concurrency': 16},
+        })
+
+    async def get_me(self, request):
+        if request.headers.get('Authorization', '').startswith('Bot '):
+            return json_response(user_payload(BOT_USER_ID, bot=True))
+        user_id = self.oauth_user(request)
+        if user_id is None:
+            return json_response({'message': '401: Unauthorized', 'code': 0}, status=401)
+        return json_response(user_payload(user_id))
+
+    async def get_my_guilds(self, request):
+        user_id = self.oauth_user(request)
+        if user_id is None:
+            return json_response({'message': '401: Unauthorized', 'code': 0}, status=401)
+        return json_response([
+            {'id': str(g['id']), 'name': g['name'], 'icon': None, 'owner': False, 'permissions': SEND_PERMISSIONS}
+            for g in self.guilds if user_id in g['members']
+        ])
+
+    async def get_application(self, request):
+        return json_response({
+            'id': str(BOT_USER_ID),
+            'name': 'Dashboard Bot',
+            'icon': None,
+            'description': '',
+            'rpc_origins': [],
+            'bot_public': True,
+            'bot_require_code_grant': False,
+            'verify_key': '0' * 64,
+            'owner': user_payload(FIRST_USER_ID),
+            'team': None,
+            'flags': 0,
+        })
+
+    async def oauth_token(self, request):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        form = await request.post()
+        if form.get('grant_type') == 'refresh_token':
+            # Refresh tokens are single use, as on Discord: "refresh-user-<id>[.<n>]" rotates to n + 1
+            token = form.get('refresh_token', '')
+            if not token.startswith('refresh-user-') or token in self.used_refresh_tokens:
+                return json_response({'error': 'invalid_grant'}, status=400)
+            self.used_refresh_tokens.add(token)
+            code, _, n = token[len('refresh-'):].partition('.')
+            self.token_refreshes += 1
+            return json_response({
+                'access_token': f"token-{code}",
+                'refresh_token': f"refresh-{code}.{int(n or 0) + 1}",
+                'token_type': 'Bearer',
+                'expires_in': 604800,
+                'scope': 'identify guilds',
+            })
+        code = form.get('code', '')
+        if not code.startswith('user-'):
+            return json_response({'error': 'invalid_grant', 'error_description': 'Invalid "code" in request.'}, status=400)
+        return json_response({
+            'access_token': f"token-{code}",
+            'refresh_token': f"refresh-{code}",
+            'token_type': 'Bearer',
+            'expires_in': 604800,
+            'scope': 'identify guilds',
+        })
+
+    async def get_channel(self, request):
+        channel_id = int(request.match_info['channel_id'])
+        guild_id = self.channel_guild.get(channel_id)
+        if guild_id is None:
+            return json_response({'message': 'Unknown Channel', 'code': 10003}, status=404)
+        position = next(g for g in self.guilds if g['id'] == guild_id)['channels'].index(channel_id)
+        return json_response({'id': str(channel_id), 'type': 0, 'guild_id': str(guild_id), 'name': f"channel-{position}",
+                              'position': position, 'permission_overwrites': []})
+
+    async def create_message(self, request):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        channel_id = int(request.match_info['channel_id'])
+        if channel_id not in self.channel_guild:
+            return json_response({'message': 'Unknown Channel', 'code': 10003}, status=404)
+
+        allowed, _, reset_after = self.global_limits.hit('global')
+        if not allowed:
+            self.rate_limited['global'] += 1
+            return json_response({'message': 'You are being rate limited.', 'retry_after': reset_after, 'global': True},
+                                     status=429, headers={'Retry-After': f"{reset_after:.3f}", 'X-RateLimit-Global': 'true',
+                                                          'X-RateLimit-Scope': 'global'})
+
+        allowed, remaining, reset_after = self.channel_limits.hit(channel_id)
+        headers = {
+            'X-RateLimit-Limit': str(self.channel_limits.limit),
+            'X-RateLimit-Remaining': str(remaining),
+            'X-RateLimit-Reset': f"{time.time() + reset_after:.3f}",
+            'X-RateLimit-Reset-After': f"{reset_after:.3f}",
+            'X-RateLimit-Bucket': f"channel-messages-{channel_id}",
+        }
+        if not allowed:
+            self.rate_limited['channel'] += 1
+            return json_response({'message': 'You are being rate limited.', 'retry_after': reset_after, 'global': False},
+                                     status=429, headers={**headers, 'Retry-After': f"{reset_after:.3f}", 'X-RateLimit-Scope': 'user'})
+
+        return json_response(self.record_message(channel_id, await self.message_payload(request)), headers=headers)
+
+    async def message_payload(self, request):
+        if request.content_type.startswith('multipart/'):
+            form = await request.post()
+            return json.loads(form.get('payload_json') or '{}')
+        return await request.json()
+
+    def record_message(self, channel_id, payload, author=None):
+        """Store a delivered message and return it as Discord would"""
+        received_at = time.perf_counter()
+        content = payload.get('content') or ''
+        self.messages.append((received_at, channel_id, content))
+        for user_id, dispatched_at in list(self.pending_joins.items()):
+            if f"<@{user_id}>" in content:
+                self.welcome_latencies.append(received_at - self.pending_joins.pop(user_id))
+
+        message_id = snowflake(10**6 + self.next_message_id)
+        self.next_message_id += 1
+        return {
+            'id': str(message_id),
+            'channel_id': str(channel_id),
+            'guild_id': str(self.channel_guild[channel_id]),
+            'author': author or user_payload(BOT_USER_ID, bot=True),
+            'content': content,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'edited_timestamp': None,
+            'tts': False,
+            'mention_everyone': False,
+            'mentions': [],
+            'mention_roles': [],
+            'attachments': [],
+            'embeds': payload.get('embeds') or [],
+            'pinned': False,
+            'type': 0,
+        }
+
+    def webhook_payload(self, webhook_id):
+        webhook = self.webhooks[webhook_id]
+        return {
+            'id': str(webhook_id),
+            'type': 1,
+            'token': webhook['token'],
+            'channel_id': str(webhook['channel_id']),
+            'guild_id': str(self.channel_guild[webhook['channel_id']]),
+            'name': webhook['name'],
+            'avatar': None,
+            'application_id': str(BOT_USER_ID),
+            'user': user_payload(BOT_USER_ID, bot=True),
+        }
+
+    async def get_webhooks(self, request):
+        channel_id = int(request.match_info['channel_id'])
+        if channel_id not in self.channel_guild:
+            return json_response({'message': 'Unknown Channel', 'code': 10003}, status=404)
+        return json_response([self.webhook_payload(w) for w, hook in self.webhooks.items() if hook['channel_id'] == channel_id])
+
+    async def create_webhook(self, request):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        channel_id = int(request.match_info['channel_id'])
+        if channel_id not in self.channel_guild:
+            return json_response({'message': 'Unknown Channel', 'code': 10003}, status=404)
+        payload = await request.json()
+        webhook_id = snowflake(2 * 10**6 + len(self.webhooks))
+        self.webhooks[webhook_id] = {'channel_id': channel_id, 'token': f"hook-{webhook_id}",
+                                     'name': payload.get('name') or 'Webhook'}
+        return json_response(self.webhook_payload(webhook_id))
+
+    async def execute_webhook(self, request):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        webhook_id = int(request.match_info['webhook_id'])
+        webhook = self.webhooks.get(webhook_id)
+        if not webhook or webhook['token'] != request.match_info['token']:
+            return json_response({'message': 'Unknown Webhook', 'code': 10015}, status=404)
+
+        allowed, remaining, reset_after = self.webhook_limits.hit(webhook_id)
+        headers = {
+            'X-RateLimit-Limit': str(self.webhook_limits.limit),
+            'X-RateLimit-Remaining': str(remaining),
+            'X-RateLimit-Reset': f"{time.time() + reset_after:.3f}",
+            'X-RateLimit-Reset-After': f"{reset_after:.3f}",
+            'X-RateLimit-Bucket': f"webhook-{webhook_id}",
+        }
+        if not allowed:
+            self.rate_limited['webhook'] += 1
+            return json_response({'message': 'You are being rate limited.', 'retry_after': reset_after, 'global': False},
+                                     status=429, headers={**headers, 'Retry-After': f"{reset_after:.3f}", 'X-RateLimit-Scope': 'shared'})
+
+        payload = await self.message_payload(request)
+        self.webhook_messages += 1
+        message = self.record_message(webhook['channel_id'], payload,
+                                      {**user_payload(webhook_id, bot=True), 'username': webhook['name']})
+        if request.query.get('wait') == 'true':
+            return json_response({**message, 'webhook_id': str(webhook_id)}, headers=headers)
+        return web.Response(status=204, headers=headers)
+
+    async def not_found(self, request):
+        return json_response({'message': '404: Not Found', 'code': 0}, status=404)
+
+    # ---- gateway ---------------------------------------------------------
+
+    def guild_create(self, guild):
+        return {
+            'id': str(guild['id']),
+            'name': guild['name'],
+            'icon': None,
+            'owner_id': str(BOT_USER_ID),
+            'member_count': len(guild['members']) + 1,
+            'large': False,
+            'unavailable': False,
+            'roles': [{'id': str(guild['id']), 'name': '@everyone', 'permissions': SEND_PERMISSIONS, 'position': 0,
+                       'color': 0, 'hoist': False, 'managed': False, 'mentionable': False}],
+            'channels': [{'id': str(channel_id), 'type': 0, 'name': f"channel-{i}", 'position': i,
+                          'permission_overwrites': []} for i, channel_id in enumerate(guild['channels'])],
+            'members': [member_payload(BOT_USER_ID)] + [member_payload(user_id) for user_id in guild['members']],
+        }
+
+    async def gateway(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        session = {'seq': 0}
+
+        async def dispatch(event, data):
+            session['seq'] += 1
+            await ws.send_str(json.dumps({'op': 0, 't': event, 's': session['seq'], 'd': data}))
+
+        session['dispatch'] = dispatch
+        await ws.send_str(json.dumps({'op': 10, 'd': {'heartbeat_interval': 41250}}))
+
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                payload = json.loads(msg.data)
+                op, data = payload.get('op'), payload.get('d')
+                if op == 1:
+                    # A little latency, as over a real network; an instant ACK can beat discord.py's
+                    # own send bookkeeping and read as a huge heartbeat delay
+                    self.loop.call_later(0.02, lambda: asyncio.ensure_future(ws.send_str(json.dumps({'op': 11}))))
+                elif op == 2:
+                    shard_id, shard_count = data.get('shard') or (0, 1)
+                    guilds = [g for g in self.guilds if (g['id'] >> 22) % shard_count == shard_id]
+                    await dispatch('READY', {
+                        'v': 10,
+                        'user': user_payload(BOT_USER_ID, bot=True),
+                        'guilds': [{'id': str(g['id']), 'unavailable': True} for g in guilds],
+                        'session_id': f"fake-session-{id(ws)}",
+                        'resume_gateway_url': self.gateway_url,
+                        'shard': [shard_id, shard_count],
+                        'application': {'id': str(BOT_USER_ID), 'flags': 0},
+                    })
+                    for guild in guilds:
+                        await dispatch('GUILD_CREATE', self.guild_create(guild))
+                    session['guilds'] = {g['id'] for g in guilds}
+                    self.sessions[id(session)] = session
+                elif op == 8:
+                    guild_id = int(data['guild_id'])
+                    guild = next((g for g in self.guilds if g['id'] == guild_id), None)
+                    wanted = {int(u) for u in data.get('user_ids') or []}
+                    members = [member_payload(u) for u in (guild['members'] if guild else []) if not wanted or u in wanted]
+                    await dispatch('GUILD_MEMBERS_CHUNK', {
+                        'guild_id': str(guild_id),
+                        'members': members,
+                        'chunk_index': 0,
+                        'chunk_count': 1,
+                        'not_found': [str(u) for u in wanted - {int(m['user']['id']) for m in members}],
+                        'nonce': data.get('nonce'),
+                    })
+                elif op == 6:
+                    await ws.send_str(json.dumps({'op': 9, 'd': False}))
+        finally:
+            self.sessions.pop(id(session), None)
+        return ws
+
+    async def member_add(self, guild_index=0):
+        """Create a member in a guild and dispatch GUILD_MEMBER_ADD; returns the new user id"""
+        guild = self.guilds[guild_index]
+        user_id = self.next_user_id
+        self.next_user_id += 1
+        guild['members'].append(user_id)
+        self.pending_joins[user_id] = time.perf_counter()
+        for session in list(self.sessions.values()):
+            if guild['id'] in session.get('guilds', ()):
+                await session['dispatch']('GUILD_MEMBER_ADD', {**member_payload(user_id), 'guild_id': str(guild['id'])})
+        return user_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--guilds', type=int, default=5)
+    parser.add_argument('--channels', type=int, default=10)
+    parser.add_argument('--members', type=int, default=50)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--channel-limit', type=int, default=5, help='messages per channel per window')
+    parser.add_argument('--channel-window', type=float, default=5.0)
+    parser.add_argument('--global-limit', type=int, default=50, help='requests per second across all routes')
+    parser.add_argument('--latency', type=float, default=0.0, help='added REST latency in seconds')
+    args = parser.parse_args()
+
+    fake = FakeDiscord(args.guilds, args.channels, args.members, args.users, args.channel_limit,
+                       args.channel_window, args.global_limit, args.latency)
+
+    async def serve():
+        await fake.start(port=args.port)
+        print(f"DISCORD_API_BASE={fake.api_base}")
+        print(f"DISCORD_GATEWAY_URL={fake.gateway_url}")
+        print(f"Log in at /callback?code=user-{fake.user_ids[0]} (any of {len(fake.user_ids)} users)")
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Bot event-loop lag under send load, and blocking-call detection.
+
+Runs the real bot against bench/fake_discord.py, drives POST /api/send for
+--seconds and reports the loop lag distribution the watchdog exports in
+/api/metrics. Then schedules a coroutine on the bot loop that does
+--block-ms of synchronous SQLite work, the kind of call that silently
+delays gateway heartbeats, and prints what GET /api/admin/loop-blocks
+captured for it.
+
+    python bench/loop_watchdog.py --seconds 10
+"""
+import argparse
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+
+from bench_e2e import wait_for
+from common import load_main
+from fake_discord import FakeDiscord
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--block-ms', type=int, default=600)
+    parser.add_argument('--threshold-ms', type=int, default=100)
+    args = parser.parse_args()
+
+    fake = FakeDiscord(2, 20, 50, 1, channel_limit=50, global_limit=500).start_in_thread()
+    dashboard = load_main(DISCORD_API_BASE=fake.api_base, DISCORD_GATEWAY_URL=fake.gateway_url,
+                          LOOP_BLOCK_MS=args.threshold_ms, QUOTA_SEND_PER_MINUTE=10**6, QUOTA_SEND_BURST=10**6,
+                          SEND_RATE_PER_SECOND=400)
+    dashboard.app.config['SESSION_COOKIE_SECURE'] = False
+    user_id = fake.user_ids[0]
+    dashboard.config.admin_user_ids.add(user_id)
+
+    threading.Thread(target=dashboard.bot_manager.run, daemon=True).start()
+    if not wait_for(lambda: dashboard.bot_manager.ready, 60):
+        raise SystemExit('bot did not become ready against the fake gateway')
+    logging.getLogger('discord').setLevel(logging.ERROR)
+    client = dashboard.app.test_client()
+    client.get(f"/callback?code=user-{user_id}")
+
+    guild = fake.guilds[0]
+    before = len(fake.messages)
+    deadline = time.perf_counter() + args.seconds
+    while time.perf_counter() < deadline:
+        client.post('/api/send', json={'guild_id': str(guild['id']), 'channel_ids': [str(c) for c in guild['channels']],
+                                       'content': 'loop lag probe'}, headers={'Idempotency-Key': str(uuid.uuid4())})
+    print(f"{len(fake.messages) - before} messages sent in {args.seconds:g}s")
+    print(f"bot loop: {json.dumps(client.get('/api/metrics').json['bot_loop'])}")
+
+    async def nightly_report():
+        started = time.monotonic()
+        while time.monotonic() - started < args.block_ms / 1000:
+            dashboard.db.get_message_history(user_id)
+
+    asyncio.run_coroutine_threadsafe(nightly_report(), dashboard.bot_manager.bot.loop).result()
+    time.sleep(args.threshold_ms / 1000 + dashboard.config.loop_lag_interval * 2)
+    block = client.get('/api/admin/loop-blocks').json['blocks'][0]
+    print(f"\ncaptured block: coroutine {block['coroutine']}, stalled {block['stalled_ms']}ms+ at capture, "
+          f"lasted {block['duration_ms']}ms")
+    print(block['stack'].rstrip().split('\n')[-4:][0])
+    print(f"lag after: {json.dumps(client.get('/api/metrics').json['bot_loop']['lag_ms'])}")
+
+
+if __name__ == '__main__':
+    main_()
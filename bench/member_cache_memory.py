@@ -0,0 +1,94 @@
+"""
+Memory footprint of the member cache for a synthetic large guild.
+
+Builds a GUILD_CREATE payload with N members (default 100k) and loads it
+into a discord.py connection state under each MEMBER_CACHE_POLICY, then
+reports the traced allocation that stays resident.
+
+    python bench/member_cache_memory.py --members 100000 --dashboard-users 500
+"""
+import argparse
+import gc
+import tracemalloc
+
+import discord
+
+
+def synthetic_guild(guild_id, member_count):
+    members = []
+    for i in range(member_count):
+        user_id = 10**17 + i
+        members.append({
+            'user': {
+                'id': str(user_id),
+                'username': f'member{i}',
+                'discriminator': '0',
+                'global_name': f'Member {i}',
+                'avatar': None,
+            },
+            'nick': None,
+            'roles': [],
+            'joined_at': '2024-01-01T00:00:00+00:00',
+            'deaf': False,
+            'mute': False,
+            'flags': 0,
+        })
+    return {
+        'id': str(guild_id),
+        'name': 'Synthetic Guild',
+        'owner_id': str(10**17),
+        'member_count': member_count,
+        'large': True,
+        'roles': [{'id': str(guild_id), 'name': '@everyone', 'permissions': '3072', 'position': 0,
+                   'color': 0, 'hoist': False, 'managed': False, 'mentionable': False}],
+        'channels': [{'id': str(guild_id + 1), 'type': 0, 'name': 'general', 'position': 0,
+                      'permission_overwrites': []}],
+        'members': members,
+    }
+
+
+def measure(policy, payload, dashboard_user_ids):
+    intents = discord.Intents.default()
+    intents.members = True
+    if policy == 'full':
+        flags = discord.MemberCacheFlags.from_intents(intents)
+    else:
+        flags = discord.MemberCacheFlags.none()
+    client = discord.Client(intents=intents, member_cache_flags=flags)
+    state = client._connection
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    guild = state._add_guild_from_data(payload)
+    if policy == 'dashboard':
+        # Dashboard users are the only members the bot pins in the guild cache
+        for mdata in payload['members']:
+            if int(mdata['user']['id']) in dashboard_user_ids:
+                guild._add_member(discord.Member(data=mdata, guild=guild, state=state))
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return size, len(guild._members)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--members', type=int, default=100_000)
+    parser.add_argument('--dashboard-users', type=int, default=500)
+    args = parser.parse_args()
+
+    dashboard_user_ids = {10**17 + i * 97 for i in range(args.dashboard_users)}
+    print(f"Synthetic guild: {args.members:,} members, {args.dashboard_users:,} dashboard users\n")
+    print(f"{'policy':<12}{'cached members':>16}{'resident':>14}")
+    for policy in ('full', 'dashboard'):
+        payload = synthetic_guild(10**18, args.members)
+        size, cached = measure(policy, payload, dashboard_user_ids)
+        del payload
+        print(f"{policy:<12}{cached:>16,}{size / 1024 / 1024:>11.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
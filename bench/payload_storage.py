@@ -0,0 +1,116 @@
+"""
+Storage and read latency of inline message payloads versus the
+content-addressed message_payloads table.
+
+Generates ROWS messages where most rows reuse a pool of announcement
+templates, stores them once inline (the pre-payload layout) and once
+through Database.store_payload, then reports database size and
+get_user_messages latency for both.
+
+    python bench/payload_storage.py --rows 1000000
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+from common import load_main, percentile
+
+
+def make_payloads(rng, templates):
+    payloads = []
+    for i in range(templates):
+        content = f"📢 Announcement #{i}: " + ' '.join(rng.choice(WORDS) for _ in range(rng.randint(30, 120)))
+        embeds = [{
+            'title': f"Weekly update {i}",
+            'description': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 80))),
+            'color': '#5865f2',
+            'fields': [{'name': f"Field {n}", 'value': rng.choice(WORDS), 'inline': n % 2 == 0} for n in range(rng.randint(0, 4))],
+            'footer': {'text': 'Discord Dashboard'},
+            'timestamp': True
+        }]
+        payloads.append((content, json.dumps(embeds), json.dumps([])))
+    return payloads
+
+
+WORDS = ('server', 'event', 'tonight', 'giveaway', 'update', 'rules', 'welcome', 'patch', 'notes', 'join',
+         'voice', 'stage', 'community', 'reminder', 'tournament', 'prize', 'schedule', 'moderators', 'please', 'read')
+
+
+def populate(main, db, rows, users, payloads, unique_ratio, inline, rng):
+    conn = db.get_connection()
+    c = conn.cursor()
+    now = int(time.time())
+    batch = []
+    for i in range(rows):
+        if rng.random() < unique_ratio:
+            content, embed_json, files_json = f"One-off message {i} " + rng.choice(WORDS) * 5, '[]', '[]'
+        else:
+            content, embed_json, files_json = rng.choice(payloads)
+        user_id = rng.randrange(users)
+        created = now - (rows - i)
+        if inline:
+            batch.append((user_id, '1', '["1"]', content, embed_json, files_json, None, 'sent', created))
+        else:
+            digest = db.store_payload(c, content, embed_json, files_json)
+            batch.append((user_id, '1', '["1"]', digest, None, 'sent', created))
+        if len(batch) >= 10000:
+            flush(c, batch, inline)
+            batch = []
+    flush(c, batch, inline)
+    conn.commit()
+    c.execute('VACUUM')
+    conn.close()
+
+
+def flush(c, batch, inline):
+    if not batch:
+        return
+    if inline:
+        c.executemany('''INSERT INTO messages (user_id, guild_id, channel_id, content, embed_data, files, scheduled_time, status, created_at)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''', batch)
+    else:
+        c.executemany('''INSERT INTO messages (user_id, guild_id, channel_id, payload_hash, scheduled_time, status, created_at)
+                         VALUES (?, ?, ?, ?, ?, ?, ?)''', batch)
+
+
+def time_reads(db, users, samples, rng):
+    timings = []
+    for _ in range(samples):
+        user_id = rng.randrange(users)
+        start = time.perf_counter()
+        db.get_user_messages(user_id)
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--templates', type=int, default=300)
+    parser.add_argument('--unique-ratio', type=float, default=0.1)
+    parser.add_argument('--samples', type=int, default=500)
+    args = parser.parse_args()
+
+    main = load_main()
+    payloads = make_payloads(random.Random(1), args.templates)
+
+    print(f"{args.rows:,} messages, {args.users:,} users, {args.templates} templates, {args.unique_ratio:.0%} unique\n")
+    print(f"{'layout':<22}{'db size':>12}{'read p50':>12}{'read p99':>12}")
+    for label, inline, compression in (('inline (before)', True, 'none'),
+                                       ('payloads, raw', False, 'none'),
+                                       ('payloads, zlib', False, 'zlib')):
+        main.config.payload_compression = compression
+        path = os.path.abspath(f"bench-{'inline' if inline else 'payloads'}-{compression}.db")
+        db = main.Database(path)
+        populate(main, db, args.rows, args.users, payloads, args.unique_ratio, inline, random.Random(2))
+        timings = time_reads(db, args.users, args.samples, random.Random(3))
+        size = os.path.getsize(path) / 1024 / 1024
+        print(f"{label:<22}{size:>9.1f} MB{percentile(timings, 50):>9.2f} ms{percentile(timings, 99):>9.2f} ms")
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main_()
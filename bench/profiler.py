@@ -0,0 +1,106 @@
+"""
+Sampling profiler overhead and slow-request capture.
+
+Drives --threads request threads at GET /api/metrics and GET /api/history
+for --seconds, first alone and then while POST /api/admin/profile samples
+the process, and reports the throughput cost of profiling and the cost
+of one sampling pass. Then calls an async bench-only route that sleeps
+and runs a slow SQLite query past SLOW_REQUEST_MS and prints the stacks
+GET /api/admin/slow-requests captured for it.
+
+    python bench/profiler.py --threads 8 --seconds 5
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+from common import load_main
+
+ADMIN_ID = 42
+
+
+def hammer(app, seconds, threads):
+    """Requests per second from `threads` clients over `seconds`"""
+    done = []
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        client = login(app)
+        n = 0
+        while time.perf_counter() < deadline:
+            client.get('/api/metrics' if n % 2 else '/api/history')
+            n += 1
+        done.append(n)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return sum(done) / seconds
+
+
+def login(app):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s['user_id'], s['username'], s['avatar'] = ADMIN_ID, 'admin', None
+    return client
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--interval-ms', type=float, default=5)
+    parser.add_argument('--slow-ms', type=int, default=100)
+    args = parser.parse_args()
+
+    dashboard = load_main(ADMIN_USER_IDS=ADMIN_ID, SLOW_REQUEST_MS=args.slow_ms)
+    app = dashboard.app
+    app.config['SESSION_COOKIE_SECURE'] = False
+
+    @app.route('/bench/slow')
+    async def bench_slow():
+        await asyncio.sleep(args.slow_ms / 1000)
+        conn = dashboard.db.get_connection()
+        conn.execute('WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 2000000) '
+                     'SELECT SUM(i) FROM n').fetchone()
+        conn.close()
+        return {'ok': True}
+
+    baseline = hammer(app, args.seconds, args.threads)
+
+    profile = {}
+    profiler = threading.Thread(target=lambda: profile.update(response=login(app).post(
+        f"/api/admin/profile?seconds={args.seconds}&interval_ms={args.interval_ms}")))
+    profiler.start()
+    profiled = hammer(app, args.seconds, args.threads)
+    profiler.join()
+    response = profile['response']
+    lines = response.get_data(as_text=True).splitlines()
+    passes = int(response.headers['X-Profile-Passes'])
+
+    started = time.perf_counter()
+    _, tight_passes = dashboard.sampling_profiler.profile(1.0, 0)
+    pass_ms = (time.perf_counter() - started) * 1000 / tight_passes
+
+    print(f"baseline {baseline:8.0f} req/s  ({args.threads} request threads)")
+    print(f"profiled {profiled:8.0f} req/s  ({(1 - profiled / baseline) * 100:+.1f}% cost) "
+          f"at {args.interval_ms:g} ms: {passes} passes, {len(lines)} distinct stacks, {pass_ms:.3f} ms per pass")
+    print('\nhottest stacks:')
+    for line in lines[:3]:
+        stack, count = line.rsplit(' ', 1)
+        print(f"  {count:>6}  ...{stack[-150:]}")
+
+    client = login(app)
+    client.get('/bench/slow')
+    slow = client.get('/api/admin/slow-requests').json['requests'][0]
+    print(f"\nslow request {slow['method']} {slow['path']} {slow['duration_ms']} ms, {slow['samples']} samples:")
+    for stack in slow['stacks'][:4]:
+        print(f"  {stack['samples']:>4}  ...{stack['stack'][-150:]}")
+    print(f"\nnon-admin: {app.test_client().post('/api/admin/profile?seconds=1').status_code} without login")
+
+
+if __name__ == '__main__':
+    main_()
@@ -0,0 +1,77 @@
+"""
+Next-fire cost of recurrence rules and pending-set size of long series.
+
+Times RecurrenceRule.next_fire for cron and interval rules (each call
+starts from the previous fire, as the scheduler does), then runs --series
+recurring series through --fires claim/release cycles of the real
+Database and reports how many pending rows exist afterwards: one per
+series, however long the series has run.
+
+    python bench/recurrence.py --calls 100000 --series 200 --fires 50
+"""
+import argparse
+import time
+
+from common import load_main
+
+RULES = (
+    {'cron': '*/5 * * * *', 'timezone': 'UTC'},
+    {'cron': '0 9 * * mon-fri', 'timezone': 'Europe/Berlin'},
+    {'cron': '30 2 * * *', 'timezone': 'Europe/Berlin'},  # hits both DST transitions
+    {'cron': '0 12 29 2 *', 'timezone': 'UTC'},           # leap days only
+    {'every': 6, 'unit': 'hours', 'timezone': 'UTC'},
+    {'every': 2, 'unit': 'weeks', 'timezone': 'America/New_York'},
+)
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=100000)
+    parser.add_argument('--series', type=int, default=200)
+    parser.add_argument('--fires', type=int, default=50)
+    args = parser.parse_args()
+
+    main = load_main(RECURRENCE_MIN_INTERVAL=60)
+    start = int(time.time())
+    for spec in RULES:
+        rule = main.RecurrenceRule.parse({'start': start, **spec})
+        fire = start
+        started = time.perf_counter()
+        for _ in range(args.calls):
+            fire = rule.next_fire(fire) or start
+        elapsed = time.perf_counter() - started
+        print(f"{rule.to_json():70} {elapsed / args.calls * 1e6:7.2f} us/call")
+
+    db = main.db
+    rule = main.RecurrenceRule.parse({'every': 1, 'unit': 'days', 'timezone': 'UTC', 'start': start + 60})
+    for n in range(args.series):
+        db.save_message(n, '1', ['1'], f"Daily announcement {n}", [], [], start + 60, rule.to_json())
+
+    started = time.perf_counter()
+    sent = 0
+    for _ in range(args.fires):
+        # Pretend the whole pending set is due, then fire it like deliver_scheduled does
+        conn = db.get_connection()
+        conn.execute("UPDATE messages SET scheduled_time = ? WHERE status = 'pending'", (start - 1,))
+        conn.commit()
+        conn.close()
+        while True:
+            claimed = db.claim_pending_messages('bench', 60, 500)
+            if not claimed:
+                break
+            for msg in claimed:
+                db.release_message(msg['id'], 'bench', 'sent', int(time.time()), main.DiscordBot.next_occurrence(msg))
+                sent += 1
+    elapsed = time.perf_counter() - started
+
+    conn = db.get_connection()
+    pending = conn.execute("SELECT COUNT(*) FROM messages WHERE status = 'pending'").fetchone()[0]
+    total = conn.execute('SELECT COUNT(*) FROM messages').fetchone()[0]
+    conn.close()
+    print(f"\n{args.series} series x {args.fires} fires: {sent} sends in {elapsed:.2f}s "
+          f"({elapsed / max(sent, 1) * 1000:.2f} ms each incl. next occurrence)")
+    print(f"pending rows {pending} (one per series), history rows {total}")
+
+
+if __name__ == '__main__':
+    main_()
@@ -0,0 +1,71 @@
+"""
+Cookie size and per-request overhead: signed-cookie versus server-side sessions.
+
+Logs a user in under each session interface, then times --requests
+authenticated GET /api/metrics calls through the Flask test client and
+reports the session cookie size, how many responses carried Set-Cookie
+and the request latency. Ends with logout-everywhere across --devices
+sessions.
+
+    python bench/sessions.py --requests 5000
+"""
+import argparse
+import time
+
+from flask.sessions import SecureCookieSessionInterface
+
+from common import load_main, percentile
+
+AVATAR = 'https://cdn.discordapp.com/avatars/123456789012345678/a_0123456789abcdef0123456789abcdef.png'
+
+
+def login(app, user_id=123456789012345678):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s['user_id'], s['username'], s['avatar'] = user_id, 'a-fairly-typical-username', AVATAR
+        s['csrf_token'] = 'bench-csrf'
+        s.permanent = True
+    return client
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--devices', type=int, default=5)
+    args = parser.parse_args()
+
+    dashboard = load_main()
+    app = dashboard.app
+    app.config['SESSION_COOKIE_SECURE'] = False
+    cookie_name = app.config['SESSION_COOKIE_NAME']
+
+    for label, interface in (('cookie', SecureCookieSessionInterface()),
+                             ('server', dashboard.ServerSessionInterface(dashboard.session_store))):
+        app.session_interface = interface
+        client = login(app)
+        cookie = client.get_cookie(cookie_name).value
+        latencies = []
+        set_cookie = 0
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            response = client.get('/api/metrics')
+            latencies.append((time.perf_counter() - started) * 1000)
+            set_cookie += 'Set-Cookie' in response.headers
+            if response.status_code != 200:
+                raise SystemExit(f"{label}: /api/metrics returned {response.status_code}")
+        latencies.sort()
+        print(f"{label:7} cookie {len(cookie):4d} bytes  Set-Cookie on {set_cookie:5d}/{args.requests}  "
+              f"mean {sum(latencies) / len(latencies):6.3f} ms  p50 {percentile(latencies, 50):6.3f} ms  "
+              f"p99 {percentile(latencies, 99):6.3f} ms")
+
+    clients = [login(app) for _ in range(args.devices)]
+    started = time.perf_counter()
+    clients[0].post('/logout/all', headers={'X-CSRF-Token': 'bench-csrf'})
+    elapsed = (time.perf_counter() - started) * 1000
+    still_in = sum(c.get('/api/metrics').status_code == 200 for c in clients)
+    print(f"\nlogout everywhere: {args.devices} sessions ended in {elapsed:.2f} ms, {still_in} still authenticated")
+    print(f"session store: {dashboard.session_store.metrics()}")
+
+
+if __name__ == '__main__':
+    main_()
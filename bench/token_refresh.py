@@ -0,0 +1,85 @@
+"""
+Background OAuth token refresh against the offline Discord stand-in.
+
+Loads --users users into a scratch database, --due of them with tokens
+inside the refresh margin and --bogus of those with refresh tokens the
+fake rejects, then drains the due set with two TokenRefresher instances
+racing each other (as two web processes would). Refresh tokens are single
+use on the fake, so any row refreshed twice shows up as a spurious
+revocation. Reports the claim query plan, refreshes per second, the
+refresher metrics and pooled versus per-call connections.
+
+    python bench/token_refresh.py --users 20000 --due 2000
+"""
+import argparse
+import threading
+import time
+
+import requests
+
+from common import load_main
+from fake_discord import FakeDiscord
+
+
+def drain(refresher):
+    while refresher.refresh_due():
+        pass
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--due', type=int, default=2000)
+    parser.add_argument('--bogus', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--batch', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.01, help='fake Discord REST latency in seconds')
+    parser.add_argument('--calls', type=int, default=300, help='requests for the pooled/unpooled comparison')
+    args = parser.parse_args()
+
+    fake = FakeDiscord(1, 1, 1, 1, latency=args.latency).start_in_thread()
+    dashboard = load_main(DISCORD_API_BASE=fake.api_base, TOKEN_REFRESH_WORKERS=args.workers,
+                          TOKEN_REFRESH_BATCH=args.batch)
+    db, config = dashboard.db, dashboard.config
+
+    now = int(time.time())
+    margin = config.token_refresh_margin
+    conn = db.get_connection()
+    conn.executemany('INSERT INTO users (id, username, access_token, refresh_token, expires_at) VALUES (?, ?, ?, ?, ?)', (
+        (u, f"user{u}", f"token-user-{u}", f"refresh-user-{u}" if u >= args.bogus else f"revoked-{u}",
+         # Due rows entered the refresh window up to ten minutes ago
+         now + margin - (u * 600 // args.due) if u < args.due else now + margin + 3600 + u)
+        for u in range(args.users)))
+    conn.commit()
+    plan = conn.execute('''EXPLAIN QUERY PLAN SELECT id FROM users
+                           WHERE refresh_token IS NOT NULL AND expires_at < ? AND COALESCE(refresh_after, 0) <= ?
+                           ORDER BY expires_at LIMIT ?''', (now + margin, now, args.batch)).fetchall()
+    conn.close()
+    print('claim plan: ' + '; '.join(row['detail'] for row in plan))
+
+    refreshers = [dashboard.TokenRefresher(args.workers) for _ in range(2)]
+    started = time.perf_counter()
+    threads = [threading.Thread(target=drain, args=(r,)) for r in refreshers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    totals = {key: sum(r.stats[key] for r in refreshers) for key in refreshers[0].stats}
+    print(f"{args.due} due of {args.users} users drained in {elapsed:.2f}s ({args.due / elapsed:.0f} tokens/s) "
+          f"by 2 refreshers x {args.workers} workers, batch {args.batch}")
+    print(f"totals {totals} (expected revoked {args.bogus}); fake served {fake.token_refreshes} refreshes")
+    for n, refresher in enumerate(refreshers):
+        print(f"refresher {n}: {refresher.metrics()}")
+
+    form = {'grant_type': 'authorization_code', 'code': 'user-1'}
+    for label, post in (('pooled', dashboard.DiscordOAuth.http.post), ('per-call', requests.post)):
+        started = time.perf_counter()
+        for _ in range(args.calls):
+            post(dashboard.DiscordOAuth.TOKEN_URL, data=form).json()
+        print(f"{label:9} {(time.perf_counter() - started) / args.calls * 1000:.2f} ms per token call")
+
+
+if __name__ == '__main__':
+    main_()
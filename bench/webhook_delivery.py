@@ -0,0 +1,84 @@
+"""
+Bot versus webhook delivery against the offline Discord stand-in.
+
+Starts bench/fake_discord.py in-process, runs the real bot over it, then
+broadcasts --sends messages through POST /api/send once per delivery
+backend, each send going to every channel of one guild. Reports
+delivered messages per second, send latency and the 429s the fake
+returned for each backend. The bot path shares one global budget; each
+webhook is limited on its own.
+
+    python bench/webhook_delivery.py --guilds 5 --channels 20 --sends 50
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+import uuid
+
+from bench_e2e import report, run_phase, wait_for
+from common import load_main
+from fake_discord import FakeDiscord
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--guilds', type=int, default=5)
+    parser.add_argument('--channels', type=int, default=20)
+    parser.add_argument('--sends', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--channel-limit', type=int, default=5, help='fake Discord bot messages per channel per window')
+    parser.add_argument('--channel-window', type=float, default=5.0)
+    parser.add_argument('--global-limit', type=int, default=50)
+    parser.add_argument('--webhook-limit', type=int, default=5, help='fake Discord messages per webhook per window')
+    parser.add_argument('--webhook-window', type=float, default=2.0)
+    parser.add_argument('--latency', type=float, default=0.005, help='fake Discord REST latency in seconds')
+    args = parser.parse_args()
+
+    fake = FakeDiscord(args.guilds, args.channels, 10, 1, args.channel_limit, args.channel_window, args.global_limit,
+                       args.latency, args.webhook_limit, args.webhook_window).start_in_thread()
+    dashboard = load_main(
+        DISCORD_API_BASE=fake.api_base,
+        DISCORD_GATEWAY_URL=fake.gateway_url,
+        QUOTA_SEND_PER_MINUTE=10**6,
+        QUOTA_SEND_BURST=10**6,
+        MAX_OUTBOUND_DEPTH=10**6,
+    )
+    dashboard.app.config['SESSION_COOKIE_SECURE'] = False
+
+    threading.Thread(target=dashboard.bot_manager.run, daemon=True).start()
+    if not wait_for(lambda: dashboard.bot_manager.ready, 60):
+        raise SystemExit('bot did not become ready against the fake gateway')
+    logging.getLogger('discord').setLevel(logging.ERROR)
+
+    client = dashboard.app.test_client()
+    if client.get(f"/callback?code=user-{fake.user_ids[0]}").status_code != 302:
+        raise SystemExit('OAuth login failed')
+
+    print(f"{args.sends} sends x {args.channels} channels per backend, bot global limit {args.global_limit}/s, "
+          f"webhook limit {args.webhook_limit}/{args.webhook_window:g}s each\n")
+    for backend in ('bot', 'webhook'):
+        # Let every fake rate-limit window expire so each backend starts fresh
+        time.sleep(max(args.channel_window, args.webhook_window))
+        limited = dict(fake.rate_limited)
+        before = len(fake.messages)
+
+        def send(client, n):
+            guild = fake.guilds[n % len(fake.guilds)]
+            return client.post('/api/send', json={
+                'guild_id': str(guild['id']), 'channel_ids': [str(c) for c in guild['channels']],
+                'content': f"{backend} send {n}", 'delivery': backend
+            }, headers={'Idempotency-Key': str(uuid.uuid4())}).status_code
+
+        seconds, latencies, errors = run_phase([client], args.sends, args.concurrency, send)
+        delivered = len(fake.messages) - before
+        report(backend, args.sends, seconds, latencies, errors)
+        print(f"{'':10} {delivered} channel messages, {delivered / seconds:.1f}/s, 429s "
+              f"{json.dumps({k: v - limited.get(k, 0) for k, v in fake.rate_limited.items()})}")
+
+    print(f"\nwebhooks created {len(fake.webhooks)}, delivery stats {json.dumps(dashboard.webhook_delivery.stats)}")
+
+
+if __name__ == '__main__':
+    main()
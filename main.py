@@ -7,15 +7,35 @@ import threading
 import time
 import asyncio
 import re
+import random
+import math
+import bisect
+import zoneinfo
+import csv
+import uuid
+import tempfile
+import secrets
+import traceback
 from datetime import datetime, timedelta
 from io import BytesIO
 from functools import wraps
-from flask import Flask, request, redirect, session, render_template_string, jsonify, send_from_directory, url_for
-from urllib.parse import urlencode
+from flask import Flask, Request, Response, g, request, redirect, session, jsonify, send_from_directory, url_for
+from flask.sessions import SecureCookieSession, SessionInterface
+from urllib.parse import urlencode, urlsplit, unquote
 import discord
+import aiohttp
+import yarl
 from discord.ext import commands, tasks
 import aiofiles
 import hashlib
+import base64
+import zlib
+import hmac
+import socket
+import subprocess
+import atexit
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections import OrderedDict, deque
 
 # ============================================================================
 # COMPLETE PRODUCTION CONFIGURATION
@@ -37,8 +57,125 @@ class Config:
         self.bot_token = os.environ.get('DISCORD_BOT_TOKEN')
         self.redirect_uri = os.environ.get('DISCORD_REDIRECT_URI', 'https://dashboard.digamber.in/callback')
         self.secret_key = os.environ.get('FLASK_SECRET_KEY')
+        
+        # Sessions: 'server' keeps them in SQLite behind an opaque cookie id, 'cookie' uses Flask's signed cookie
+        self.session_backend = os.environ.get('SESSION_BACKEND', 'server').lower()
+        self.session_cache_size = int(os.environ.get('SESSION_CACHE_SIZE', 10000))
+        # Seconds a hot-tier entry is trusted before re-reading it (bounds cross-process revocation delay)
+        self.session_hot_ttl = int(os.environ.get('SESSION_HOT_TTL', 30))
+        # Extend an unchanged session's expiry at most this often
+        self.session_touch_interval = int(os.environ.get('SESSION_TOUCH_INTERVAL', 3600))
         self.port = int(os.environ.get('PORT', 8080))
-        self.host = '0.0.0.0'
+        self.host = os.environ.get('HOST', '0.0.0.0')
+        
+        # Discord endpoints; point both at a local stand-in (bench/fake_discord.py) to run offline
+        self.discord_api_base = os.environ.get('DISCORD_API_BASE', 'https://discord.com/api/v10').rstrip('/')
+        self.discord_gateway_url = os.environ.get('DISCORD_GATEWAY_URL')
+        
+        # Sharding: SHARD_COUNT enables AutoShardedBot, SHARD_IDS limits this worker to a range
+        self.shard_count = int(os.environ['SHARD_COUNT']) if os.environ.get('SHARD_COUNT') else None
+        self.shard_ids = self.parse_shard_ids(os.environ.get('SHARD_IDS'))
+        self.shard_workers = int(os.environ.get('SHARD_WORKERS', 1))
+        # Process role: 'all' (web + bot), 'web' (routes to workers) or 'worker' (bot + internal API)
+        self.role = os.environ.get('ROLE', 'all').lower()
+        self.worker_id = os.environ.get('WORKER_ID', f"{socket.gethostname()}:{os.getpid()}")
+        self.worker_url = os.environ.get('WORKER_URL')
+        
+        # Scheduler: rows are claimed under a lease so several instances never double-send
+        self.scheduler_lease_seconds = int(os.environ.get('SCHEDULER_LEASE_SECONDS', 300))
+        self.scheduler_batch_size = int(os.environ.get('SCHEDULER_BATCH_SIZE', 50))
+        self.scheduler_poll_interval = float(os.environ.get('SCHEDULER_POLL_INTERVAL', 30))
+        # Recurring series: shortest allowed repeat interval (seconds)
+        self.recurrence_min_interval = int(os.environ.get('RECURRENCE_MIN_INTERVAL', 300))
+        
+        # Delivery retries and the shared outbound rate budget
+        self.retry_max_attempts = int(os.environ.get('RETRY_MAX_ATTEMPTS', 6))
+        self.retry_base_delay = float(os.environ.get('RETRY_BASE_DELAY', 5))
+        self.retry_max_delay = float(os.environ.get('RETRY_MAX_DELAY', 900))
+        self.send_rate_per_second = float(os.environ.get('SEND_RATE_PER_SECOND', 40))
+        
+        # Delivery backend: 'bot' (channel.send) or 'webhook' (a cached per-channel webhook, bot as fallback)
+        self.delivery_backend = os.environ.get('DELIVERY_BACKEND', 'bot').lower()
+        self.webhook_name = os.environ.get('WEBHOOK_NAME', 'Dashboard')
+        # Seconds before retrying webhook creation in a channel where it failed
+        self.webhook_retry_after = int(os.environ.get('WEBHOOK_RETRY_AFTER', 600))
+        
+        # Dead channels (missing, 403, 404) fail fast; probe again after base seconds, doubling up to max
+        self.channel_probe_base = int(os.environ.get('CHANNEL_PROBE_BASE', 60))
+        self.channel_probe_max = int(os.environ.get('CHANNEL_PROBE_MAX', 3600))
+        
+        # Outbound send queue: concurrent senders and per-user fair-share weights ("user_id:weight,...")
+        self.send_concurrency = int(os.environ.get('SEND_CONCURRENCY', 8))
+        self.send_user_weights = {
+            int(user_id): int(weight)
+            for user_id, weight in (pair.split(':') for pair in os.environ.get('SEND_USER_WEIGHTS', '').split(',') if pair)
+        }
+        
+        # Admission control: per-user quotas (deliveries per minute, burst) and global queue ceiling
+        self.quota_send_per_minute = float(os.environ.get('QUOTA_SEND_PER_MINUTE', 120))
+        self.quota_send_burst = int(os.environ.get('QUOTA_SEND_BURST', 100))
+        self.quota_schedule_per_minute = float(os.environ.get('QUOTA_SCHEDULE_PER_MINUTE', 300))
+        self.quota_schedule_burst = int(os.environ.get('QUOTA_SCHEDULE_BURST', 500))
+        self.max_outbound_depth = int(os.environ.get('MAX_OUTBOUND_DEPTH', 2000))
+        
+        # Idempotency-Key replay cache
+        self.idempotency_ttl = int(os.environ.get('IDEMPOTENCY_TTL', 86400))
+        self.idempotency_cache_size = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', 10000))
+        
+        # Bulk import: body size cap, rows per executemany transaction, rows per job, parallel jobs
+        self.import_max_bytes = int(os.environ.get('IMPORT_MAX_BYTES', 200 * 1024 * 1024))
+        self.import_batch_size = int(os.environ.get('IMPORT_BATCH_SIZE', 5000))
+        self.import_max_rows = int(os.environ.get('IMPORT_MAX_ROWS', 500000))
+        self.import_workers = int(os.environ.get('IMPORT_WORKERS', 2))
+        
+        # Message payload storage: 'zlib' compresses payload blobs, 'none' stores them raw
+        self.payload_compression = os.environ.get('PAYLOAD_COMPRESSION', 'zlib').lower()
+        
+        # Prepared (embed-built) payloads kept for resends
+        self.payload_cache_size = int(os.environ.get('PAYLOAD_CACHE_SIZE', 512))
+        
+        # Member cache: 'full' (discord.py default) or 'dashboard' (dashboard users + recent joiners)
+        self.member_cache_policy = os.environ.get('MEMBER_CACHE_POLICY', 'full').lower()
+        self.recent_members_max = int(os.environ.get('RECENT_MEMBERS_MAX', 5000))
+        
+        # Mutual guild resolution: 'members' (bot member cache) or 'oauth' (/users/@me/guilds)
+        default_mode = 'oauth' if self.member_cache_policy == 'dashboard' else 'members'
+        self.mutual_guilds_mode = os.environ.get('MUTUAL_GUILDS_MODE', default_mode).lower()
+        self.user_guilds_ttl = int(os.environ.get('USER_GUILDS_TTL', 300))
+        
+        # OAuth token refresh: tokens expiring within margin seconds are refreshed in the background
+        self.token_refresh_margin = int(os.environ.get('TOKEN_REFRESH_MARGIN', 86400))
+        self.token_refresh_interval = int(os.environ.get('TOKEN_REFRESH_INTERVAL', 300))
+        self.token_refresh_batch = int(os.environ.get('TOKEN_REFRESH_BATCH', 50))
+        self.token_refresh_workers = int(os.environ.get('TOKEN_REFRESH_WORKERS', 4))
+        # Seconds a claimed row stays leased to one process; also the retry delay after a crash
+        self.token_refresh_lease = int(os.environ.get('TOKEN_REFRESH_LEASE', 300))
+        self.token_refresh_timeout = float(os.environ.get('TOKEN_REFRESH_TIMEOUT', 10))
+        
+        # Server-sent events: heartbeat interval, per-connection buffer, reconnect replay window
+        self.events_heartbeat = int(os.environ.get('EVENTS_HEARTBEAT', 15))
+        self.events_queue_size = int(os.environ.get('EVENTS_QUEUE_SIZE', 256))
+        self.events_max_per_user = int(os.environ.get('EVENTS_MAX_PER_USER', 5))
+        self.events_replay_size = int(os.environ.get('EVENTS_REPLAY_SIZE', 1024))
+        
+        # Response compression (brotli is used when the optional brotli package is installed)
+        self.compress_min_size = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+        self.gzip_level = int(os.environ.get('GZIP_LEVEL', 6))
+        self.brotli_quality = int(os.environ.get('BROTLI_QUALITY', 5))
+        
+        # Discord user ids allowed to use the /api/admin endpoints (comma-separated)
+        self.admin_user_ids = {int(u) for u in os.environ.get('ADMIN_USER_IDS', '').split(',') if u.strip()}
+        # Sampling profiler: longest run and default sampling interval
+        self.profile_max_seconds = int(os.environ.get('PROFILE_MAX_SECONDS', 60))
+        self.profile_interval_ms = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+        # Requests running longer than this get stack snapshots (0 disables); how many to keep
+        self.slow_request_ms = int(os.environ.get('SLOW_REQUEST_MS', 2000))
+        self.slow_request_keep = int(os.environ.get('SLOW_REQUEST_KEEP', 50))
+        self.slow_request_samples = int(os.environ.get('SLOW_REQUEST_SAMPLES', 50))
+        # Bot event loop watchdog: lag probe interval, blocking threshold (0 disables), lag samples kept
+        self.loop_lag_interval = float(os.environ.get('LOOP_LAG_INTERVAL', 0.25))
+        self.loop_block_ms = int(os.environ.get('LOOP_BLOCK_MS', 250))
+        self.loop_lag_keep = int(os.environ.get('LOOP_LAG_KEEP', 2400))
         
         self.validate()
     
@@ -52,24 +189,308 @@ class Config:
                 print(f"   → {var}: {self.REQUIRED_VARS[var]}")
             print("="*60 + "\n")
             sys.exit(1)
+    
+    @staticmethod
+    def parse_shard_ids(value):
+        """Parse '0-3' or '0,2,4' into a sorted list of shard ids"""
+        if not value:
+            return None
+        shard_ids = set()
+        for part in value.split(','):
+            if '-' in part:
+                start, end = part.split('-', 1)
+                shard_ids.update(range(int(start), int(end) + 1))
+            elif part.strip():
+                shard_ids.add(int(part))
+        return sorted(shard_ids)
 
 config = Config()
 
+# ============================================================================
+# RECURRENCE RULES
+# ============================================================================
+
+class CronExpression:
+    """Five-field cron expression (minute hour day-of-month month day-of-week); L in day-of-month is its last day"""
+    ALIASES = {'@hourly': '0 * * * *', '@daily': '0 0 * * *', '@midnight': '0 0 * * *',
+               '@weekly': '0 0 * * 0', '@monthly': '0 0 1 * *', '@yearly': '0 0 1 1 *', '@annually': '0 0 1 1 *'}
+    NAMES = {
+        3: {name: i + 1 for i, name in enumerate(('jan', 'feb', 'mar', 'apr', 'may', 'jun',
+                                                  'jul', 'aug', 'sep', 'oct', 'nov', 'dec'))},
+        4: {name: i for i, name in enumerate(('sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'))}
+    }
+    BOUNDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+    
+    def __init__(self, expression):
+        self.expression = ' '.join(expression.split())
+        fields = self.ALIASES.get(self.expression.lower(), self.expression).split()
+        if len(fields) != 5:
+            raise ValueError('Cron expression needs 5 fields: minute hour day month weekday')
+        parsed = [self.parse_field(field, i) for i, field in enumerate(fields)]
+        self.minutes, self.hours, self.days, self.months = (sorted(values) for values in parsed[:4])
+        # 7 is an alias for Sunday
+        self.weekdays = {d % 7 for d in parsed[4]}
+        self.last_day = 'l' in fields[2].lower().split(',')
+        # Standard cron: when both day fields are restricted, either one matching is enough
+        self.any_day = fields[2] == '*' and fields[4] == '*'
+        self.day_or_weekday = fields[2] != '*' and fields[4] != '*'
+        self.weekday_only = fields[2] == '*' and fields[4] != '*'
+    
+    def parse_field(self, field, index):
+        low, high = self.BOUNDS[index]
+        names = self.NAMES.get(index, {})
+        values = set()
+        for part in field.lower().split(','):
+            if part == 'l' and index == 2:
+                continue  # last day of the month, see last_day
+            body, _, step = part.partition('/')
+            if body == '*':
+                start, end = low, high
+            else:
+                first, _, last = body.partition('-')
+                start = names[first] if first in names else int(first)
+                end = (names[last] if last in names else int(last)) if last else (high if step else start)
+            step = int(step) if step else 1
+            if not (low <= start <= end <= high) or step < 1:
+                raise ValueError(f'Cron field "{field}" is out of range {low}-{high}')
+            values.update(range(start, end + 1, step))
+        return values
+    
+    def min_gap(self):
+        """Shortest wall-clock gap in seconds between two fires, assuming matching days can be adjacent"""
+        times = [hour * 60 + minute for hour in self.hours for minute in self.minutes]
+        gaps = [b - a for a, b in zip(times, times[1:])] + [1440 - times[-1] + times[0]]
+        return min(gaps) * 60
+    
+    def day_matches(self, day):
+        if self.any_day:
+            return True
+        in_days = day.day in self.days or (self.last_day and (day + timedelta(days=1)).day == 1)
+        in_weekdays = (day.weekday() + 1) % 7 in self.weekdays
+        if self.day_or_weekday:
+            return in_days or in_weekdays
+        return in_weekdays if self.weekday_only else in_days
+    
+    @staticmethod
+    def first_at_least(values, value):
+        index = bisect.bisect_left(values, value)
+        return values[index] if index < len(values) else None
+    
+    def next_after(self, moment):
+        """First matching naive local minute strictly after moment, or None if it never matches"""
+        t = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Leap days can be 8 years apart; anything rarer never fires
+        limit = min(t.year + 8, datetime.max.year - 1)
+        # Jump field by field instead of stepping minute by minute
+        while t.year <= limit:
+            month = self.first_at_least(self.months, t.month)
+            if month is None:
+                t = datetime(t.year + 1, self.months[0], 1)
+                continue
+            if month != t.month:
+                t = datetime(t.year, month, 1)
+            if not self.day_matches(t):
+                t = datetime(t.year, t.month, t.day) + timedelta(days=1)
+                continue
+            hour = self.first_at_least(self.hours, t.hour)
+            if hour is None:
+                t = datetime(t.year, t.month, t.day) + timedelta(days=1)
+                continue
+            if hour != t.hour:
+                t = t.replace(hour=hour, minute=0)
+            minute = self.first_at_least(self.minutes, t.minute)
+            if minute is None:
+                t = t.replace(minute=0) + timedelta(hours=1)
+                continue
+            return t.replace(minute=minute)
+        return None
+
+class RecurrenceRule:
+    """Repeat schedule of a message series: a cron expression or a fixed interval, in a timezone"""
+    UNITS = {'minutes': 60, 'hours': 3600, 'days': 86400, 'weeks': 7 * 86400}
+    
+    def __init__(self, timezone='UTC', cron=None, every=None, unit=None, start=None, until=None, count=None):
+        try:
+            self.tz = zoneinfo.ZoneInfo(timezone)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f'Unknown timezone "{timezone}"')
+        self.timezone = timezone
+        self.cron = CronExpression(cron) if cron else None
+        try:
+            self.every, self.start, self.until, self.count = (int(v) if v not in (None, '') else None
+                                                              for v in (every, start, until, count))
+        except (TypeError, ValueError):
+            raise ValueError('"every", "start", "until" and "count" must be whole numbers')
+        self.unit = unit
+        if bool(self.cron) == bool(self.every):
+            raise ValueError('Recurrence needs either "cron" or "every"')
+        if self.every and (self.every < 1 or unit not in self.UNITS):
+            raise ValueError(f'Interval needs "every" >= 1 and "unit" in {", ".join(self.UNITS)}')
+        interval = self.cron.min_gap() if self.cron else self.every and self.every * self.UNITS[unit]
+        if interval and interval < config.recurrence_min_interval:
+            raise ValueError(f'Messages cannot repeat more often than every {config.recurrence_min_interval} seconds')
+        if self.every and not self.start:
+            self.start = int(time.time()) + self.every * self.UNITS[unit]
+        if self.count is not None and self.count < 1:
+            raise ValueError('"count" must be at least 1')
+    
+    @classmethod
+    def parse(cls, spec):
+        """Build a rule from the API/stored dict form; ValueError on anything invalid"""
+        if not isinstance(spec, dict):
+            raise ValueError('Recurrence must be an object')
+        unknown = set(spec) - {'timezone', 'cron', 'every', 'unit', 'start', 'until', 'count'}
+        if unknown:
+            raise ValueError(f'Unknown recurrence fields: {", ".join(sorted(unknown))}')
+        try:
+            return cls(**spec)
+        except (TypeError, KeyError, AttributeError) as e:
+            raise ValueError(f'Invalid recurrence: {e}')
+    
+    def to_json(self):
+        spec = {'timezone': self.timezone, 'until': self.until, 'count': self.count}
+        if self.cron:
+            spec['cron'] = self.cron.expression
+        else:
+            spec.update(every=self.every, unit=self.unit, start=self.start)
+        return json.dumps({k: v for k, v in spec.items() if v is not None})
+    
+    def local(self, timestamp):
+        return datetime.fromtimestamp(timestamp, self.tz).replace(tzinfo=None)
+    
+    def timestamp(self, local):
+        # fold=0: a wall time repeated by a DST fall-back fires once, a skipped one fires just after the gap
+        return int(local.replace(tzinfo=self.tz).timestamp())
+    
+    def next_fire(self, after, occurrence=0):
+        """First fire time strictly after the timestamp after, or None once the series is over"""
+        if self.count is not None and occurrence >= self.count:
+            return None
+        if self.cron:
+            candidate = self.cron.next_after(self.local(after))
+            while candidate is not None and self.timestamp(candidate) <= after:
+                candidate = self.cron.next_after(candidate)
+            fire = self.timestamp(candidate) if candidate is not None else None
+        elif self.unit in ('minutes', 'hours'):
+            step = self.every * self.UNITS[self.unit]
+            fire = self.start if after < self.start else self.start + ((after - self.start) // step + 1) * step
+        else:
+            # Day/week intervals follow the wall clock, so 09:00 stays 09:00 across DST changes
+            step = self.every * self.UNITS[self.unit] // 86400
+            start = self.local(self.start)
+            elapsed = (self.local(after).date() - start.date()).days if after >= self.start else -1
+            n = max(0, elapsed // step)
+            while self.timestamp(start + timedelta(days=n * step)) <= after:
+                n += 1
+            fire = self.timestamp(start + timedelta(days=n * step))
+        if fire is None or (self.until is not None and fire > self.until):
+            return None
+        return fire
+    
+    def upcoming(self, after, occurrence=0, n=3):
+        fires = []
+        while len(fires) < n:
+            fire = self.next_fire(after, occurrence + len(fires))
+            if fire is None:
+                break
+            fires.append(fire)
+            after = fire
+        return fires
+
 # ============================================================================
 # ADVANCED DATABASE ORM
 # ============================================================================
 
+def payload_hash(content, embed_json, files_json):
+    """Content address of a stored message payload"""
+    digest = hashlib.sha256()
+    for part in (content or '', embed_json or '', files_json or ''):
+        digest.update(part.encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+# Preset dictionary for embed JSON; never edit it, add a new encoding tag instead
+EMBED_ZDICT = (
+    b'{"title": "", "description": "", "color": "#5865f2", "author": {"name": "", "icon_url": "https://"}, '
+    b'"fields": [{"name": "", "value": "", "inline": false}, {"name": "", "value": "", "inline": true}], '
+    b'"thumbnail": "https://cdn.discordapp.com/", "image": "https://", "footer": {"text": "", "icon_url": ""}, '
+    b'"timestamp": true}, {"title": "Welcome", "description": "Welcome {user} to {server}!"}'
+)
+BLOB_RAW, BLOB_ZLIB, BLOB_ZLIB_EMBED = b'\x00', b'\x01', b'\x02'
+
+def encode_blob(text, embed=False):
+    """Tagged payload blob, zlib-compressed when that makes it smaller"""
+    if text is None:
+        return None
+    raw = text.encode()
+    if config.payload_compression == 'zlib' and len(raw) > 32:
+        compressor = zlib.compressobj(9, zdict=EMBED_ZDICT) if embed else zlib.compressobj(9)
+        packed = compressor.compress(raw) + compressor.flush()
+        if len(packed) < len(raw):
+            return (BLOB_ZLIB_EMBED if embed else BLOB_ZLIB) + packed
+    return BLOB_RAW + raw
+
+def decode_blob(blob):
+    if blob is None:
+        return None
+    tag, body = blob[:1], blob[1:]
+    if tag == BLOB_ZLIB:
+        return zlib.decompress(body).decode()
+    if tag == BLOB_ZLIB_EMBED:
+        decompressor = zlib.decompressobj(zdict=EMBED_ZDICT)
+        return (decompressor.decompress(body) + decompressor.flush()).decode()
+    return body.decode()
+
+def embed_text(embed_json):
+    """Searchable text of an embed list (titles, descriptions, fields, footers)"""
+    if not embed_json:
+        return ''
+    try:
+        embeds = json.loads(embed_json)
+    except ValueError:
+        return ''
+    if not isinstance(embeds, list):
+        return ''
+    
+    def entry(value):
+        return value if isinstance(value, dict) else {}
+    
+    # Malformed entries are skipped rather than raised from inside the FTS triggers
+    parts = []
+    for embed in filter(lambda e: isinstance(e, dict), embeds):
+        parts += [embed.get('title'), embed.get('description')]
+        parts += [entry(embed.get('author')).get('name'), entry(embed.get('footer')).get('text')]
+        fields = embed.get('fields')
+        for field in fields if isinstance(fields, list) else []:
+            parts += [entry(field).get('name'), entry(field).get('value')]
+    return ' '.join(p for p in parts if isinstance(p, str))
+
+def is_embed_list(value):
+    """True for a list of embed objects, the only embeds shape the API accepts"""
+    return isinstance(value, list) and all(isinstance(embed, dict) for embed in value)
+
+def fts_query(text):
+    """Turn free text into a safe FTS5 query of prefix-matched terms"""
+    terms = re.findall(r'\w+', text)
+    return ' '.join(f'"{term}"*' for term in terms[:16])
+
 class Database:
     """Production-grade database abstraction"""
     def __init__(self, db_path='dashboard.db'):
         self.db_path = db_path
         self.init_schema()
         self.create_indexes()
+        self.create_search_index()
     
     def get_connection(self):
         """Get database connection with row factory"""
         conn = sqlite3.connect(self.db_path, timeout=10)
         conn.row_factory = sqlite3.Row
+        # Used by the full-text search triggers
+        conn.create_function('payload_decode', 1, decode_blob, deterministic=True)
+        conn.create_function('embed_text', 1, embed_text, deterministic=True)
+        # Bulk imports index messages themselves and switch the insert trigger off
+        conn.create_function('fts_auto_index', 0, lambda: 1)
         return conn
     
     def init_schema(self):
@@ -110,6 +531,34 @@ class Database:
             )
         ''')
         
+        # Content-addressed message payloads shared by identical broadcasts
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS message_payloads (
+                hash TEXT PRIMARY KEY,
+                content BLOB,
+                embed_data BLOB,
+                files BLOB,
+                raw_size INTEGER,
+                created_at INTEGER DEFAULT (unixepoch())
+            )
+        ''')
+        
+        # Columns added after the initial schema
+        self.add_missing_columns(c, 'messages', {
+            'lease_owner': 'TEXT',
+            'lease_expires': 'INTEGER',
+            'payload_hash': 'TEXT REFERENCES message_payloads(hash)',
+            # Recurring series: the rule, the id of the series' first row and this row's position in it
+            'recurrence': 'TEXT',
+            'series_id': 'INTEGER',
+            'occurrence': 'INTEGER'
+        })
+        self.add_missing_columns(c, 'users', {
+            # Background token refresh: consecutive failures and the lease / next attempt time
+            'refresh_failures': 'INTEGER DEFAULT 0',
+            'refresh_after': 'INTEGER'
+        })
+        
         # Templates table
         c.execute('''
             CREATE TABLE IF NOT EXISTS templates (
@@ -138,6 +587,111 @@ class Database:
                 UNIQUE(guild_id)
             )
         ''')
+        self.add_missing_columns(c, 'welcome_config', {
+            # Why the bot switched the config off (channel deleted or inaccessible)
+            'disabled_reason': 'TEXT'
+        })
+        
+        # Channels the circuit breaker considers dead, and when to probe them again
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS channel_health (
+                channel_id TEXT PRIMARY KEY,
+                guild_id TEXT,
+                failures INTEGER NOT NULL,
+                reason TEXT,
+                probe_at INTEGER NOT NULL,
+                updated_at INTEGER DEFAULT (unixepoch())
+            )
+        ''')
+        
+        # Failed deliveries awaiting retry; 'dead' rows form the dead-letter view
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS delivery_retries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                message_id INTEGER,
+                user_id INTEGER NOT NULL,
+                guild_id TEXT,
+                channel_id TEXT NOT NULL,
+                content TEXT,
+                embed_data TEXT,
+                files TEXT,
+                attempts INTEGER DEFAULT 0,
+                next_attempt_at INTEGER,
+                last_error TEXT,
+                status TEXT DEFAULT 'pending',
+                lease_owner TEXT,
+                created_at INTEGER DEFAULT (unixepoch()),
+                updated_at INTEGER DEFAULT (unixepoch()),
+                FOREIGN KEY(message_id) REFERENCES messages(id)
+            )
+        ''')
+        
+        # Idempotency keys for replay-safe send/schedule requests
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                user_id INTEGER NOT NULL,
+                endpoint TEXT NOT NULL,
+                key TEXT NOT NULL,
+                request_hash TEXT,
+                status_code INTEGER,
+                response TEXT,
+                created_at INTEGER DEFAULT (unixepoch()),
+                PRIMARY KEY(user_id, endpoint, key)
+            )
+        ''')
+        
+        # Bulk import jobs; progress is kept here so any web process can report it
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS import_jobs (
+                id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                format TEXT NOT NULL,
+                status TEXT DEFAULT 'queued',
+                bytes INTEGER,
+                rows_read INTEGER DEFAULT 0,
+                rows_imported INTEGER DEFAULT 0,
+                rows_failed INTEGER DEFAULT 0,
+                errors TEXT,
+                created_at INTEGER DEFAULT (unixepoch()),
+                finished_at INTEGER
+            )
+        ''')
+        
+        # Per-channel delivery choice and the webhook created for it
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS channel_webhooks (
+                channel_id TEXT PRIMARY KEY,
+                guild_id TEXT,
+                webhook_id TEXT,
+                webhook_token TEXT,
+                backend TEXT,
+                updated_at INTEGER DEFAULT (unixepoch())
+            )
+        ''')
+        
+        # Server-side sessions; id is the sha256 of the cookie value
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                user_id INTEGER,
+                data TEXT NOT NULL,
+                expires_at INTEGER NOT NULL,
+                created_at INTEGER DEFAULT (unixepoch())
+            )
+        ''')
+        
+        # Shard worker registry (multi-process coordination)
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS shard_workers (
+                worker_id TEXT PRIMARY KEY,
+                url TEXT,
+                shard_count INTEGER,
+                shard_ids TEXT,
+                ready INTEGER DEFAULT 0,
+                stats TEXT,
+                heartbeat_at INTEGER
+            )
+        ''')
         
         # Analytics table
         c.execute('''
@@ -154,18 +708,51 @@ class Database:
         conn.close()
         print("✅ Database schema initialized")
     
+    def add_missing_columns(self, cursor, table, columns):
+        """Migrate an existing table by adding any columns it lacks"""
+        cursor.execute(f'PRAGMA table_info({table})')
+        existing = {row['name'] for row in cursor.fetchall()}
+        for name, definition in columns.items():
+            if name not in existing:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+    
     def create_indexes(self):
         """Create performance indexes"""
         conn = self.get_connection()
         c = conn.cursor()
         
         # Messaging indexes
-        c.execute('CREATE INDEX IF NOT EXISTS idx_messages_user_time ON messages(user_id, sent_time DESC)')
+        # History is ordered by created_at; the old sent_time index matched no query
+        c.execute('DROP INDEX IF EXISTS idx_messages_user_time')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_messages_user_created ON messages(user_id, created_at DESC, id DESC)')
         c.execute('CREATE INDEX IF NOT EXISTS idx_messages_status_time ON messages(status, scheduled_time)')
         c.execute('CREATE INDEX IF NOT EXISTS idx_messages_guild ON messages(guild_id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_messages_lease ON messages(status, lease_expires)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_messages_series ON messages(series_id) WHERE series_id IS NOT NULL')
+        
+        # Retry queue indexes
+        c.execute('CREATE INDEX IF NOT EXISTS idx_retries_due ON delivery_retries(status, next_attempt_at)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_retries_user_status ON delivery_retries(user_id, status, updated_at DESC)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_retries_message ON delivery_retries(message_id)')
+        
+        # User indexes
+        # Retries point at the shared payload too; content/embed_data/files stay for rows written before
+        self.add_missing_columns(c, 'delivery_retries', {
+            'payload_hash': 'TEXT REFERENCES message_payloads(hash)'
+        })
+        # Token refresh walks users by expiry; rows without a refresh token are never due
+        c.execute('CREATE INDEX IF NOT EXISTS idx_users_expires ON users(expires_at) WHERE refresh_token IS NOT NULL')
+        
+        # Idempotency indexes
+        c.execute('CREATE INDEX IF NOT EXISTS idx_idempotency_created ON idempotency_keys(created_at)')
+        
+        # Import job indexes
+        c.execute('CREATE INDEX IF NOT EXISTS idx_import_jobs_user ON import_jobs(user_id, status)')
         
         # Template indexes
-        c.execute('CREATE INDEX IF NOT EXISTS idx_templates_user ON templates(user_id)')
+        # Covers get_user_templates' ordering, which otherwise sorts every template of the user
+        c.execute('DROP INDEX IF EXISTS idx_templates_user')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_templates_user_updated ON templates(user_id, updated_at DESC, created_at DESC)')
         c.execute('CREATE INDEX IF NOT EXISTS idx_templates_name ON templates(name)')
         
         # Analytics indexes
@@ -174,11 +761,81 @@ class Database:
         # Welcome config indexes
         c.execute('CREATE INDEX IF NOT EXISTS idx_welcome_guild ON welcome_config(guild_id)')
         c.execute('CREATE INDEX IF NOT EXISTS idx_welcome_enabled ON welcome_config(enabled)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_channel_health_guild ON channel_health(guild_id)')
+        
+        # Session indexes
+        c.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)')
         
         conn.commit()
         conn.close()
         print("✅ Database indexes created")
     
+    def create_search_index(self):
+        """Create FTS5 indexes over templates and messages, kept in sync by triggers"""
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute("SELECT name FROM sqlite_master WHERE name IN ('templates_fts', 'messages_fts')")
+        existing = {row['name'] for row in c.fetchall()}
+        c.execute("SELECT sql FROM sqlite_master WHERE name = 'messages_fts_insert'")
+        trigger = c.fetchone()
+        if trigger and 'fts_auto_index' not in trigger['sql']:
+            c.execute('DROP TRIGGER messages_fts_insert')
+        
+        # Contentless tables; 'owner' holds a u<user_id> token so searches stay per-user
+        for table, columns in (('templates_fts', 'owner, name, content, embed_text'),
+                               ('messages_fts', 'owner, content, embed_text')):
+            c.execute(f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+                    {columns}, content='', prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+        
+        template_values = "{row}.id, 'u' || {row}.user_id, {row}.name, {row}.content, embed_text({row}.embed_data)"
+        message_values = '''{row}.id, 'u' || {row}.user_id,
+                   COALESCE(payload_decode(p.content), {row}.content),
+                   embed_text(COALESCE(payload_decode(p.embed_data), {row}.embed_data))
+            FROM (SELECT {row}.payload_hash AS hash) AS ref LEFT JOIN message_payloads p ON p.hash = ref.hash'''
+        c.executescript(f'''
+            CREATE TRIGGER IF NOT EXISTS templates_fts_insert AFTER INSERT ON templates BEGIN
+                INSERT INTO templates_fts (rowid, owner, name, content, embed_text)
+                VALUES ({template_values.format(row='new')});
+            END;
+            CREATE TRIGGER IF NOT EXISTS templates_fts_delete AFTER DELETE ON templates BEGIN
+                INSERT INTO templates_fts (templates_fts, rowid, owner, name, content, embed_text)
+                VALUES ('delete', {template_values.format(row='old')});
+            END;
+            CREATE TRIGGER IF NOT EXISTS templates_fts_update AFTER UPDATE OF user_id, name, content, embed_data ON templates BEGIN
+                INSERT INTO templates_fts (templates_fts, rowid, owner, name, content, embed_text)
+                VALUES ('delete', {template_values.format(row='old')});
+                INSERT INTO templates_fts (rowid, owner, name, content, embed_text)
+                VALUES ({template_values.format(row='new')});
+            END;
+            CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages WHEN fts_auto_index() BEGIN
+                INSERT INTO messages_fts (rowid, owner, content, embed_text)
+                SELECT {message_values.format(row='new')};
+            END;
+            CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, owner, content, embed_text)
+                SELECT 'delete', {message_values.format(row='old')};
+            END;
+        ''')
+        
+        # Index rows written before the search tables existed
+        if 'templates_fts' not in existing:
+            c.execute(f"INSERT INTO templates_fts (rowid, owner, name, content, embed_text) SELECT {template_values.format(row='templates')} FROM templates")
+        if 'messages_fts' not in existing:
+            c.execute(f'''
+                INSERT INTO messages_fts (rowid, owner, content, embed_text)
+                SELECT m.id, 'u' || m.user_id, COALESCE(payload_decode(p.content), m.content),
+                       embed_text(COALESCE(payload_decode(p.embed_data), m.embed_data))
+                FROM messages m LEFT JOIN message_payloads p ON p.hash = m.payload_hash
+            ''')
+        
+        conn.commit()
+        conn.close()
+        print("✅ Search index ready")
+    
     # User Operations
     def save_user(self, user_id, username, avatar, access_token, refresh_token=None, expires_at=None):
         conn = self.get_connection()
@@ -198,25 +855,242 @@ class Database:
         conn.close()
         return user
     
+    def claim_expiring_tokens(self, before, lease_seconds, limit):
+        """Lease users whose tokens expire before `before`, soonest first"""
+        now = int(time.time())
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            UPDATE users SET refresh_after = ?
+            WHERE id IN (
+                SELECT id FROM users
+                WHERE refresh_token IS NOT NULL AND expires_at < ? AND COALESCE(refresh_after, 0) <= ?
+                ORDER BY expires_at LIMIT ?
+            )
+            RETURNING id, refresh_token, expires_at, refresh_failures
+        ''', (now + lease_seconds, int(before), now, limit))
+        rows = c.fetchall()
+        conn.commit()
+        conn.close()
+        return rows
+    
+    def save_refreshed_token(self, user_id, old_refresh_token, access_token, refresh_token, expires_at):
+        """Store new tokens unless the user logged in again meanwhile"""
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            UPDATE users
+            SET access_token = ?, refresh_token = ?, expires_at = ?, refresh_failures = 0, refresh_after = NULL,
+                updated_at = unixepoch()
+            WHERE id = ? AND refresh_token = ?
+        ''', (access_token, refresh_token, expires_at, user_id, old_refresh_token))
+        conn.commit()
+        conn.close()
+    
+    def token_refresh_failed(self, user_id, retry_at):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('UPDATE users SET refresh_failures = refresh_failures + 1, refresh_after = ? WHERE id = ?',
+                  (retry_at, user_id))
+        conn.commit()
+        conn.close()
+    
+    def drop_refresh_token(self, user_id, refresh_token):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            UPDATE users SET access_token = NULL, refresh_token = NULL, refresh_after = NULL
+            WHERE id = ? AND refresh_token = ?
+        ''', (user_id, refresh_token))
+        conn.commit()
+        conn.close()
+    
+    def get_user_ids(self):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('SELECT id FROM users')
+        user_ids = [row['id'] for row in c.fetchall()]
+        conn.close()
+        return user_ids
+    
     # Message Operations
-    def save_message(self, user_id, guild_id, channel_ids, content, embeds, files, scheduled_time=None):
+    @staticmethod
+    def payload_row(digest, content, embed_json, files_json):
+        """message_payloads values for one payload"""
+        return (digest, encode_blob(content), encode_blob(embed_json, embed=True), encode_blob(files_json),
+                sum(len(part.encode()) for part in (content or '', embed_json or '', files_json or '')))
+    
+    def store_payload(self, cursor, content, embed_json, files_json):
+        """Insert a payload once per distinct content and return its hash"""
+        digest = payload_hash(content, embed_json, files_json)
+        cursor.execute('''
+            INSERT OR IGNORE INTO message_payloads (hash, content, embed_data, files, raw_size)
+            VALUES (?, ?, ?, ?, ?)
+        ''', self.payload_row(digest, content, embed_json, files_json))
+        return digest
+    
+    def hydrate_messages(self, cursor, rows):
+        """Fill content, embed_data and files of message (or retry) rows from their payloads"""
+        hashes = list({row['payload_hash'] for row in rows if row['payload_hash']})
+        payloads = {}
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            cursor.execute(f"SELECT * FROM message_payloads WHERE hash IN ({','.join('?' * len(chunk))})", chunk)
+            payloads.update((p['hash'], p) for p in cursor.fetchall())
+        
+        messages = []
+        for row in rows:
+            message = dict(row)
+            payload = payloads.get(message['payload_hash'])
+            if payload:
+                message['content'] = decode_blob(payload['content'])
+                message['embed_data'] = decode_blob(payload['embed_data'])
+                message['files'] = decode_blob(payload['files'])
+            messages.append(message)
+        return messages
+    
+    def save_message(self, user_id, guild_id, channel_ids, content, embeds, files, scheduled_time=None, recurrence=None):
+        """Store a sent or scheduled message; recurrence (rule JSON) starts a series with this row"""
         conn = self.get_connection()
         c = conn.cursor()
+        digest = self.store_payload(c, content, json.dumps(embeds), json.dumps(files))
         c.execute('''
-            INSERT INTO messages (user_id, guild_id, channel_id, content, embed_data, files, scheduled_time, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (user_id, guild_id, json.dumps(channel_ids), content, json.dumps(embeds), json.dumps(files), scheduled_time, 'pending' if scheduled_time else 'sent'))
+            INSERT INTO messages (user_id, guild_id, channel_id, payload_hash, scheduled_time, status, recurrence)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, guild_id, json.dumps(channel_ids), digest, scheduled_time, 'pending' if scheduled_time else 'sent',
+              recurrence))
+        msg_id = c.lastrowid
+        if recurrence:
+            c.execute('UPDATE messages SET series_id = id, occurrence = 1 WHERE id = ?', (msg_id,))
+        conn.commit()
+        conn.close()
+        return msg_id
+    
+    def import_messages(self, user_id, rows):
+        """Insert a batch of validated import rows as pending messages in one transaction
+        
+        rows are (guild_id, channel_ids_json, content, embed_json, files_json, scheduled_time).
+        """
+        payloads = {}
+        messages = []
+        for guild_id, channel_json, content, embed_json, files_json, scheduled_time in rows:
+            digest = payload_hash(content, embed_json, files_json)
+            if digest not in payloads:
+                payloads[digest] = self.payload_row(digest, content, embed_json, files_json)
+            messages.append((user_id, guild_id, channel_json, digest, scheduled_time))
+        
+        conn = self.get_connection()
+        # The trigger would decode every payload again; the text is at hand, so index it directly
+        conn.create_function('fts_auto_index', 0, lambda: 0)
+        c = conn.cursor()
+        c.executemany('''
+            INSERT OR IGNORE INTO message_payloads (hash, content, embed_data, files, raw_size)
+            VALUES (?, ?, ?, ?, ?)
+        ''', payloads.values())
+        index = []
+        for message, row in zip(messages, rows):
+            c.execute('''
+                INSERT INTO messages (user_id, guild_id, channel_id, payload_hash, scheduled_time, status)
+                VALUES (?, ?, ?, ?, ?, 'pending') RETURNING id
+            ''', message)
+            index.append((c.fetchone()[0], f'u{user_id}', row[2], embed_text(row[3])))
+        c.executemany('INSERT INTO messages_fts (rowid, owner, content, embed_text) VALUES (?, ?, ?, ?)', index)
         conn.commit()
         conn.close()
     
-    def get_pending_messages(self):
+    @staticmethod
+    def shard_filter(shard_count, shard_ids):
+        """SQL condition restricting messages to guilds on the given shards"""
+        if not shard_count or shard_ids is None:
+            return '', []
+        # Rows without a guild belong to whichever worker owns shard 0
+        placeholders = ','.join('?' * len(shard_ids))
+        return f' AND COALESCE((CAST(guild_id AS INTEGER) >> 22) % ?, 0) IN ({placeholders})', [shard_count, *shard_ids]
+    
+    def claim_pending_messages(self, owner, lease_seconds, limit, shard_count=None, shard_ids=None):
+        """Atomically lease due rows (and rows whose lease expired) to one worker"""
+        now = int(time.time())
+        shard_sql, shard_params = self.shard_filter(shard_count, shard_ids)
         conn = self.get_connection()
         c = conn.cursor()
-        c.execute('SELECT * FROM messages WHERE status = "pending" AND scheduled_time <= ?', (int(time.time()),))
+        c.execute(f'''
+            UPDATE messages SET status = 'in_flight', lease_owner = ?, lease_expires = ?
+            WHERE id IN (
+                SELECT id FROM messages
+                WHERE ((status = 'pending' AND scheduled_time <= ?)
+                       OR (status = 'in_flight' AND lease_expires < ?)){shard_sql}
+                ORDER BY scheduled_time
+                LIMIT ?
+            )
+            RETURNING *
+        ''', [owner, now + lease_seconds, now, now, *shard_params, limit])
         messages = c.fetchall()
+        conn.commit()
+        messages = self.hydrate_messages(c, messages)
         conn.close()
         return messages
     
+    def renew_message_leases(self, msg_ids, owner, lease_seconds):
+        """Push back the expiry of leases this owner still holds; returns how many were renewed"""
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute(f'''
+            UPDATE messages SET lease_expires = ?
+            WHERE id IN ({','.join('?' * len(msg_ids))}) AND lease_owner = ? AND status = 'in_flight'
+        ''', [int(time.time()) + lease_seconds, *msg_ids, owner])
+        renewed = c.rowcount
+        conn.commit()
+        conn.close()
+        return renewed
+    
+    def release_message(self, msg_id, owner, status, sent_time=None, next_time=None):
+        """Record the outcome of a leased row; False if the lease was lost meanwhile
+        
+        With next_time, a recurring row also materializes the next occurrence of its
+        series in the same transaction, so each series has at most one pending row.
+        """
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            UPDATE messages SET status = ?, sent_time = COALESCE(?, sent_time), lease_owner = NULL, lease_expires = NULL
+            WHERE id = ? AND lease_owner = ?
+        ''', (status, sent_time, msg_id, owner))
+        released = c.rowcount
+        if released and next_time:
+            # A cancelled series has its recurrence cleared, so nothing is copied forward
+            c.execute('''
+                INSERT INTO messages (user_id, guild_id, channel_id, payload_hash, scheduled_time, status,
+                                      recurrence, series_id, occurrence)
+                SELECT user_id, guild_id, channel_id, payload_hash, ?, 'pending', recurrence, series_id, occurrence + 1
+                FROM messages WHERE id = ? AND recurrence IS NOT NULL
+            ''', (int(next_time), msg_id))
+        conn.commit()
+        conn.close()
+        return released > 0
+    
+    def cancel_series(self, series_id, user_id):
+        """Stop a recurring series: drop its pending occurrence and keep in-flight ones from spawning more"""
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            UPDATE messages SET recurrence = NULL,
+                status = CASE WHEN status = 'pending' THEN 'cancelled' ELSE status END
+            WHERE series_id = ? AND user_id = ? AND recurrence IS NOT NULL
+        ''', (series_id, user_id))
+        cancelled = c.rowcount
+        conn.commit()
+        conn.close()
+        return cancelled > 0
+    
+    def get_message(self, msg_id, user_id):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('SELECT * FROM messages WHERE id = ? AND user_id = ?', (msg_id, user_id))
+        row = c.fetchone()
+        message = self.hydrate_messages(c, [row])[0] if row else None
+        conn.close()
+        return message
+    
     def update_message_status(self, msg_id, status, sent_time=None):
         conn = self.get_connection()
         c = conn.cursor()
@@ -227,8 +1101,47 @@ class Database:
     def get_user_messages(self, user_id, limit=50):
         conn = self.get_connection()
         c = conn.cursor()
-        c.execute('SELECT * FROM messages WHERE user_id = ? ORDER BY created_at DESC LIMIT ?', (user_id, limit))
-        messages = c.fetchall()
+        c.execute('SELECT * FROM messages WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ?', (user_id, limit))
+        messages = self.hydrate_messages(c, c.fetchall())
+        conn.close()
+        return messages
+    
+    def search_messages(self, user_id, text, limit=20, offset=0):
+        query = fts_query(text)
+        if not query:
+            return []
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            SELECT m.*, bm25(messages_fts, 0, 5.0, 2.0) AS score
+            FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+            WHERE messages_fts MATCH ? AND m.user_id = ?
+            ORDER BY score LIMIT ? OFFSET ?
+        ''', (f'owner:u{int(user_id)} AND ({query})', user_id, limit, offset))
+        messages = self.hydrate_messages(c, c.fetchall())
+        conn.close()
+        return messages
+    
+    def get_message_history(self, user_id, limit=25, before=None, status=None, channel_id=None):
+        """Keyset page of a user's messages, newest first; before is a (created_at, id) cursor"""
+        query = 'SELECT * FROM messages WHERE user_id = ?'
+        params = [user_id]
+        if status:
+            query += ' AND status = ?'
+            params.append(status)
+        if channel_id:
+            query += ' AND EXISTS (SELECT 1 FROM json_each(messages.channel_id) WHERE value = ?)'
+            params.append(str(channel_id))
+        if before:
+            query += ' AND (created_at, id) < (?, ?)'
+            params += list(before)
+        query += ' ORDER BY created_at DESC, id DESC LIMIT ?'
+        params.append(limit)
+        
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute(query, params)
+        messages = self.hydrate_messages(c, c.fetchall())
         conn.close()
         return messages
     
@@ -251,6 +1164,22 @@ class Database:
         conn.close()
         return templates
     
+    def search_templates(self, user_id, text, limit=20, offset=0):
+        query = fts_query(text)
+        if not query:
+            return []
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            SELECT t.*, bm25(templates_fts, 0, 10.0, 5.0, 2.0) AS score
+            FROM templates_fts JOIN templates t ON t.id = templates_fts.rowid
+            WHERE templates_fts MATCH ? AND t.user_id = ?
+            ORDER BY score LIMIT ? OFFSET ?
+        ''', (f'owner:u{int(user_id)} AND ({query})', user_id, limit, offset))
+        templates = c.fetchall()
+        conn.close()
+        return templates
+    
     def delete_template(self, template_id, user_id):
         conn = self.get_connection()
         c = conn.cursor()
@@ -279,61 +1208,414 @@ class Database:
         conn.close()
         return config
     
-    # Analytics
-    def update_analytics(self, messages=0, files=0):
-        today = datetime.now().strftime('%Y-%m-%d')
+    def disable_welcome_config(self, channel_id, reason):
+        """Switch off the enabled config that points at channel_id; its guild id if there was one"""
         conn = self.get_connection()
         c = conn.cursor()
         c.execute('''
-            INSERT INTO analytics (date, messages_sent, files_sent)
-            VALUES (?, ?, ?)
-            ON CONFLICT(date) DO UPDATE SET
-                messages_sent = messages_sent + excluded.messages_sent,
-                files_sent = files_sent + excluded.files_sent
-        ''', (today, messages, files))
+            UPDATE welcome_config SET enabled = 0, disabled_reason = ?, updated_at = unixepoch()
+            WHERE channel_id = ? AND enabled = 1
+            RETURNING guild_id
+        ''', (reason, str(channel_id)))
+        disabled = c.fetchone()
         conn.commit()
         conn.close()
+        return disabled['guild_id'] if disabled else None
     
-    def get_analytics(self):
-        today = datetime.now().strftime('%Y-%m-%d')
-        week_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-        month_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-        
+    # Channel Health
+    def get_channel_health(self, guild_id=None):
         conn = self.get_connection()
         c = conn.cursor()
-        
-        c.execute('SELECT SUM(messages_sent) as total FROM analytics WHERE date = ?', (today,))
-        today_msgs = c.fetchone()['total'] or 0
-        
-        c.execute('SELECT SUM(messages_sent) as total FROM analytics WHERE date >= ?', (week_ago,))
-        week_msgs = c.fetchone()['total'] or 0
-        
-        c.execute('SELECT SUM(messages_sent) as total FROM analytics WHERE date >= ?', (month_ago,))
-        month_msgs = c.fetchone()['total'] or 0
-        
-        c.execute('SELECT SUM(files_sent) as total FROM analytics WHERE date = ?', (today,))
-        today_files = c.fetchone()['total'] or 0
-        
+        if guild_id:
+            c.execute('SELECT * FROM channel_health WHERE guild_id = ?', (str(guild_id),))
+        else:
+            c.execute('SELECT * FROM channel_health')
+        rows = c.fetchall()
         conn.close()
-        
-        return {
-            'today': today_msgs,
-            'week': week_msgs,
-            'month': month_msgs,
-            'files_today': today_files
-        }
-
-db = Database()
-
-# ============================================================================
-# DISCORD OAUTH CLIENT
-# ============================================================================
-
-class DiscordOAuth:
-    """Discord OAuth2 client"""
-    API_BASE = 'https://discord.com/api/v10'
+        return rows
+    
+    def save_channel_health(self, channel_id, guild_id, failures, reason, probe_at):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            INSERT OR REPLACE INTO channel_health (channel_id, guild_id, failures, reason, probe_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (str(channel_id), guild_id, failures, reason, probe_at))
+        conn.commit()
+        conn.close()
+    
+    def clear_channel_health(self, channel_id):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('DELETE FROM channel_health WHERE channel_id = ?', (str(channel_id),))
+        conn.commit()
+        conn.close()
+    
+    # Delivery Retries
+    def enqueue_retry(self, user_id, guild_id, channel_id, content, embeds, files, error, next_attempt_at, message_id=None):
+        """Queue one channel's redelivery; the payload is stored once and shared with its message"""
+        embed_json, files_json = json.dumps(embeds), json.dumps(files)
+        digest = payload_hash(content, embed_json, files_json)
+        conn = self.get_connection()
+        c = conn.cursor()
+        # The message usually stored this payload already; skip re-encoding it
+        c.execute('SELECT 1 FROM message_payloads WHERE hash = ?', (digest,))
+        if not c.fetchone():
+            self.store_payload(c, content, embed_json, files_json)
+        c.execute('''
+            INSERT INTO delivery_retries (message_id, user_id, guild_id, channel_id, payload_hash,
+                                          attempts, next_attempt_at, last_error)
+            VALUES (?, ?, ?, ?, ?, 1, ?, ?)
+        ''', (message_id, user_id, guild_id, str(channel_id), digest, int(next_attempt_at), error))
+        conn.commit()
+        retry_id = c.lastrowid
+        conn.close()
+        return retry_id
+    
+    def claim_due_retries(self, owner, lease_seconds, limit, shard_count=None, shard_ids=None):
+        """Lease due retries; while in flight, next_attempt_at doubles as the lease expiry"""
+        now = int(time.time())
+        shard_sql, shard_params = self.shard_filter(shard_count, shard_ids)
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute(f'''
+            UPDATE delivery_retries SET status = 'in_flight', lease_owner = ?, next_attempt_at = ?
+            WHERE id IN (
+                SELECT id FROM delivery_retries
+                WHERE status IN ('pending', 'in_flight') AND next_attempt_at <= ?{shard_sql}
+                ORDER BY next_attempt_at
+                LIMIT ?
+            )
+            RETURNING *
+        ''', [owner, now + lease_seconds, now, *shard_params, limit])
+        retries = c.fetchall()
+        conn.commit()
+        retries = self.hydrate_messages(c, retries)
+        conn.close()
+        return retries
+    
+    def reschedule_retry(self, retry_id, owner, next_attempt_at, error):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            UPDATE delivery_retries
+            SET status = 'pending', attempts = attempts + 1, next_attempt_at = ?, last_error = ?,
+                lease_owner = NULL, updated_at = unixepoch()
+            WHERE id = ? AND lease_owner = ?
+        ''', (int(next_attempt_at), error, retry_id, owner))
+        conn.commit()
+        conn.close()
+    
+    def finish_retry(self, retry_id, owner, status, error=None):
+        """Mark a retry 'sent' or 'dead' and settle its message's status"""
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            UPDATE delivery_retries
+            SET status = ?, attempts = attempts + 1, last_error = COALESCE(?, last_error),
+                lease_owner = NULL, updated_at = unixepoch()
+            WHERE id = ? AND lease_owner = ?
+            RETURNING message_id
+        ''', (status, error, retry_id, owner))
+        row = c.fetchone()
+        if row and row['message_id']:
+            if status == 'sent':
+                c.execute('''
+                    UPDATE messages SET status = 'sent', sent_time = unixepoch()
+                    WHERE id = ? AND status IN ('retrying', 'failed')
+                ''', (row['message_id'],))
+            else:
+                c.execute('''
+                    UPDATE messages SET status = 'failed'
+                    WHERE id = ? AND status = 'retrying' AND NOT EXISTS (
+                        SELECT 1 FROM delivery_retries WHERE message_id = ? AND status IN ('pending', 'in_flight')
+                    )
+                ''', (row['message_id'], row['message_id']))
+        conn.commit()
+        conn.close()
+    
+    def get_dead_deliveries(self, user_id, limit=50):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            SELECT * FROM delivery_retries WHERE user_id = ? AND status = 'dead'
+            ORDER BY updated_at DESC LIMIT ?
+        ''', (user_id, limit))
+        retries = self.hydrate_messages(c, c.fetchall())
+        conn.close()
+        return retries
+    
+    def requeue_delivery(self, retry_id, user_id):
+        """Move a dead-lettered delivery back onto the retry queue"""
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            UPDATE delivery_retries
+            SET status = 'pending', attempts = 0, next_attempt_at = unixepoch(), updated_at = unixepoch()
+            WHERE id = ? AND user_id = ? AND status = 'dead'
+        ''', (retry_id, user_id))
+        requeued = c.rowcount
+        conn.commit()
+        conn.close()
+        return requeued > 0
+    
+    # Idempotency Keys
+    def reserve_idempotency_key(self, user_id, endpoint, key, request_hash, expired_before=None):
+        """Claim a key for a new request; returns the existing row if it was already used
+        
+        A row created before expired_before is past its TTL and is claimed again as new.
+        """
+        conn = self.get_connection()
+        c = conn.cursor()
+        if expired_before is not None:
+            c.execute('DELETE FROM idempotency_keys WHERE user_id = ? AND endpoint = ? AND key = ? AND created_at < ?',
+                      (user_id, endpoint, key, int(expired_before)))
+        c.execute('''
+            INSERT OR IGNORE INTO idempotency_keys (user_id, endpoint, key, request_hash)
+            VALUES (?, ?, ?, ?)
+        ''', (user_id, endpoint, key, request_hash))
+        existing = None
+        if c.rowcount == 0:
+            c.execute('SELECT * FROM idempotency_keys WHERE user_id = ? AND endpoint = ? AND key = ?',
+                      (user_id, endpoint, key))
+            existing = c.fetchone()
+        conn.commit()
+        conn.close()
+        return existing
+    
+    def complete_idempotency_key(self, user_id, endpoint, key, status_code, response):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            UPDATE idempotency_keys SET status_code = ?, response = ?
+            WHERE user_id = ? AND endpoint = ? AND key = ?
+        ''', (status_code, json.dumps(response), user_id, endpoint, key))
+        conn.commit()
+        conn.close()
+    
+    def release_idempotency_key(self, user_id, endpoint, key):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('DELETE FROM idempotency_keys WHERE user_id = ? AND endpoint = ? AND key = ? AND status_code IS NULL',
+                  (user_id, endpoint, key))
+        conn.commit()
+        conn.close()
+    
+    def purge_idempotency_keys(self, before):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('DELETE FROM idempotency_keys WHERE created_at < ?', (int(before),))
+        conn.commit()
+        conn.close()
+    
+    # Import Jobs
+    def create_import_job(self, job_id, user_id, fmt):
+        """Register a job unless the user already has one queued or running; False if so"""
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            INSERT INTO import_jobs (id, user_id, format)
+            SELECT ?, ?, ? WHERE NOT EXISTS (
+                -- Jobs of a process that died mid-import stop blocking after an hour
+                SELECT 1 FROM import_jobs
+                WHERE user_id = ? AND status IN ('queued', 'running') AND created_at > unixepoch() - 3600
+            )
+        ''', (job_id, user_id, fmt, user_id))
+        created = c.rowcount
+        conn.commit()
+        conn.close()
+        return created > 0
+    
+    def update_import_job(self, job_id, status, size=None, rows_read=None, rows_imported=None, rows_failed=None,
+                          errors=None):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            UPDATE import_jobs
+            SET status = ?, bytes = COALESCE(?, bytes), rows_read = COALESCE(?, rows_read),
+                rows_imported = COALESCE(?, rows_imported), rows_failed = COALESCE(?, rows_failed),
+                errors = COALESCE(?, errors),
+                finished_at = CASE WHEN ? IN ('done', 'failed') THEN unixepoch() ELSE finished_at END
+            WHERE id = ?
+        ''', (status, size, rows_read, rows_imported, rows_failed, json.dumps(errors) if errors is not None else None,
+              status, job_id))
+        conn.commit()
+        conn.close()
+    
+    def get_import_job(self, job_id, user_id):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('SELECT * FROM import_jobs WHERE id = ? AND user_id = ?', (job_id, user_id))
+        job = c.fetchone()
+        conn.close()
+        return job
+    
+    # Channel Webhooks
+    def get_channel_webhooks(self):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('SELECT * FROM channel_webhooks')
+        rows = c.fetchall()
+        conn.close()
+        return rows
+    
+    def save_channel_webhook(self, channel_id, guild_id, webhook_id, webhook_token):
+        """Store (or, with webhook_id None, forget) a channel's webhook; its backend choice is kept"""
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            INSERT INTO channel_webhooks (channel_id, guild_id, webhook_id, webhook_token) VALUES (?, ?, ?, ?)
+            ON CONFLICT(channel_id) DO UPDATE SET
+                guild_id = COALESCE(excluded.guild_id, guild_id), webhook_id = excluded.webhook_id,
+                webhook_token = excluded.webhook_token, updated_at = unixepoch()
+        ''', (str(channel_id), str(guild_id) if guild_id else None,
+              str(webhook_id) if webhook_id else None, webhook_token))
+        conn.commit()
+        conn.close()
+    
+    def set_channel_backend(self, channel_id, guild_id, backend):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            INSERT INTO channel_webhooks (channel_id, guild_id, backend) VALUES (?, ?, ?)
+            ON CONFLICT(channel_id) DO UPDATE SET backend = excluded.backend, updated_at = unixepoch()
+        ''', (str(channel_id), str(guild_id), backend))
+        conn.commit()
+        conn.close()
+    
+    # Sessions
+    def get_session(self, session_id):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('SELECT user_id, data, expires_at FROM sessions WHERE id = ?', (session_id,))
+        row = c.fetchone()
+        conn.close()
+        return row
+    
+    def save_session(self, session_id, user_id, data, expires_at):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            INSERT INTO sessions (id, user_id, data, expires_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET user_id = excluded.user_id, data = excluded.data, expires_at = excluded.expires_at
+        ''', (session_id, user_id, data, expires_at))
+        conn.commit()
+        conn.close()
+    
+    def touch_session(self, session_id, expires_at):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('UPDATE sessions SET expires_at = ? WHERE id = ?', (expires_at, session_id))
+        conn.commit()
+        conn.close()
+    
+    def delete_session(self, session_id):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+        conn.commit()
+        conn.close()
+    
+    def delete_user_sessions(self, user_id):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('DELETE FROM sessions WHERE user_id = ?', (user_id,))
+        deleted = c.rowcount
+        conn.commit()
+        conn.close()
+        return deleted
+    
+    def purge_sessions(self, before):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('DELETE FROM sessions WHERE expires_at < ?', (int(before),))
+        conn.commit()
+        conn.close()
+    
+    # Shard Workers
+    def save_worker_heartbeat(self, worker_id, url, shard_count, shard_ids, ready, stats):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            INSERT OR REPLACE INTO shard_workers (worker_id, url, shard_count, shard_ids, ready, stats, heartbeat_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (worker_id, url, shard_count, json.dumps(shard_ids), int(ready), json.dumps(stats), int(time.time())))
+        conn.commit()
+        conn.close()
+    
+    def get_live_workers(self, max_age=45):
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('SELECT * FROM shard_workers WHERE heartbeat_at >= ? ORDER BY heartbeat_at DESC', (int(time.time()) - max_age,))
+        workers = c.fetchall()
+        conn.close()
+        return workers
+    
+    # Analytics
+    def update_analytics(self, messages=0, files=0):
+        today = datetime.now().strftime('%Y-%m-%d')
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            INSERT INTO analytics (date, messages_sent, files_sent)
+            VALUES (?, ?, ?)
+            ON CONFLICT(date) DO UPDATE SET
+                messages_sent = messages_sent + excluded.messages_sent,
+                files_sent = files_sent + excluded.files_sent
+        ''', (today, messages, files))
+        conn.commit()
+        conn.close()
+    
+    def get_analytics(self):
+        today = datetime.now().strftime('%Y-%m-%d')
+        week_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+        month_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+        
+        conn = self.get_connection()
+        c = conn.cursor()
+        
+        c.execute('SELECT SUM(messages_sent) as total FROM analytics WHERE date = ?', (today,))
+        today_msgs = c.fetchone()['total'] or 0
+        
+        c.execute('SELECT SUM(messages_sent) as total FROM analytics WHERE date >= ?', (week_ago,))
+        week_msgs = c.fetchone()['total'] or 0
+        
+        c.execute('SELECT SUM(messages_sent) as total FROM analytics WHERE date >= ?', (month_ago,))
+        month_msgs = c.fetchone()['total'] or 0
+        
+        c.execute('SELECT SUM(files_sent) as total FROM analytics WHERE date = ?', (today,))
+        today_files = c.fetchone()['total'] or 0
+        
+        conn.close()
+        
+        return {
+            'today': today_msgs,
+            'week': week_msgs,
+            'month': month_msgs,
+            'files_today': today_files
+        }
+
+db = Database()
+
+# ============================================================================
+# DISCORD OAUTH CLIENT
+# ============================================================================
+
+def pooled_http_session(pool_size):
+    """requests.Session that keeps up to pool_size connections per host alive"""
+    http = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    http.mount('https://', adapter)
+    http.mount('http://', adapter)
+    return http
+
+class DiscordOAuth:
+    """Discord OAuth2 client"""
+    API_BASE = config.discord_api_base
     AUTHORIZE_URL = f'{API_BASE}/oauth2/authorize'
     TOKEN_URL = f'{API_BASE}/oauth2/token'
+    # Shared by request handlers and the background refresher
+    http = pooled_http_session(max(10, config.token_refresh_workers))
     
     @staticmethod
     def get_authorize_url():
@@ -356,19 +1638,917 @@ class DiscordOAuth:
             'redirect_uri': config.redirect_uri
         }
         headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-        response = requests.post(DiscordOAuth.TOKEN_URL, data=data, headers=headers)
+        response = DiscordOAuth.http.post(DiscordOAuth.TOKEN_URL, data=data, headers=headers)
         return response.json()
     
+    @staticmethod
+    def refresh_access_token(refresh_token):
+        """Returns (status_code, body)"""
+        data = {
+            'client_id': config.client_id,
+            'client_secret': config.client_secret,
+            'grant_type': 'refresh_token',
+            'refresh_token': refresh_token
+        }
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        response = DiscordOAuth.http.post(DiscordOAuth.TOKEN_URL, data=data, headers=headers,
+                                          timeout=config.token_refresh_timeout)
+        return response.status_code, response.json()
+    
     @staticmethod
     def get_user_data(access_token):
         headers = {'Authorization': f'Bearer {access_token}'}
-        response = requests.get(f"{DiscordOAuth.API_BASE}/users/@me", headers=headers)
+        response = DiscordOAuth.http.get(f"{DiscordOAuth.API_BASE}/users/@me", headers=headers)
         return response.json()
+    
+    @staticmethod
+    def get_user_guilds(access_token):
+        headers = {'Authorization': f'Bearer {access_token}'}
+        response = DiscordOAuth.http.get(f"{DiscordOAuth.API_BASE}/users/@me/guilds", headers=headers)
+        return response.json()
+
+# ============================================================================
+# USER GUILD CACHE
+# ============================================================================
+
+class UserGuildCache:
+    """Per-user cache of OAuth guild ids with TTL and background refresh"""
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}  # user_id -> (fetched_at, frozenset of guild ids)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+    
+    def store(self, user_id, guilds):
+        guild_ids = frozenset(int(g['id']) for g in guilds)
+        with self._lock:
+            self._entries[user_id] = (time.time(), guild_ids)
+        return guild_ids
+    
+    def fetch(self, user_id, access_token):
+        """Fetch the user's guild list from Discord and cache it"""
+        guilds = DiscordOAuth.get_user_guilds(access_token)
+        if not isinstance(guilds, list):
+            print(f"❌ Guild list fetch failed for {user_id}: {guilds.get('message', guilds)}")
+            return None
+        return self.store(user_id, guilds)
+    
+    def get(self, user_id):
+        """Return cached guild ids, refreshing in the background once stale"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        fetched_at, guild_ids = entry
+        if time.time() - fetched_at > self.ttl:
+            self.refresh_async(user_id)
+        return guild_ids
+    
+    def refresh_async(self, user_id):
+        with self._lock:
+            if user_id in self._refreshing:
+                return
+            self._refreshing.add(user_id)
+        threading.Thread(target=self._refresh, args=(user_id,), daemon=True).start()
+    
+    def _refresh(self, user_id):
+        try:
+            user = db.get_user(user_id)
+            if user and user['access_token']:
+                self.fetch(user_id, user['access_token'])
+        except Exception as e:
+            print(f"❌ Guild list refresh error for {user_id}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(user_id)
+    
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+user_guild_cache = UserGuildCache(config.user_guilds_ttl)
+
+# ============================================================================
+# OAUTH TOKEN REFRESH
+# ============================================================================
+
+class TokenRefresher:
+    """Refreshes OAuth tokens nearing expiry in bounded batches, off the request path
+    
+    Rows are leased in the database, so several web processes can run a refresher without
+    spending the same (single-use) refresh token twice.
+    """
+    def __init__(self, workers):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='token-refresh')
+        self._lags = deque(maxlen=1000)  # seconds between entering the refresh window and being refreshed
+        self._lock = threading.Lock()
+        self._started = False
+        self.stats = {'refreshed': 0, 'failed': 0, 'revoked': 0, 'late': 0}
+    
+    def start(self):
+        if not self._started:
+            self._started = True
+            threading.Thread(target=self.run, daemon=True).start()
+    
+    def run(self):
+        while True:
+            try:
+                claimed = self.refresh_due()
+            except Exception as e:
+                print(f"❌ Token refresh error: {e}")
+                claimed = 0
+            # A full batch means more tokens are due; keep draining
+            if claimed < config.token_refresh_batch:
+                time.sleep(config.token_refresh_interval)
+    
+    def refresh_due(self):
+        """Refresh one batch of tokens that expire within the margin; returns how many were claimed"""
+        rows = db.claim_expiring_tokens(int(time.time() + config.token_refresh_margin), config.token_refresh_lease,
+                                        config.token_refresh_batch)
+        list(self._pool.map(self.refresh_one, rows))
+        return len(rows)
+    
+    def refresh_one(self, row):
+        started = time.time()
+        try:
+            status, data = DiscordOAuth.refresh_access_token(row['refresh_token'])
+        except (requests.RequestException, ValueError) as e:
+            status, data = None, {'error': str(e)}
+        
+        if status == 200 and 'access_token' in data:
+            db.save_refreshed_token(row['id'], row['refresh_token'], data['access_token'],
+                                    data.get('refresh_token', row['refresh_token']),
+                                    int(time.time() + data.get('expires_in', 604800)))
+            with self._lock:
+                self.stats['refreshed'] += 1
+                self.stats['late'] += started > row['expires_at']
+                self._lags.append(max(0.0, started - (row['expires_at'] - config.token_refresh_margin)))
+        elif data.get('error') == 'invalid_grant':
+            # Revoked or already used elsewhere: stop retrying until the user logs in again
+            db.drop_refresh_token(row['id'], row['refresh_token'])
+            with self._lock:
+                self.stats['revoked'] += 1
+            print(f"🔑 OAuth grant of user {row['id']} is no longer valid")
+        else:
+            delay = min(config.token_refresh_interval * 2 ** row['refresh_failures'], 3600)
+            db.token_refresh_failed(row['id'], int(time.time() + delay))
+            with self._lock:
+                self.stats['failed'] += 1
+            print(f"⚠️ Token refresh for user {row['id']} failed ({status}): {data.get('error')}")
+    
+    def metrics(self):
+        with self._lock:
+            lags = sorted(self._lags)
+            return {
+                **self.stats,
+                'lag_s': {
+                    'p50': round(percentile(lags, 50), 1) if lags else None,
+                    'p95': round(percentile(lags, 95), 1) if lags else None,
+                    'max': round(lags[-1], 1) if lags else None
+                }
+            }
+
+token_refresher = TokenRefresher(config.token_refresh_workers)
+
+# ============================================================================
+# OUTBOUND SEND QUEUE
+# ============================================================================
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+class SendBudget:
+    """Token bucket shared by every outbound send path, paused on Retry-After"""
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self._lock = threading.Lock()
+    
+    def reserve(self):
+        """Take a token and return how long the caller must wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+            return max(wait, self.paused_until - now)
+    
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    
+    def pause(self, seconds):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+send_budget = SendBudget(config.send_rate_per_second)
+
+class OutboundQueue:
+    """Central send queue with weighted priority lanes and per-user fair sharing"""
+    LANES = ('interactive', 'welcome', 'scheduled')
+    LANE_WEIGHTS = {'interactive': 8, 'welcome': 4, 'scheduled': 1}
+    
+    def __init__(self, concurrency, user_weights=None):
+        self.concurrency = concurrency
+        self.user_weights = user_weights or {}
+        self._queues = {lane: OrderedDict() for lane in self.LANES}  # user_key -> deque of jobs
+        self._user_credits = {lane: {} for lane in self.LANES}
+        self._lane_credits = dict(self.LANE_WEIGHTS)
+        self._depth = {lane: 0 for lane in self.LANES}
+        self._waits = {lane: deque(maxlen=1000) for lane in self.LANES}
+        self._completed = {lane: 0 for lane in self.LANES}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wakeup = None
+    
+    def start(self, loop):
+        """Start the sender tasks on the bot's event loop (idempotent)"""
+        if self._loop:
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        for _ in range(self.concurrency):
+            loop.create_task(self._sender())
+        self._wakeup.set()
+    
+    def submit(self, lane, user_key, factory, budget=True):
+        """Queue a coroutine factory; safe to call from any thread or loop
+        
+        budget=False skips the shared bot rate budget (webhook sends are limited per webhook).
+        """
+        future = Future()
+        with self._lock:
+            self._queues[lane].setdefault(user_key, deque()).append((factory, future, time.monotonic(), budget))
+            self._depth[lane] += 1
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return future
+    
+    def depth(self):
+        return sum(self._depth.values())
+    
+    def _next_job(self):
+        with self._lock:
+            for _ in range(2):
+                for lane in self.LANES:
+                    if self._depth[lane] and self._lane_credits[lane] > 0:
+                        self._lane_credits[lane] -= 1
+                        return lane, self._pop_fair(lane)
+                # Every lane with work has spent its share this round
+                self._lane_credits = dict(self.LANE_WEIGHTS)
+            return None
+    
+    def _pop_fair(self, lane):
+        """Deficit round robin between the users queued on a lane"""
+        users = self._queues[lane]
+        credits = self._user_credits[lane]
+        user_key, jobs = next(iter(users.items()))
+        credit = credits.pop(user_key, None) or self.user_weights.get(user_key, 1)
+        job = jobs.popleft()
+        self._depth[lane] -= 1
+        
+        credit -= 1
+        if not jobs:
+            del users[user_key]
+        elif credit <= 0:
+            users.move_to_end(user_key)
+        else:
+            credits[user_key] = credit
+        return job
+    
+    async def _sender(self):
+        while True:
+            item = self._next_job()
+            if item is None:
+                self._wakeup.clear()
+                item = self._next_job()
+                if item is None:
+                    await self._wakeup.wait()
+                    continue
+            
+            lane, (factory, future, enqueued_at, budget) = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            with self._lock:
+                self._waits[lane].append(time.monotonic() - enqueued_at)
+            try:
+                if budget:
+                    await send_budget.acquire()
+                future.set_result(await factory())
+            except BaseException as e:
+                # Resolve the future whatever happened, or the request awaiting it hangs
+                future.set_exception(e)
+                if not isinstance(e, Exception):
+                    raise  # cancellation stops this sender
+            finally:
+                with self._lock:
+                    self._completed[lane] += 1
+    
+    def metrics(self):
+        with self._lock:
+            lanes = {}
+            for lane in self.LANES:
+                waits = sorted(self._waits[lane])
+                lanes[lane] = {
+                    'depth': self._depth[lane],
+                    'users': len(self._queues[lane]),
+                    'completed': self._completed[lane],
+                    'wait_ms': {
+                        'p50': round(percentile(waits, 50) * 1000, 1) if waits else None,
+                        'p95': round(percentile(waits, 95) * 1000, 1) if waits else None,
+                        'max': round(waits[-1] * 1000, 1) if waits else None
+                    }
+                }
+        return lanes
+
+outbound_queue = OutboundQueue(config.send_concurrency, config.send_user_weights)
+
+class AdmissionControl:
+    """In-memory per-user token buckets and a global outbound backlog ceiling"""
+    def __init__(self):
+        self.limits = {
+            'send': (config.quota_send_per_minute / 60, config.quota_send_burst),
+            'schedule': (config.quota_schedule_per_minute / 60, config.quota_schedule_burst)
+        }
+        self._buckets = {}  # (kind, user_id) -> [tokens, updated]
+        self._lock = threading.Lock()
+    
+    def take(self, kind, user_id, cost):
+        """Spend cost tokens; returns 0 when admitted, else seconds until it would be"""
+        rate, burst = self.limits[kind]
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get((kind, user_id))
+            if bucket is None:
+                if len(self._buckets) > 10000:
+                    self._prune(now)
+                bucket = self._buckets[(kind, user_id)] = [burst, now]
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0
+            return (cost - bucket[0]) / rate
+    
+    def _prune(self, now):
+        """Forget buckets that have refilled completely"""
+        for key, (tokens, updated) in list(self._buckets.items()):
+            rate, burst = self.limits[key[0]]
+            if tokens + (now - updated) * rate >= burst:
+                del self._buckets[key]
+    
+    def backlog_delay(self, cost):
+        """Seconds until the outbound queue has room for cost more sends, or 0"""
+        overflow = outbound_queue.depth() + cost - config.max_outbound_depth
+        return overflow / config.send_rate_per_second if overflow > 0 else 0
+    
+    def refusal(self, kind, user_id, cost, queued=True):
+        """Charge cost to the user's quota; returns None when admitted, else (status, reason, retry_after)"""
+        rate, burst = self.limits[kind]
+        if cost > burst:
+            return 413, f'Too many channels in one request (max {burst})', None
+        
+        retry_after = self.backlog_delay(cost) if queued else 0
+        reason = 'The bot is busy delivering other messages. Please retry shortly.'
+        if not retry_after:
+            retry_after = self.take(kind, user_id, cost)
+            reason = 'Rate limit reached. Please slow down.'
+        if not retry_after:
+            return None
+        return 429, reason, math.ceil(retry_after)
+    
+    def check(self, kind, user_id, cost, queued=True):
+        """Return a 429/413 response when the request must be refused, else None"""
+        refused = self.refusal(kind, user_id, cost, queued)
+        if not refused:
+            return None
+        status, reason, retry_after = refused
+        if status == 413:
+            return jsonify({'error': reason}), 413
+        return jsonify({'error': reason, 'retry_after': retry_after}), 429, {'Retry-After': str(retry_after)}
+
+admission = AdmissionControl()
+
+def retry_delay(attempts, retry_after=None):
+    """Exponential backoff with full jitter, never sooner than Retry-After"""
+    ceiling = min(config.retry_max_delay, config.retry_base_delay * (2 ** attempts))
+    return max(retry_after or 0, random.uniform(config.retry_base_delay, ceiling))
+
+# ============================================================================
+# PREPARED MESSAGE PAYLOADS
+# ============================================================================
+
+class PreparedMessage:
+    """Message with embeds built once, reusable for every channel and resend"""
+    __slots__ = ('content', 'embeds', 'files', 'timestamped')
+    
+    def __init__(self, content, embeds_data=None, files=None):
+        self.content = content or None
+        self.embeds = [build_embed(data) for data in embeds_data or []]
+        self.files = files or []
+        self.timestamped = [bool(data.get('timestamp')) for data in embeds_data or []]
+    
+    def send_embeds(self):
+        """Embeds for one send; timestamped ones are copied and stamped now"""
+        if not any(self.timestamped):
+            return self.embeds or None
+        embeds = []
+        for embed, stamped in zip(self.embeds, self.timestamped):
+            if stamped:
+                embed = embed.copy()
+                embed.timestamp = datetime.now()
+            embeds.append(embed)
+        return embeds
+
+def build_embed(data):
+    embed = discord.Embed()
+    if data.get('title'): embed.title = data['title']
+    if data.get('description'): embed.description = data['description']
+    if data.get('color'):
+        color = data['color'].lstrip('#')
+        embed.color = int(color, 16)
+    if data.get('author'): embed.set_author(**data['author'])
+    if data.get('fields'):
+        for f in data['fields']:
+            embed.add_field(name=f.get('name', ''), value=f.get('value', ''), inline=f.get('inline', False))
+    if data.get('thumbnail'): embed.set_thumbnail(url=data['thumbnail'])
+    if data.get('image'): embed.set_image(url=data['image'])
+    if data.get('footer'): embed.set_footer(**data['footer'])
+    if data.get('timestamp'): embed.timestamp = datetime.now()
+    return embed
+
+class PayloadCache:
+    """LRU of PreparedMessage objects keyed by payload hash"""
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get_or_build(self, content, embed_json, files_json):
+        key = payload_hash(content, embed_json, files_json)
+        with self._lock:
+            prepared = self._entries.get(key)
+            if prepared:
+                self._entries.move_to_end(key)
+                return prepared
+        
+        prepared = PreparedMessage(
+            content,
+            json.loads(embed_json) if embed_json else None,
+            json.loads(files_json) if files_json else None
+        )
+        with self._lock:
+            self._entries[key] = prepared
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return prepared
+
+payload_cache = PayloadCache(config.payload_cache_size)
+
+# ============================================================================
+# WEBHOOK DELIVERY
+# ============================================================================
+
+class WebhookDelivery:
+    """Per-channel webhooks as a send path outside the bot's global rate budget"""
+    BACKENDS = ('bot', 'webhook')
+    
+    def __init__(self):
+        self._hooks = None  # channel_id -> (webhook_id, token), loaded from the database on first use
+        self._backends = {}  # channel_id -> backend chosen for that channel
+        self._unavailable = {}  # channel_id -> monotonic time until webhook creation is retried
+        self._locks = {}
+        self.stats = {'webhook': 0, 'fallback': 0, 'created': 0}
+    
+    def _load(self):
+        if self._hooks is None:
+            self._hooks = {}
+            for row in db.get_channel_webhooks():
+                channel_id = int(row['channel_id'])
+                if row['webhook_id']:
+                    self._hooks[channel_id] = (int(row['webhook_id']), row['webhook_token'])
+                if row['backend']:
+                    self._backends[channel_id] = row['backend']
+    
+    def backend_for(self, channel_id, override=None):
+        """'webhook' or 'bot' for one send: the broadcast's choice, else the channel's, else the default"""
+        self._load()
+        channel_id = int(channel_id)
+        backend = override or self._backends.get(channel_id) or config.delivery_backend
+        if backend == 'webhook' and self._unavailable.get(channel_id, 0) > time.monotonic():
+            return 'bot'
+        return backend
+    
+    def set_backend(self, channel_id, guild_id, backend):
+        self._load()
+        db.set_channel_backend(channel_id, guild_id, backend)
+        if backend:
+            self._backends[int(channel_id)] = backend
+        else:
+            self._backends.pop(int(channel_id), None)
+    
+    async def webhook_for(self, channel, bot):
+        """The channel's webhook, reusing one the bot already owns before creating a new one"""
+        self._load()
+        cached = self._hooks.get(channel.id)
+        if not cached:
+            lock = self._locks.setdefault(channel.id, asyncio.Lock())
+            async with lock:
+                cached = self._hooks.get(channel.id)
+                if not cached:
+                    owned = [h for h in await channel.webhooks() if h.token and h.user and h.user.id == bot.user.id]
+                    webhook = owned[0] if owned else await channel.create_webhook(name=config.webhook_name)
+                    self.stats['created'] += not owned
+                    cached = self._hooks[channel.id] = (webhook.id, webhook.token)
+                    db.save_channel_webhook(channel.id, channel.guild.id, webhook.id, webhook.token)
+        return discord.Webhook.partial(*cached, client=bot)
+    
+    @staticmethod
+    def can_use(channel):
+        """Webhooks need a channel type that has them and the Manage Webhooks permission there"""
+        return hasattr(channel, 'create_webhook') and channel.permissions_for(channel.guild.me).manage_webhooks
+    
+    async def send(self, channel, bot, prepared, files):
+        webhook = await self.webhook_for(channel, bot)
+        kwargs = {'content': prepared.content}
+        embeds = prepared.send_embeds()
+        if embeds:
+            kwargs['embeds'] = embeds
+        if files:
+            kwargs['files'] = files
+        await webhook.send(**kwargs)
+        self.stats['webhook'] += 1
+    
+    def failed(self, channel_id, error):
+        """Forget a deleted webhook; back off from channels where one cannot be made"""
+        self.stats['fallback'] += 1
+        if isinstance(error, discord.NotFound):
+            self._hooks.pop(channel_id, None)
+            db.save_channel_webhook(channel_id, None, None, None)
+        elif isinstance(error, discord.Forbidden):
+            self._unavailable[channel_id] = time.monotonic() + config.webhook_retry_after
+
+webhook_delivery = WebhookDelivery()
+
+# ============================================================================
+# CHANNEL CIRCUIT BREAKER
+# ============================================================================
+
+class ChannelBreaker:
+    """Per-channel circuit breaker: known-dead channels fail fast and are probed again with backoff
+    
+    A channel that was deleted, answers 404 or refuses the bot with Missing Access is opened; until
+    its probe time every send fails without a Discord round trip, then one send goes through as a
+    probe (half-open). Success closes the channel; another failure doubles the wait up to
+    channel_probe_max. Missing Permissions is not a death: the bot still sees the channel and the
+    fix is usually a role change away.
+    """
+    DEAD_CODES = {50001: 'Bot cannot access this channel', 10003: 'Channel not found'}
+    
+    def __init__(self):
+        self._open = None  # channel_id -> {'guild_id', 'failures', 'reason', 'probe_at'}, loaded on first use
+        self._probing = set()
+        self._lock = threading.Lock()  # _open is touched from the bot loop, to_thread workers and Flask threads
+        self.stats = {'fast_failed': 0, 'tripped': 0, 'recovered': 0}
+    
+    @classmethod
+    def death_reason(cls, error):
+        """Why a Forbidden/NotFound from Discord confirms the channel is dead, or None if it does not"""
+        return cls.DEAD_CODES.get(getattr(error, 'code', None))
+    
+    def _load(self):
+        if self._open is None:
+            rows = db.get_channel_health()
+            with self._lock:
+                if self._open is None:
+                    self._open = {int(row['channel_id']): {'guild_id': row['guild_id'], 'failures': row['failures'],
+                                                           'reason': row['reason'], 'probe_at': row['probe_at']}
+                                  for row in rows}
+    
+    def check(self, channel_id):
+        """None if a send may go ahead, else the reason the channel is known dead"""
+        self._load()
+        channel_id = int(channel_id)
+        state = self._open.get(channel_id)
+        if not state:
+            return None
+        if state['probe_at'] <= time.time() and channel_id not in self._probing:
+            self._probing.add(channel_id)
+            return None
+        self.stats['fast_failed'] += 1
+        return state['reason']
+    
+    def release(self, channel_id):
+        """End a send that may have been the probe, whatever its outcome"""
+        self._probing.discard(int(channel_id))
+    
+    def failed(self, channel_id, guild_id, reason):
+        self._load()
+        channel_id = int(channel_id)
+        with self._lock:
+            state = self._open.get(channel_id)
+            failures = state['failures'] + 1 if state else 1
+            delay = min(config.channel_probe_base * 2 ** (failures - 1), config.channel_probe_max)
+            guild_id = str(guild_id) if guild_id else state and state['guild_id']
+            self._open[channel_id] = {'guild_id': guild_id, 'failures': failures, 'reason': reason,
+                                      'probe_at': int(time.time() + delay)}
+        db.save_channel_health(channel_id, guild_id, failures, reason, int(time.time() + delay))
+        if not state:
+            self.stats['tripped'] += 1
+            print(f"🔌 Channel {channel_id} marked dead: {reason}")
+    
+    def succeeded(self, channel_id):
+        channel_id = int(channel_id)
+        with self._lock:
+            if not self._open or self._open.pop(channel_id, None) is None:
+                return
+        db.clear_channel_health(channel_id)
+        self.stats['recovered'] += 1
+        print(f"✅ Channel {channel_id} is reachable again")
+    
+    def probe_soon(self, guild_id, channel_id=None):
+        """Access may be back (channel, role or guild changed): let the next send probe right away"""
+        self._load()
+        with self._lock:
+            for cid, state in self._open.items():
+                if channel_id == cid or (channel_id is None and state['guild_id'] == str(guild_id)):
+                    state['probe_at'] = 0
+    
+    def metrics(self):
+        self._load()
+        return {**self.stats, 'open': len(self._open)}
+
+channel_breaker = ChannelBreaker()
+
+# ============================================================================
+# LIVE EVENTS
+# ============================================================================
+
+class EventSubscription:
+    """Bounded buffer between publishers and one streaming connection"""
+    def __init__(self, user_id, max_events):
+        self.user_id = user_id  # None receives every user's events (worker relay)
+        self.max_events = max_events
+        self.events = deque()
+        self.overflowed = False
+        self._cond = threading.Condition()
+    
+    def push(self, event):
+        with self._cond:
+            # A stalled client must never grow memory or block the publisher: drop its
+            # buffer and tell it to resync from the REST endpoints instead
+            if len(self.events) >= self.max_events:
+                self.events.clear()
+                self.overflowed = True
+            else:
+                self.events.append(event)
+            self._cond.notify()
+    
+    def wait(self, timeout):
+        """Return (events, overflowed), blocking up to timeout for the first event"""
+        with self._cond:
+            if not self.events and not self.overflowed:
+                self._cond.wait(timeout)
+            events, overflowed = list(self.events), self.overflowed
+            self.events.clear()
+            self.overflowed = False
+            return events, overflowed
+
+class EventHub:
+    """Fans bot, delivery and scheduler events out to per-user SSE connections"""
+    def __init__(self):
+        self.next_id = 1
+        self.recent = deque(maxlen=config.events_replay_size)  # (id, event, user_id, data) for Last-Event-ID
+        self.subscribers = {}  # user_id -> set of EventSubscription; None key holds relays
+        self.relays = set()
+        self._lock = threading.Lock()
+    
+    def publish(self, event, data, user_id=None):
+        """Queue an event for one user, or for everyone when user_id is None; thread-safe"""
+        payload = json.dumps(data)  # serialized once however many connections receive it
+        with self._lock:
+            record = (self.next_id, event, user_id, payload)
+            self.next_id += 1
+            self.recent.append(record)
+            targets = list(self.subscribers.get(None, ()))
+            if user_id is None:
+                for subscriptions in self.subscribers.values():
+                    targets.extend(subscriptions)
+            else:
+                targets.extend(self.subscribers.get(user_id, ()))
+        for subscription in set(targets):
+            subscription.push(record)
+    
+    def subscribe(self, user_id, relay=False):
+        """Register a connection, or return None when the user is at the connection limit"""
+        key = None if relay else user_id
+        with self._lock:
+            subscriptions = self.subscribers.setdefault(key, set())
+            if not relay and len(subscriptions) >= config.events_max_per_user:
+                return None
+            size = config.events_queue_size * (8 if relay else 1)
+            subscription = EventSubscription(key, size)
+            subscriptions.add(subscription)
+            return subscription
+    
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self.subscribers.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self.subscribers.pop(subscription.user_id, None)
+    
+    def replay(self, subscription, last_id):
+        """Events after last_id for this connection, or None when they are no longer buffered"""
+        with self._lock:
+            if last_id >= self.next_id or (self.recent and self.recent[0][0] > last_id + 1):
+                return None
+            return [r for r in self.recent
+                    if r[0] > last_id and (subscription.user_id is None or r[2] in (None, subscription.user_id))]
+    
+    def connections(self):
+        with self._lock:
+            return sum(len(s) for s in self.subscribers.values())
+    
+    def delivery_progress(self, user_id, broadcast_id, total):
+        """Callback publishing one 'delivery' event per finished channel of a broadcast"""
+        done = [0]
+        def report(channel_id, outcome):
+            success, message, retry_after = outcome
+            done[0] += 1
+            self.publish('delivery', {
+                'broadcast_id': broadcast_id,
+                'channel_id': str(channel_id),
+                'success': success,
+                'message': message,
+                'retry_queued': not success and retry_after is not None,
+                'done': done[0],
+                'total': total
+            }, user_id)
+        return report
+    
+    def stream(self, subscription, last_id=None, initial=()):
+        """SSE body: replayed or initial events, then live events with periodic heartbeats"""
+        relay = subscription.user_id is None
+        
+        def frame(record):
+            event_id, event, user_id, payload = record
+            # Synthetic events (id 0) must not move the client's Last-Event-ID
+            head = f"id: {event_id}\n" if event_id else ''
+            if relay:
+                return f"{head}data: {{\"event\": {json.dumps(event)}, \"user_id\": {json.dumps(user_id)}, \"data\": {payload}}}\n\n"
+            return f"{head}event: {event}\ndata: {payload}\n\n"
+        
+        def generate():
+            try:
+                yield f"retry: {config.events_heartbeat * 1000}\n\n"
+                replayed = self.replay(subscription, last_id) if last_id is not None else None
+                if last_id is not None and replayed is None:
+                    yield frame((0, 'resync', None, '{}'))
+                for record in replayed or initial:
+                    yield frame(record)
+                
+                while True:
+                    events, overflowed = subscription.wait(config.events_heartbeat)
+                    if overflowed:
+                        yield frame((0, 'resync', None, '{}'))
+                    if events:
+                        yield ''.join(frame(record) for record in events)
+                    elif not overflowed:
+                        yield ": heartbeat\n\n"
+            finally:
+                self.unsubscribe(subscription)
+        return generate()
+    
+    def start_relays(self):
+        """Web tier: mirror every live worker's event stream into this hub"""
+        def supervise():
+            while True:
+                try:
+                    for url in {w['url'] for w in shard_router.live_workers()} - self.relays:
+                        self.relays.add(url)
+                        threading.Thread(target=self._relay, args=(url,), daemon=True).start()
+                except Exception as e:
+                    print(f"❌ Event relay supervisor error: {e}")
+                time.sleep(5)
+        threading.Thread(target=supervise, daemon=True).start()
+    
+    def _relay(self, url):
+        try:
+            response = shard_router._send('GET', url + '/api/events?relay=1', 0, stream=True)
+            for line in response.iter_lines(decode_unicode=True):
+                if line and line.startswith('data: '):
+                    record = json.loads(line[6:])
+                    self.publish(record['event'], record['data'], record['user_id'])
+        except Exception as e:
+            print(f"❌ Event relay from {url} dropped: {e}")
+        finally:
+            self.relays.discard(url)
+
+event_hub = EventHub()
+
+# ============================================================================
+# GUILD VERSIONS
+# ============================================================================
+
+class GuildVersions:
+    """Monotonic change versions per guild, channel and member for ETags and delta sync
+
+    Versions are microsecond timestamps so values from different workers compare;
+    anything not seen changing since startup carries the startup version.
+    """
+    def __init__(self, max_tracked=10000):
+        self.max_tracked = max_tracked
+        self._last = 0
+        self.started = self.tick()
+        self.guilds = {}  # guild_id -> last summary or membership change
+        self.channel_lists = {}  # guild_id -> last channel, role or overwrite change
+        self.access = {}  # guild_id -> last change that can alter every member's channel list
+        self.channels = {}  # channel_id -> last change to that channel
+        self.members = OrderedDict()  # (guild_id, user_id) -> last join, leave or role change
+        self.members_floor = self.started
+        self._lock = threading.Lock()
+    
+    def tick(self):
+        self._last = max(self._last + 1, time.time_ns() // 1000)
+        return self._last
+    
+    def guild_changed(self, guild_id):
+        with self._lock:
+            self.guilds[guild_id] = self.tick()
+    
+    def channel_changed(self, guild_id, channel_id, deleted=False):
+        with self._lock:
+            version = self.tick()
+            self.channel_lists[guild_id] = version
+            if deleted:
+                self.channels.pop(channel_id, None)
+            else:
+                self.channels[channel_id] = version
+    
+    def access_changed(self, guild_id):
+        """Roles or category overwrites changed; any member's visible channels may differ"""
+        with self._lock:
+            self.access[guild_id] = self.channel_lists[guild_id] = self.tick()
+    
+    def member_changed(self, guild_id, user_id, membership=True):
+        with self._lock:
+            version = self.tick()
+            self.members[(guild_id, user_id)] = version
+            self.members.move_to_end((guild_id, user_id))
+            if len(self.members) > self.max_tracked:
+                self.members_floor = self.members.popitem(last=False)[1]
+            if membership:
+                self.guilds[guild_id] = version
+    
+    def guild_version(self, guild_id):
+        return self.guilds.get(guild_id, self.started)
+    
+    def channels_version(self, guild_id, user_id):
+        """Version of one user's channel list in a guild"""
+        return max(self.channel_lists.get(guild_id, self.started),
+                   self.members.get((guild_id, user_id), self.members_floor))
+    
+    def changed_channels(self, guild_id, user_id, since, visible):
+        """Channels of visible changed after since, or None when the whole list must be resent"""
+        if (since < self.started or self.access.get(guild_id, 0) > since
+                or self.members.get((guild_id, user_id), self.members_floor) > since):
+            return None
+        return [c for c in visible if self.channels.get(int(c['id']), self.started) > since]
+
+guild_versions = GuildVersions()
+
+def etag_matches(etag):
+    return etag in request.if_none_match
+
+def versioned_response(payload, etag):
+    """JSON response carrying an ETag, or 304 when the client already has it"""
+    if etag_matches(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(payload)
+    response.headers['ETag'] = f'"{etag}"'
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 # ============================================================================
 # DISCORD BOT (PRODUCTION-GRADE)
 # ============================================================================
 
+# discord.py reads its REST base and default gateway from class attributes
+discord.http.Route.BASE = config.discord_api_base
+if config.discord_gateway_url:
+    discord.gateway.DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(config.discord_gateway_url)
+
 class DiscordBot:
     """Production Discord bot with all features"""
     def __init__(self):
@@ -377,13 +2557,29 @@ class DiscordBot:
         self.intents.guilds = True
         self.intents.members = True
         
-        self.bot = commands.Bot(
+        cache_options = {}
+        if config.member_cache_policy == 'dashboard':
+            # Keep only the bot's own member; dashboard users are pinned after ready
+            cache_options['member_cache_flags'] = discord.MemberCacheFlags.none()
+            cache_options['chunk_guilds_at_startup'] = False
+        
+        if config.shard_count or config.shard_ids:
+            cache_options['shard_count'] = config.shard_count
+            cache_options['shard_ids'] = config.shard_ids
+        bot_class = commands.AutoShardedBot if 'shard_count' in cache_options else commands.Bot
+        
+        self.bot = bot_class(
             command_prefix='!',
             intents=self.intents,
             help_command=None,
-            case_insensitive=True
+            case_insensitive=True,
+            **cache_options
         )
         self.ready = False
+        self.thread_id = None  # ident of the thread running the bot's event loop
+        self.scheduler_stats = {'claimed': 0, 'lease_renewals': 0, 'leases_lost': 0}
+        self.recent_members = OrderedDict()  # (guild_id, member_id) -> Member
+        self.member_misses = {}  # (guild_id, member_id) -> expiry of negative lookup
         
         self.setup_events()
     
@@ -392,6 +2588,7 @@ class DiscordBot:
         @self.bot.event
         async def on_ready():
             self.ready = True
+            event_hub.publish('bot', {'ready': True, 'connected': True, 'worker_id': config.worker_id})
             print(f"\n{'='*60}")
             print(f"✅ BOT READY: {self.bot.user} (ID: {self.bot.user.id})")
             print(f"✶ Guilds: {len(self.bot.guilds)}")
@@ -399,19 +2596,85 @@ class DiscordBot:
             print(f"{'='*60}\n")
             
             # Start background tasks
+            outbound_queue.start(self.bot.loop)
+            loop_watchdog.start(self.bot.loop)
             self.bot.loop.create_task(self.process_scheduled_messages())
+            self.bot.loop.create_task(self.process_retry_queue())
             self.bot.loop.create_task(self.update_presence())
+            self.bot.loop.create_task(self.publish_worker_state())
+            if config.member_cache_policy == 'dashboard':
+                self.bot.loop.create_task(self.cache_dashboard_members())
+        
+        @self.bot.event
+        async def on_disconnect():
+            event_hub.publish('bot', {'ready': self.ready, 'connected': False, 'worker_id': config.worker_id})
+        
+        @self.bot.event
+        async def on_resumed():
+            event_hub.publish('bot', {'ready': self.ready, 'connected': True, 'worker_id': config.worker_id})
         
         @self.bot.event
         async def on_member_join(member):
+            guild_versions.member_changed(member.guild.id, member.id)
+            if config.member_cache_policy == 'dashboard':
+                self.remember_member(member)
             await self.handle_welcome(member)
         
+        @self.bot.event
+        async def on_raw_member_remove(payload):
+            guild_versions.member_changed(payload.guild_id, payload.user.id)
+        
+        @self.bot.event
+        async def on_member_update(before, after):
+            if before.roles != after.roles:
+                guild_versions.member_changed(after.guild.id, after.id, membership=False)
+        
+        @self.bot.event
+        async def on_guild_channel_create(channel):
+            guild_versions.channel_changed(channel.guild.id, channel.id)
+        
+        @self.bot.event
+        async def on_guild_channel_delete(channel):
+            guild_versions.channel_changed(channel.guild.id, channel.id, deleted=True)
+            if isinstance(channel, discord.abc.Messageable):
+                await self.channel_dead(channel.id, channel.guild.id, 'Channel was deleted')
+        
+        @self.bot.event
+        async def on_guild_channel_update(before, after):
+            if isinstance(after, discord.CategoryChannel):
+                # Synced children inherit the category's overwrites
+                guild_versions.access_changed(after.guild.id)
+                channel_breaker.probe_soon(after.guild.id)
+            else:
+                guild_versions.channel_changed(after.guild.id, after.id)
+                channel_breaker.probe_soon(after.guild.id, after.id)
+        
+        @self.bot.event
+        async def on_guild_role_create(role):
+            guild_versions.access_changed(role.guild.id)
+        
+        @self.bot.event
+        async def on_guild_role_delete(role):
+            guild_versions.access_changed(role.guild.id)
+        
+        @self.bot.event
+        async def on_guild_role_update(before, after):
+            guild_versions.access_changed(after.guild.id)
+            channel_breaker.probe_soon(after.guild.id)
+        
+        @self.bot.event
+        async def on_guild_update(before, after):
+            guild_versions.guild_changed(after.id)
+        
         @self.bot.event
         async def on_guild_join(guild):
+            guild_versions.guild_changed(guild.id)
+            channel_breaker.probe_soon(guild.id)
             print(f"➕ Joined new guild: {guild.name} ({guild.id})")
         
         @self.bot.event
         async def on_guild_remove(guild):
+            guild_versions.guild_changed(guild.id)
             print(f"➖ Left guild: {guild.name} ({guild.id})")
     
     async def handle_welcome(self, member):
@@ -421,9 +2684,13 @@ class DiscordBot:
             if not config or not config['enabled']:
                 return
             
-            channel = self.bot.get_channel(int(config['channel_id']))
+            try:
+                channel = await self.resolve_channel(config['channel_id'])
+            except (discord.HTTPException, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"⚠️ Welcome channel {config['channel_id']} unavailable, skipping {member.name}: {e}")
+                return
             if not channel:
-                print(f"❌ Welcome channel not found for guild {member.guild.id}")
+                await self.channel_dead(config['channel_id'], member.guild.id, 'Channel not found')
                 return
             
             message = config['message'].replace('{user}', f'<@{member.id}>').replace('{username}', member.name).replace('{server}', member.guild.name)
@@ -443,12 +2710,56 @@ class DiscordBot:
                         embed.color = int(color, 16)
                     embeds = [embed]
             
-            await channel.send(content=message or None, embeds=embeds)
+            dead = channel_breaker.check(channel.id)
+            if dead:
+                await self.channel_dead(channel.id, member.guild.id, dead, trip=False)
+                return
+            try:
+                await asyncio.wrap_future(outbound_queue.submit(
+                    'welcome', member.guild.id, lambda: channel.send(content=message or None, embeds=embeds)))
+            except discord.NotFound:
+                await self.channel_dead(channel.id, member.guild.id, 'Channel not found')
+                return
+            except discord.Forbidden as e:
+                reason = channel_breaker.death_reason(e)
+                if reason:
+                    await self.channel_dead(channel.id, member.guild.id, reason)
+                else:
+                    print(f"❌ Welcome to {channel.id} refused: {e.text}")
+                return
+            finally:
+                channel_breaker.release(channel.id)
+            channel_breaker.succeeded(channel.id)
             print(f"✅ Welcome sent: {member.name} → {member.guild.name}")
             
         except Exception as e:
             print(f"❌ Welcome error: {e}")
     
+    async def channel_dead(self, channel_id, guild_id, reason, trip=True):
+        """Open the channel's breaker and switch off a welcome config that posts there
+        
+        Only for confirmed deaths: a channel delete event, a 404 or a Missing Access 403 from Discord.
+        """
+        if trip:
+            await asyncio.to_thread(channel_breaker.failed, channel_id, guild_id, reason)
+        guild_id = await asyncio.to_thread(db.disable_welcome_config, channel_id, reason)
+        if guild_id:
+            print(f"🔕 Welcome messages disabled for guild {guild_id}: {reason}")
+    
+    async def resolve_channel(self, channel_id):
+        """The channel from the cache or else the API; None only when Discord answers 404
+        
+        A cache miss is normal after a reconnect, while a guild is unavailable or for a channel
+        on another shard, so it is never taken as proof the channel is gone.
+        """
+        channel = self.bot.get_channel(int(channel_id))
+        if channel:
+            return channel
+        try:
+            return await self.bot.fetch_channel(int(channel_id))
+        except discord.NotFound:
+            return None
+    
     async def update_presence(self):
         """Update bot presence every 60 seconds"""
         await self.bot.wait_until_ready()
@@ -464,31 +2775,150 @@ class DiscordBot:
                 )
                 await asyncio.sleep(60)
             except Exception as e:
-                print(f"❌ Presence update error: {e}")
-                await asyncio.sleep(60)
+                print(f"❌ Presence update error: {e}")
+                await asyncio.sleep(60)
+    
+    def owned_shards(self):
+        """Return (shard_count, shard_ids) served by this process"""
+        shard_count = self.bot.shard_count or 1
+        shard_ids = getattr(self.bot, 'shard_ids', None)  # only AutoShardedBot has shard_ids
+        if shard_ids is None:
+            shard_ids = list(range(shard_count))
+        return shard_count, shard_ids
+    
+    def shard_stats(self):
+        """Per-shard latency and guild counts"""
+        shard_count, shard_ids = self.owned_shards()
+        guild_counts = {shard_id: 0 for shard_id in shard_ids}
+        for guild in self.bot.guilds:
+            shard_id = guild.shard_id or 0
+            guild_counts[shard_id] = guild_counts.get(shard_id, 0) + 1
+        
+        if isinstance(self.bot, commands.AutoShardedBot):
+            latencies = dict(self.bot.latencies)
+        else:
+            latencies = {0: self.bot.latency}
+        
+        stats = []
+        for shard_id in sorted(guild_counts):
+            latency = latencies.get(shard_id)
+            stats.append({
+                'shard_id': shard_id,
+                'latency_ms': round(latency * 1000) if latency is not None and not math.isnan(latency) else None,
+                'guilds': guild_counts[shard_id]
+            })
+        return stats
+    
+    async def publish_worker_state(self):
+        """Heartbeat this worker's shards into the shared registry"""
+        await self.bot.wait_until_ready()
+        
+        while not self.bot.is_closed():
+            try:
+                shard_count, shard_ids = self.owned_shards()
+                db.save_worker_heartbeat(config.worker_id, config.worker_url, shard_count, shard_ids,
+                                         self.ready, self.shard_stats())
+            except Exception as e:
+                print(f"❌ Worker heartbeat error: {e}")
+            await asyncio.sleep(15)
+    
+    def _guild_summary(self, guild):
+        return {
+            'id': str(guild.id),
+            'name': guild.name,
+            'icon': str(guild.icon.url) if guild.icon else None,
+            'member_count': guild.member_count,
+            'version': guild_versions.guild_version(guild.id)
+        }
     
     async def get_mutual_guilds(self, user_id):
         """Get guilds where both bot and user are present"""
         while not self.ready:
             await asyncio.sleep(0.5)
         
+        if config.mutual_guilds_mode == 'oauth':
+            return await self._get_mutual_guilds_oauth(user_id)
+        
         user_guilds = []
         for guild in self.bot.guilds:
             try:
                 member = guild.get_member(int(user_id))
                 if member:
-                    user_guilds.append({
-                        'id': str(guild.id),
-                        'name': guild.name,
-                        'icon': str(guild.icon.url) if guild.icon else None,
-                        'member_count': guild.member_count
-                    })
+                    user_guilds.append(self._guild_summary(guild))
             except Exception as e:
                 print(f"❌ Error checking guild {guild.id}: {e}")
                 continue
         
         return sorted(user_guilds, key=lambda g: g['name'].lower())
     
+    async def _get_mutual_guilds_oauth(self, user_id):
+        """Intersect the user's cached OAuth guild ids with the bot's guilds"""
+        guild_ids = user_guild_cache.get(user_id)
+        if guild_ids is None:
+            user = db.get_user(user_id)
+            if not user or not user['access_token']:
+                return []
+            guild_ids = await asyncio.to_thread(user_guild_cache.fetch, user_id, user['access_token'])
+            if guild_ids is None:
+                return []
+        
+        user_guilds = []
+        for guild_id in guild_ids:
+            guild = self.bot.get_guild(guild_id)
+            if guild:
+                user_guilds.append(self._guild_summary(guild))
+        
+        return sorted(user_guilds, key=lambda g: g['name'].lower())
+    
+    def remember_member(self, member):
+        """Keep a recent joiner in the bounded member cache"""
+        key = (member.guild.id, member.id)
+        self.recent_members[key] = member
+        self.recent_members.move_to_end(key)
+        while len(self.recent_members) > config.recent_members_max:
+            self.recent_members.popitem(last=False)
+    
+    async def cache_dashboard_members(self):
+        """Pin members who have logged into the dashboard in each guild's cache"""
+        user_ids = db.get_user_ids()
+        if not user_ids:
+            return
+        
+        for guild in list(self.bot.guilds):
+            for i in range(0, len(user_ids), 100):
+                try:
+                    await guild.query_members(user_ids=user_ids[i:i + 100], cache=True)
+                except Exception as e:
+                    print(f"❌ Dashboard member chunk error in {guild.id}: {e}")
+                    break
+        print(f"✅ Cached {len(user_ids)} dashboard users across {len(self.bot.guilds)} guilds")
+    
+    async def resolve_member(self, guild, user_id):
+        """Find a member in cache, falling back to a gateway lookup in low-memory mode"""
+        member = guild.get_member(user_id)
+        if member or config.member_cache_policy != 'dashboard':
+            return member
+        
+        key = (guild.id, user_id)
+        member = self.recent_members.get(key)
+        if member:
+            return member
+        if self.member_misses.get(key, 0) > time.time():
+            return None
+        
+        try:
+            members = await guild.query_members(user_ids=[user_id], cache=True)
+        except asyncio.TimeoutError:
+            members = []
+        if members:
+            return members[0]
+        
+        now = time.time()
+        if len(self.member_misses) > config.recent_members_max:
+            self.member_misses = {k: v for k, v in self.member_misses.items() if v > now}
+        self.member_misses[key] = now + 60
+        return None
+    
     async def get_guild_channels(self, guild_id, user_id):
         """Get text channels where user can send messages"""
         while not self.ready:
@@ -499,11 +2929,14 @@ class DiscordBot:
             print(f"❌ Guild not found: {guild_id}")
             return []
         
+        member = await self.resolve_member(guild, int(user_id))
+        if not member:
+            return []
+        
         channels = []
         for channel in guild.text_channels:
             try:
-                member = guild.get_member(int(user_id))
-                if member and channel.permissions_for(member).send_messages:
+                if channel.permissions_for(member).send_messages:
                     channels.append({
                         'id': str(channel.id),
                         'name': channel.name,
@@ -515,56 +2948,129 @@ class DiscordBot:
         
         return sorted(channels, key=lambda c: c['position'])
     
-    async def send_message(self, channel_id, content, embeds_data=None, files=None):
-        """Send message to Discord with all features"""
+    async def get_channel_sync(self, guild_id, user_id, since=None):
+        """A user's channel list with its version, or only what changed after since"""
+        guild_id, user_id = int(guild_id), int(user_id)
+        # Read the version first so a change racing this call is picked up next time
+        version = guild_versions.channels_version(guild_id, user_id)
+        channels = await self.get_guild_channels(guild_id, user_id)
+        result = {'guild_id': str(guild_id), 'version': version}
+        
+        changed = guild_versions.changed_channels(guild_id, user_id, since, channels) if since is not None and channels else None
+        if changed is None:
+            result.update(delta=False, channels=channels)
+        else:
+            # ids lists the whole current selection, so the client drops deleted or hidden channels
+            result.update(delta=True, channels=changed, ids=[c['id'] for c in channels])
+        return result
+    
+    async def broadcast(self, lane, user_key, channel_ids, content, embeds_data=None, files=None, prepared=None, progress=None,
+                        backend=None, guild_id=None):
+        """Fan a message out through the outbound queue; returns (channel_id, (success, message, retry_after))
+
+        progress, if given, is called with (channel_id, outcome) as each channel finishes.
+        backend ('bot' or 'webhook') overrides each channel's delivery backend.
+        guild_id is recorded against channels that turn out to be dead.
+        """
+        prepared = prepared or PreparedMessage(content, embeds_data, files)
+        futures = []
+        for channel_id in channel_ids:
+            choice = webhook_delivery.backend_for(channel_id, backend)
+            futures.append(outbound_queue.submit(
+                lane, user_key, lambda channel_id=channel_id, choice=choice: self.try_send(channel_id, prepared=prepared, backend=choice,
+                                                                                guild_id=guild_id),
+                budget=choice == 'bot'))
+        if progress:
+            for channel_id, future in zip(channel_ids, futures):
+                future.add_done_callback(lambda f, channel_id=channel_id: f.cancelled() or f.exception() or progress(channel_id, f.result()))
+        outcomes = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+        return list(zip(channel_ids, outcomes))
+    
+    async def try_send(self, channel_id, content=None, embeds_data=None, files=None, prepared=None, backend='bot', guild_id=None):
+        """Send a message and classify failures; retry_after is None for permanent ones
+        
+        backend='webhook' sends through the channel's webhook and falls back to channel.send.
+        """
         while not self.ready:
             await asyncio.sleep(0.5)
         
-        channel = self.bot.get_channel(int(channel_id))
+        dead = channel_breaker.check(channel_id)
+        if dead:
+            return False, dead, None
+        try:
+            return await self.send_to_channel(channel_id, content, embeds_data, files, prepared, backend, guild_id)
+        finally:
+            channel_breaker.release(channel_id)
+    
+    async def send_to_channel(self, channel_id, content, embeds_data, files, prepared, backend, guild_id=None):
+        try:
+            channel = await self.resolve_channel(channel_id)
+        except (discord.HTTPException, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Neither cached nor fetchable right now; the channel may well be alive, so retry later
+            print(f"⚠️ Channel {channel_id} unavailable: {e}")
+            return False, f"Channel {channel_id} is unavailable right now", 0
         if not channel:
-            return False, f"Channel {channel_id} not found"
+            await self.channel_dead(channel_id, guild_id, 'Channel not found')
+            return False, f"Channel {channel_id} not found", None
         
         try:
-            discord_files = []
-            if files:
-                for file_path in files:
-                    if os.path.exists(file_path):
-                        discord_files.append(discord.File(file_path))
-            
-            if embeds_data:
-                embeds = []
-                for data in embeds_data:
-                    embed = discord.Embed()
-                    if data.get('title'): embed.title = data['title']
-                    if data.get('description'): embed.description = data['description']
-                    if data.get('color'):
-                        color = data['color'].lstrip('#')
-                        embed.color = int(color, 16)
-                    if data.get('author'): embed.set_author(**data['author'])
-                    if data.get('fields'):
-                        for f in data['fields']:
-                            embed.add_field(name=f.get('name', ''), value=f.get('value', ''), inline=f.get('inline', False))
-                    if data.get('thumbnail'): embed.set_thumbnail(url=data['thumbnail'])
-                    if data.get('image'): embed.set_image(url=data['image'])
-                    if data.get('footer'): embed.set_footer(**data['footer'])
-                    if data.get('timestamp'): embed.timestamp = datetime.now()
-                    embeds.append(embed)
-                
-                await channel.send(content=content or None, embeds=embeds, files=discord_files or None)
-            else:
-                await channel.send(content=content or None, files=discord_files or None)
+            prepared = prepared or PreparedMessage(content, embeds_data, files)
+            
+            # discord.File objects are consumed by a send, so open them per channel
+            open_files = lambda: [discord.File(path) for path in prepared.files if os.path.exists(path)]
+            discord_files = open_files()
+            
+            if backend == 'webhook' and not webhook_delivery.can_use(channel):
+                # Chosen per broadcast or before the permission was revoked: the bot sends instead
+                backend = 'bot'
+                await send_budget.acquire()
+            if backend == 'webhook':
+                try:
+                    await webhook_delivery.send(channel, self.bot, prepared, discord_files)
+                    db.update_analytics(messages=1, files=len(discord_files))
+                    channel_breaker.succeeded(channel.id)
+                    return True, "Message sent via webhook", None
+                except discord.HTTPException as e:
+                    # Discord answered with an error, so nothing was posted and the bot can send it
+                    print(f"⚠️ Webhook send to {channel_id} failed, using the bot: {e}")
+                    webhook_delivery.failed(channel.id, e)
+                    discord_files = open_files()
+                    await send_budget.acquire()
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    # The post may have gone through; a bot send now could deliver it twice
+                    print(f"⚠️ Webhook send to {channel_id} got no answer: {e}")
+                    return False, f"Network error: {e}", 0
+            
+            await channel.send(content=prepared.content, embeds=prepared.send_embeds(), files=discord_files or None)
             
             db.update_analytics(messages=1, files=len(discord_files))
-            return True, "Message sent successfully"
+            channel_breaker.succeeded(channel.id)
+            return True, "Message sent successfully", None
         
+        except discord.Forbidden as e:
+            reason = channel_breaker.death_reason(e)
+            if reason:
+                await self.channel_dead(channel.id, channel.guild.id, reason)
+                return False, reason, None
+            # Missing Permissions and the like: the channel is alive, only this send is refused
+            return False, "Bot lacks permission to send messages in this channel", None
+        except discord.NotFound:
+            await self.channel_dead(channel.id, channel.guild.id, 'Channel not found')
+            return False, f"Channel {channel_id} not found", None
         except discord.HTTPException as e:
             print(f"❌ Discord HTTP error: {e}")
-            return False, f"Discord error: {e.text}"
-        except discord.Forbidden:
-            return False, "Bot lacks permission to send messages in this channel"
+            if e.status == 429 or e.status >= 500:
+                retry_after = float(e.response.headers.get('Retry-After', 0) or 0)
+                if e.status == 429:
+                    send_budget.pause(retry_after)
+                return False, f"Discord error: {e.text}", retry_after
+            return False, f"Discord error: {e.text}", None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"❌ Send message network error: {e}")
+            return False, f"Network error: {e}", 0
         except Exception as e:
             print(f"❌ Send message error: {e}")
-            return False, f"Failed to send message: {str(e)}"
+            return False, f"Failed to send message: {str(e)}", None
     
     async def process_scheduled_messages(self):
         """Background task to process scheduled messages"""
@@ -572,26 +3078,115 @@ class DiscordBot:
         
         while not self.bot.is_closed():
             try:
-                messages = db.get_pending_messages()
+                shards = self.owned_shards() if self.bot.shard_count else (None, None)
+                messages = db.claim_pending_messages(config.worker_id, config.scheduler_lease_seconds,
+                                                     config.scheduler_batch_size, *shards)
+                self.scheduler_stats['claimed'] += len(messages)
                 
-                for msg in messages:
-                    channel_ids = json.loads(msg['channel_id'])
-                    content = msg['content']
-                    embeds = json.loads(msg['embed_data']) if msg['embed_data'] else None
-                    files = json.loads(msg['files']) if msg['files'] else None
-                    
-                    for channel_id in channel_ids:
-                        success, _ = await self.send_message(channel_id, content, embeds, files)
-                        status = 'sent' if success else 'failed'
-                        db.update_message_status(msg['id'], status, int(time.time()))
+                if messages:
+                    # A batch stuck behind the queue or rate limits must not outlive its leases
+                    renewer = asyncio.create_task(self.renew_leases([msg['id'] for msg in messages]))
+                    try:
+                        await asyncio.gather(*(self.deliver_scheduled(msg) for msg in messages))
+                    finally:
+                        renewer.cancel()
                 
-                await asyncio.sleep(30)
+                # A full batch means more rows are due; keep draining
+                if len(messages) < config.scheduler_batch_size:
+                    await asyncio.sleep(config.scheduler_poll_interval)
             except Exception as e:
                 print(f"❌ Scheduled message processor error: {e}")
-                await asyncio.sleep(30)
+                await asyncio.sleep(config.scheduler_poll_interval)
+    
+    async def renew_leases(self, msg_ids):
+        """Renew a claimed batch's leases every third of the lease until cancelled"""
+        while True:
+            await asyncio.sleep(config.scheduler_lease_seconds / 3)
+            try:
+                self.scheduler_stats['lease_renewals'] += await asyncio.to_thread(
+                    db.renew_message_leases, msg_ids, config.worker_id, config.scheduler_lease_seconds)
+            except Exception as e:
+                print(f"❌ Lease renewal error: {e}")
+    
+    async def deliver_scheduled(self, msg):
+        """Send one claimed scheduled row on the scheduled lane and release its lease"""
+        channel_ids = json.loads(msg['channel_id'])
+        content = msg['content']
+        embeds = json.loads(msg['embed_data']) if msg['embed_data'] else None
+        files = json.loads(msg['files']) if msg['files'] else None
+        
+        event_hub.publish('scheduled', {'message_id': msg['id'], 'status': 'firing', 'channels': len(channel_ids)}, msg['user_id'])
+        progress = event_hub.delivery_progress(msg['user_id'], f"scheduled-{msg['id']}", len(channel_ids))
+        
+        sent = retrying = False
+        for channel_id, (success, error, retry_after) in await self.broadcast('scheduled', msg['user_id'], channel_ids, content, embeds, files,
+                                                                                         progress=progress, guild_id=msg['guild_id']):
+            sent = sent or success
+            if not success and retry_after is not None:
+                db.enqueue_retry(msg['user_id'], msg['guild_id'], channel_id, content, embeds, files,
+                                 error, time.time() + retry_delay(1, retry_after), msg['id'])
+                retrying = True
+        
+        status = 'sent' if sent else 'retrying' if retrying else 'failed'
+        next_time = self.next_occurrence(msg)
+        if not db.release_message(msg['id'], config.worker_id, status, int(time.time()), next_time):
+            # Another instance reclaimed the row after the lease expired and may have sent it too
+            self.scheduler_stats['leases_lost'] += 1
+            print(f"❌ Lease lost on scheduled message {msg['id']}: it was reclaimed and may have been sent twice")
+            status = 'lease_lost'
+        event_hub.publish('scheduled', {'message_id': msg['id'], 'status': status, 'next_time': next_time}, msg['user_id'])
+    
+    @staticmethod
+    def next_occurrence(msg):
+        """Next fire time of a recurring row's series; occurrences missed while offline are skipped"""
+        if not msg['recurrence']:
+            return None
+        try:
+            rule = RecurrenceRule.parse(json.loads(msg['recurrence']))
+            return rule.next_fire(max(msg['scheduled_time'], int(time.time())), msg['occurrence'])
+        except ValueError as e:
+            print(f"❌ Series {msg['series_id']} has an invalid recurrence, stopping it: {e}")
+            return None
+    
+    async def process_retry_queue(self):
+        """Background task to redeliver failed sends with backoff"""
+        await self.bot.wait_until_ready()
+        
+        while not self.bot.is_closed():
+            try:
+                shards = self.owned_shards() if self.bot.shard_count else (None, None)
+                retries = db.claim_due_retries(config.worker_id, config.scheduler_lease_seconds,
+                                               config.scheduler_batch_size, *shards)
+                
+                await asyncio.gather(*(self.redeliver(retry) for retry in retries))
+                
+                if len(retries) < config.scheduler_batch_size:
+                    await asyncio.sleep(5)
+            except Exception as e:
+                print(f"❌ Retry queue processor error: {e}")
+                await asyncio.sleep(5)
+    
+    async def redeliver(self, retry):
+        """Attempt one queued retry and reschedule or dead-letter it"""
+        embeds = json.loads(retry['embed_data']) if retry['embed_data'] else None
+        files = json.loads(retry['files']) if retry['files'] else None
+        
+        [(_, (success, error, retry_after))] = await self.broadcast(
+            'scheduled', retry['user_id'], [retry['channel_id']], retry['content'], embeds, files, guild_id=retry['guild_id'])
+        attempts = retry['attempts'] + 1
+        
+        if success:
+            db.finish_retry(retry['id'], config.worker_id, 'sent')
+        elif retry_after is None or attempts >= config.retry_max_attempts:
+            db.finish_retry(retry['id'], config.worker_id, 'dead', error)
+            print(f"☠️ Delivery {retry['id']} dead-lettered after {attempts} attempts: {error}")
+        else:
+            db.reschedule_retry(retry['id'], config.worker_id,
+                                time.time() + retry_delay(attempts, retry_after), error)
     
     def run(self):
         """Run bot in separate thread"""
+        self.thread_id = threading.get_ident()
         try:
             self.bot.run(config.bot_token)
         except Exception as e:
@@ -607,19 +3202,170 @@ class DiscordBot:
 
 bot_manager = DiscordBot()
 
+# ============================================================================
+# SHARD ROUTING
+# ============================================================================
+
+class ShardRouter:
+    """Routes guild-scoped API calls to the worker process that owns the guild's shard"""
+    FORWARD_HEADERS = ('X-Worker-User', 'X-Worker-Time', 'X-Worker-Nonce', 'X-Worker-Auth')
+    FORWARD_MAX_AGE = 60  # seconds a signed request stays valid; its nonce is remembered as long
+    
+    def __init__(self):
+        self._workers = []
+        self._workers_at = 0
+        self._pool = ThreadPoolExecutor(max_workers=8)
+        self._nonces = OrderedDict()  # nonce -> expiry, for replay protection
+        self._nonce_lock = threading.Lock()
+    
+    @property
+    def clustered(self):
+        return config.role == 'web'
+    
+    def live_workers(self):
+        """Registry snapshot, refreshed at most every 5 seconds"""
+        if time.time() - self._workers_at > 5:
+            self._workers = [w for w in db.get_live_workers() if w['url']]
+            self._workers_at = time.time()
+        return self._workers
+    
+    def bot_ready(self):
+        if not self.clustered:
+            return bot_manager.ready
+        return any(w['ready'] for w in self.live_workers())
+    
+    def owner_url(self, guild_id):
+        """URL of the freshest live worker serving the guild's shard"""
+        for worker in self.live_workers():
+            shard_id = (int(guild_id) >> 22) % (worker['shard_count'] or 1)
+            if shard_id in json.loads(worker['shard_ids']):
+                return worker['url']
+        return None
+    
+    def sign(self, user_id, timestamp, nonce, method, target, body):
+        """HMAC over the forwarding headers and the request itself: method, path with query and body hash"""
+        message = '\n'.join((str(user_id), timestamp, nonce, method.upper(), target, hashlib.sha256(body or b'').hexdigest()))
+        return hmac.new(config.secret_key.encode(), message.encode(), hashlib.sha256).hexdigest()
+    
+    def _fresh_nonce(self, nonce, now):
+        """Remember a nonce until its request expires; False if it was already seen"""
+        with self._nonce_lock:
+            while self._nonces and next(iter(self._nonces.values())) < now:
+                self._nonces.popitem(last=False)
+            if nonce in self._nonces:
+                return False
+            self._nonces[nonce] = now + 2 * self.FORWARD_MAX_AGE
+            return True
+    
+    def verify_forwarded(self):
+        """Return the user id of the current request if a web process signed and forwarded it, else None
+        
+        Only workers accept forwarded requests; the public web tier never does.
+        """
+        if config.role != 'worker':
+            return None
+        user_id, timestamp, nonce, signature = (request.headers.get(h) for h in self.FORWARD_HEADERS)
+        if not (user_id and timestamp and nonce and signature):
+            return None
+        now = time.time()
+        try:
+            if abs(now - int(timestamp)) > self.FORWARD_MAX_AGE:
+                return None
+        except ValueError:
+            return None
+        target = request.script_root + request.path
+        if request.query_string:
+            target += '?' + request.query_string.decode('latin-1')
+        expected = self.sign(user_id, timestamp, nonce, request.method, target, request.get_data(cache=True))
+        if not hmac.compare_digest(signature, expected) or not self._fresh_nonce(nonce, now):
+            return None
+        return int(user_id)
+    
+    def _send(self, method, url, user_id, data=None, content_type=None, stream=False, extra_headers=None):
+        timestamp = str(int(time.time()))
+        nonce = secrets.token_hex(16)
+        parts = urlsplit(url)
+        target = unquote(parts.path) + (f"?{parts.query}" if parts.query else '')
+        body = data.encode() if isinstance(data, str) else data
+        headers = dict(zip(self.FORWARD_HEADERS, (str(user_id), timestamp, nonce,
+                                                  self.sign(user_id, timestamp, nonce, method, target, body))))
+        if content_type:
+            headers['Content-Type'] = content_type
+        headers.update(extra_headers or {})
+        return requests.request(method, url, data=data, headers=headers, timeout=120, stream=stream)
+    
+    def forward(self, url):
+        """Proxy the current request to a worker and relay its response"""
+        conditional = {'If-None-Match': request.headers['If-None-Match']} if 'If-None-Match' in request.headers else None
+        response = self._send(request.method, url + request.full_path, session['user_id'],
+                              request.get_data(), request.content_type, extra_headers=conditional)
+        headers = {'Content-Type': response.headers.get('Content-Type', 'application/json')}
+        for name in ('ETag', 'Cache-Control'):
+            if name in response.headers:
+                headers[name] = response.headers[name]
+        return response.content, response.status_code, headers
+    
+    def route(self, guild_id):
+        """Forward to the owning worker when running as the web tier, else None"""
+        if not self.clustered:
+            return None
+        if not guild_id:
+            return jsonify({'error': 'Guild ID is required'}), 400
+        url = self.owner_url(guild_id)
+        if not url:
+            return jsonify({'error': 'No worker is serving this server right now', 'retry_after': 15}), 503
+        return self.forward(url)
+    
+    def gather(self, path, paths=None):
+        """Fan a GET out to every live worker (or url -> path in paths) and return the decoded JSON bodies"""
+        user_id = session['user_id']
+        def fetch(url):
+            try:
+                response = self._send('GET', url + (paths[url] if paths else path), user_id)
+                return response.json() if response.status_code == 200 else None
+            except Exception as e:
+                print(f"❌ Worker request to {url} failed: {e}")
+                return None
+        urls = paths.keys() if paths else {w['url'] for w in self.live_workers()}
+        return [r for r in self._pool.map(fetch, urls) if r]
+
+shard_router = ShardRouter()
+
 # ============================================================================
 # AUTHENTICATION DECORATORS
 # ============================================================================
 
 def require_auth(f):
     """Decorator to require Discord authentication"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
+    def check_session():
         if 'user_id' not in session:
-            return jsonify({'error': 'Authentication required. Please login with Discord.'}), 401
+            forwarded_user = shard_router.verify_forwarded()
+            if forwarded_user is None:
+                return jsonify({'error': 'Authentication required. Please login with Discord.'}), 401
+            session['user_id'] = forwarded_user
+            session.persist = False
+            g.forwarded = True
         if not isinstance(session['user_id'], int):
             session.clear()
             return jsonify({'error': 'Invalid session. Please login again.'}), 401
+        return None
+    
+    if asyncio.iscoroutinefunction(f):
+        @wraps(f)
+        async def decorated_function(*args, **kwargs):
+            return check_session() or await f(*args, **kwargs)
+    else:
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            return check_session() or f(*args, **kwargs)
+    return decorated_function
+
+def require_admin(f):
+    """Decorator limiting a route to ADMIN_USER_IDS; use after require_auth"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if session.get('user_id') not in config.admin_user_ids:
+            return jsonify({'error': 'Admin access required'}), 403
         return f(*args, **kwargs)
     return decorated_function
 
@@ -627,7 +3373,7 @@ def require_bot_ready(f):
     """Decorator to require bot to be ready"""
     @wraps(f)
     async def decorated_function(*args, **kwargs):
-        if not bot_manager.ready:
+        if not shard_router.bot_ready():
             return jsonify({
                 'error': 'Bot is still initializing. This may take up to 60 seconds on first startup.',
                 'retry_after': 30
@@ -635,11 +3381,695 @@ def require_bot_ready(f):
         return await f(*args, **kwargs)
     return decorated_function
 
+# ============================================================================
+# IDEMPOTENCY
+# ============================================================================
+
+class IdempotencyStore:
+    """Bounded LRU/TTL cache of completed responses, backed by the database"""
+    IN_PROGRESS = object()
+    
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (user_id, endpoint, key) -> (expires_at, request_hash, status, body)
+        self._lock = threading.Lock()
+        self._purged_at = 0
+    
+    def _remember(self, cache_key, value):
+        with self._lock:
+            self._entries[cache_key] = value
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def begin(self, user_id, endpoint, key, request_hash):
+        """Returns None to proceed, IN_PROGRESS, or a stored (request_hash, status, body)"""
+        cache_key = (user_id, endpoint, key)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+        if entry and entry[0] > now:
+            return entry[1:] if entry[2] is not None else self.IN_PROGRESS
+        
+        if now - self._purged_at > 3600:
+            self._purged_at = now
+            db.purge_idempotency_keys(now - self.ttl)
+        
+        # Expiry is checked here, not left to the hourly purge, so replays end exactly at the TTL
+        existing = db.reserve_idempotency_key(user_id, endpoint, key, request_hash, now - self.ttl)
+        if existing is None:
+            self._remember(cache_key, (now + self.ttl, request_hash, None, None))
+            return None
+        if existing['status_code'] is None:
+            return self.IN_PROGRESS
+        stored = (existing['request_hash'], existing['status_code'], json.loads(existing['response']))
+        self._remember(cache_key, (existing['created_at'] + self.ttl, *stored))
+        return stored
+    
+    def complete(self, user_id, endpoint, key, request_hash, status, body):
+        self._remember((user_id, endpoint, key), (time.time() + self.ttl, request_hash, status, body))
+        db.complete_idempotency_key(user_id, endpoint, key, status, body)
+    
+    def abandon(self, user_id, endpoint, key):
+        with self._lock:
+            self._entries.pop((user_id, endpoint, key), None)
+        db.release_idempotency_key(user_id, endpoint, key)
+
+idempotency_store = IdempotencyStore(config.idempotency_ttl, config.idempotency_cache_size)
+
+def idempotent(f):
+    """Decorator replaying the stored response for a repeated Idempotency-Key"""
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return await f(*args, **kwargs)
+        if len(key) > 255:
+            return jsonify({'error': 'Idempotency-Key is too long'}), 400
+        
+        user_id = session['user_id']
+        endpoint = request.path
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+        
+        stored = idempotency_store.begin(user_id, endpoint, key, request_hash)
+        if stored is IdempotencyStore.IN_PROGRESS:
+            return jsonify({'error': 'A request with this Idempotency-Key is still in progress', 'retry_after': 1}), 409, {'Retry-After': '1'}
+        if stored:
+            stored_hash, status, body = stored
+            if stored_hash != request_hash:
+                return jsonify({'error': 'Idempotency-Key was already used for a different request'}), 422
+            return jsonify(body), status, {'Idempotent-Replayed': 'true'}
+        
+        try:
+            response = app.make_response(await f(*args, **kwargs))
+        except Exception:
+            idempotency_store.abandon(user_id, endpoint, key)
+            raise
+        
+        # Only successes and conflicts are replayed; rejected, throttled and failed requests
+        # may be corrected and retried with the same key
+        status = response.status_code
+        if (400 <= status < 500 and status != 409) or status >= 500 or not response.is_json:
+            idempotency_store.abandon(user_id, endpoint, key)
+        else:
+            idempotency_store.complete(user_id, endpoint, key, request_hash, response.status_code, response.get_json())
+        return response
+    return decorated_function
+
+# ============================================================================
+# BULK IMPORT
+# ============================================================================
+
+class BulkImporter:
+    """Spools streamed JSONL/CSV bodies to disk and imports them as pending messages in the background"""
+    CONTENT_TYPES = {'text/csv': 'csv', 'application/x-ndjson': 'jsonl', 'application/jsonl': 'jsonl',
+                     'application/json-lines': 'jsonl'}
+    MAX_ERRORS = 100  # per-row errors kept on the job
+    
+    def __init__(self, workers):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='import')
+    
+    @classmethod
+    def detect_format(cls, fmt, content_type):
+        if fmt:
+            return fmt if fmt in ('csv', 'jsonl') else None
+        return cls.CONTENT_TYPES.get((content_type or '').split(';')[0].strip().lower())
+    
+    def start(self, user_id, fmt, stream):
+        """Spool the body and queue its import; returns the job id, or None if one is already running"""
+        job_id = uuid.uuid4().hex
+        if not db.create_import_job(job_id, user_id, fmt):
+            return None
+        
+        spool = tempfile.NamedTemporaryFile(prefix='import-', suffix=f'.{fmt}', delete=False)
+        try:
+            with spool:
+                size = 0
+                while chunk := stream.read(1024 * 1024):
+                    spool.write(chunk)
+                    size += len(chunk)
+        except Exception:
+            os.unlink(spool.name)
+            db.update_import_job(job_id, 'failed', errors=[{'line': None, 'error': 'Upload interrupted'}])
+            raise
+        
+        db.update_import_job(job_id, 'queued', size=size)
+        self._pool.submit(self.run, job_id, user_id, fmt, spool.name)
+        return job_id
+    
+    @staticmethod
+    def records(fmt, f):
+        """(line number, raw record) pairs of a spooled body, read one at a time"""
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for line_no, line in enumerate(f, 1):
+                if line.strip():
+                    yield line_no, line
+    
+    @staticmethod
+    def parse_row(fmt, record, now):
+        """(import_messages tuple, admission kind, channel count) for one record; ValueError says what is wrong"""
+        if fmt == 'jsonl':
+            try:
+                record = json.loads(record)
+            except ValueError:
+                raise ValueError('Invalid JSON')
+            if not isinstance(record, dict):
+                raise ValueError('Row must be a JSON object')
+            channel_ids = record.get('channel_ids')
+            embeds = record.get('embeds') or []
+            files = record.get('files') or []
+        else:
+            # CSV lists are separated by spaces or semicolons; embeds is a JSON column
+            channel_ids = [c for c in re.split(r'[\s;]+', record.get('channel_ids') or '') if c]
+            try:
+                embeds = json.loads(record.get('embeds') or '[]')
+            except ValueError:
+                raise ValueError('embeds is not valid JSON')
+            files = [f for f in re.split(r'[\s;]+', record.get('files') or '') if f]
+        
+        content = str(record.get('content') or '').strip()
+        if not isinstance(channel_ids, list) or not channel_ids or not all(str(c).isdigit() for c in channel_ids):
+            raise ValueError('channel_ids must be a list of channel ids')
+        if not is_embed_list(embeds):
+            raise ValueError('embeds must be a list of objects')
+        if not isinstance(files, list):
+            raise ValueError('files must be a list')
+        if not content and not embeds and not files:
+            raise ValueError('Message cannot be empty')
+        if len(content) > 2000:
+            raise ValueError('Message exceeds 2000 character limit')
+        
+        scheduled_time = record.get('scheduled_time')
+        kind = 'schedule'
+        if scheduled_time in (None, ''):
+            # Send now: the row is due immediately and the scheduler delivers it
+            scheduled_time, kind = now, 'send'
+        else:
+            try:
+                scheduled_time = int(scheduled_time)
+            except (TypeError, ValueError):
+                raise ValueError('scheduled_time must be a unix timestamp')
+            if scheduled_time <= now:
+                raise ValueError('scheduled_time must be in the future')
+        
+        guild_id = str(record.get('guild_id') or '') or None
+        if guild_id and not guild_id.isdigit():
+            raise ValueError('guild_id must be a guild id')
+        if not guild_id and config.shard_count:
+            # The scheduler picks rows by the guild's shard; without one the row would land on shard 0
+            raise ValueError('guild_id is required when sharding is enabled')
+        return (guild_id, json.dumps([str(c) for c in channel_ids]), content, json.dumps(embeds), json.dumps(files),
+                scheduled_time), kind, len(channel_ids)
+    
+    def progress(self, job_id, user_id, status, read, imported, failed, errors):
+        db.update_import_job(job_id, status, rows_read=read, rows_imported=imported, rows_failed=failed, errors=errors)
+        event_hub.publish('import', {'job_id': job_id, 'status': status, 'rows_read': read,
+                                     'rows_imported': imported, 'rows_failed': failed}, user_id)
+    
+    @staticmethod
+    def admit(user_id, costs):
+        """Charge a batch's sends and schedules to the user's quotas like /api/send and /api/schedule
+        
+        A refusal is waited out the way a client honours Retry-After, so a large import is paced by
+        the quota instead of failing; returns the seconds spent waiting.
+        """
+        waited = 0
+        for kind, cost in costs.items():
+            while cost:
+                refused = admission.refusal(kind, user_id, cost, queued=kind == 'send')
+                if not refused:
+                    break
+                time.sleep(refused[2])
+                waited += refused[2]
+        return waited
+    
+    def run(self, job_id, user_id, fmt, path):
+        """Validate rows as they are read and insert them in executemany batches
+        
+        Each batch is charged to the user's send/schedule quotas first, waiting while they are spent.
+        """
+        read = imported = failed = 0
+        errors = []
+        batch = []
+        costs = {'send': 0, 'schedule': 0}
+        now = int(time.time())
+        waited = 0
+        db.update_import_job(job_id, 'running')
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as f:
+                for line, record in self.records(fmt, f):
+                    if read >= config.import_max_rows:
+                        errors.append({'line': line, 'error': f'Imports are limited to {config.import_max_rows} rows'})
+                        break
+                    read += 1
+                    try:
+                        row, kind, channels = self.parse_row(fmt, record, now)
+                        burst = admission.limits[kind][1]
+                        if channels > burst:
+                            raise ValueError(f'Too many channels in one row (max {burst})')
+                    except ValueError as e:
+                        failed += 1
+                        if len(errors) < self.MAX_ERRORS:
+                            errors.append({'line': line, 'error': str(e)})
+                        continue
+                    # A batch never costs more than one burst, so a refilled quota always admits it
+                    if len(batch) >= config.import_batch_size or costs[kind] + channels > burst:
+                        waited += self.admit(user_id, costs)
+                        db.import_messages(user_id, batch)
+                        imported += len(batch)
+                        batch = []
+                        costs = {'send': 0, 'schedule': 0}
+                        self.progress(job_id, user_id, 'running', read, imported, failed, errors)
+                    batch.append(row)
+                    costs[kind] += channels
+            if batch:
+                waited += self.admit(user_id, costs)
+                db.import_messages(user_id, batch)
+                imported += len(batch)
+            self.progress(job_id, user_id, 'done', read, imported, failed, errors)
+            print(f"📥 Import {job_id}: {imported} rows imported, {failed} rejected" +
+                  (f", {waited}s waiting for quota" if waited else ''))
+        except Exception as e:
+            print(f"❌ Import {job_id} failed: {e}")
+            errors.append({'line': None, 'error': f'Import stopped: {e}'})
+            self.progress(job_id, user_id, 'failed', read, imported, failed, errors)
+        finally:
+            os.unlink(path)
+
+bulk_importer = BulkImporter(config.import_workers)
+
+# ============================================================================
+# PROFILING
+# ============================================================================
+
+# Leaf functions of threads parked waiting for work; left out of profiles unless idle=1
+IDLE_LEAVES = frozenset({'wait', 'select', 'poll', 'accept', '_worker'})
+
+def stack_codes(frame):
+    """Code objects of a frame's stack, innermost first; cheap to hash and compare"""
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    return tuple(codes)
+
+def collapse_stack(label, codes):
+    """One line of Brendan Gregg's collapsed format (without the count): label;outer;...;inner"""
+    # co_qualname (Class.method) is new in Python 3.11; older versions only have the bare name
+    return ';'.join([label] + [f"{os.path.basename(c.co_filename)}:{getattr(c, 'co_qualname', c.co_name)}"
+                               for c in reversed(codes)])
+
+def thread_label(ident, names, request_threads):
+    if ident == bot_manager.thread_id:
+        return 'bot'
+    if ident in request_threads:
+        return 'flask'
+    return re.sub(r'[-_]?\d+', '', names.get(ident, 'unknown'))
+
+class SamplingProfiler:
+    """Wall-clock sampler over every thread via sys._current_frames, output as collapsed stacks"""
+    def __init__(self):
+        self._running = threading.Lock()
+    
+    def profile(self, seconds, interval, idle=False):
+        """Sample for `seconds`; returns ([(collapsed stack, samples)], passes) or None if already running"""
+        if not self._running.acquire(blocking=False):
+            return None
+        try:
+            me = threading.get_ident()
+            counts = {}
+            passes = 0
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                request_threads = slow_requests.request_threads()
+                for ident, frame in sys._current_frames().items():
+                    if ident != me:
+                        key = (thread_label(ident, names, request_threads), stack_codes(frame))
+                        counts[key] = counts.get(key, 0) + 1
+                passes += 1
+                time.sleep(interval)
+        finally:
+            self._running.release()
+        
+        stacks = {}
+        for (label, codes), count in counts.items():
+            if idle or codes[0].co_name not in IDLE_LEAVES:
+                line = collapse_stack(label, codes)
+                stacks[line] = stacks.get(line, 0) + count
+        return sorted(stacks.items(), key=lambda s: -s[1]), passes
+
+class SlowRequestMonitor:
+    """Samples the stacks of requests still running past a threshold and keeps the recent ones
+    
+    A watchdog thread looks at in-flight requests every threshold/5 (at most 100 ms) and, for
+    each one over the threshold, records the stacks of its threads and of the bot thread, so a
+    capture shows whether the request waits on SQLite, the bot loop or Discord HTTP.
+    """
+    def __init__(self, threshold_ms, keep, max_samples):
+        self.threshold = threshold_ms / 1000
+        self.max_samples = max_samples
+        self.recent = deque(maxlen=keep)
+        self._active = {}  # request thread ident -> record
+        self._lock = threading.Lock()
+        self._started = False
+    
+    def begin(self):
+        if not self.threshold:
+            return None
+        if not self._started:
+            self._started = True
+            threading.Thread(target=self.run, daemon=True).start()
+        record = {'method': request.method, 'path': request.path, 'endpoint': request.endpoint, 'started': time.time(),
+                  'threads': [threading.get_ident()], 'samples': 0, 'stacks': {}}
+        with self._lock:
+            self._active[record['threads'][0]] = record
+        return record
+    
+    def attach(self, record):
+        """Count the current thread (an async view's event loop) as working for the request"""
+        with self._lock:
+            record['threads'].append(threading.get_ident())
+    
+    def detach(self, record):
+        with self._lock:
+            record['threads'].remove(threading.get_ident())
+    
+    def end(self, record):
+        with self._lock:
+            self._active.pop(record['threads'][0], None)
+            # run() may still be adding a sample it took before the pop
+            samples = record['samples']
+            stacks = sorted(record['stacks'].items(), key=lambda s: -s[1])
+        duration = time.time() - record['started']
+        if duration < self.threshold:
+            return
+        self.recent.append({
+            'method': record['method'],
+            'path': record['path'],
+            'endpoint': record['endpoint'],
+            'started_at': int(record['started']),
+            'duration_ms': round(duration * 1000, 1),
+            'samples': samples,
+            'stacks': stacks
+        })
+        print(f"🐢 Slow request: {record['method']} {record['path']} took {duration * 1000:.0f}ms")
+    
+    def request_threads(self):
+        with self._lock:
+            return {ident for record in self._active.values() for ident in record['threads']}
+    
+    def run(self):
+        interval = min(0.1, self.threshold / 5)
+        while True:
+            time.sleep(interval)
+            now = time.time()
+            with self._lock:
+                slow = [(record, list(record['threads'])) for record in self._active.values()
+                        if now - record['started'] >= self.threshold and record['samples'] < self.max_samples]
+            if not slow:
+                continue
+            frames = sys._current_frames()
+            for record, threads in slow:
+                targets = [('flask', ident) for ident in threads] + [('bot', bot_manager.thread_id)]
+                lines = [collapse_stack(label, stack_codes(frames[ident]))
+                         for label, ident in targets if frames.get(ident) is not None]
+                with self._lock:
+                    record['samples'] += 1
+                    for line in lines:
+                        record['stacks'][line] = record['stacks'].get(line, 0) + 1
+
+class LoopWatchdog:
+    """Measures the bot event loop's lag and catches callbacks that block it
+    
+    A coroutine on the loop sleeps `interval` and records how late it wakes. A separate thread
+    watches that heartbeat; once it stalls past the threshold the loop is stuck inside one
+    synchronous callback, so the running task and the bot thread's stack are captured right then.
+    """
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+    
+    def __init__(self, interval, threshold_ms, keep):
+        self.interval = interval
+        self.threshold = threshold_ms / 1000
+        self.blocks = deque(maxlen=50)
+        self.blocked = 0
+        self._lags = deque(maxlen=keep)
+        self._histogram = [0] * (len(self.BUCKETS_MS) + 1)
+        self._max = 0.0
+        self._beat = None
+        self._loop = None
+        self._lock = threading.Lock()
+    
+    def start(self, loop):
+        """Idempotent; on_ready fires again after reconnects"""
+        if self._loop is not None or not self.threshold:
+            return
+        self._loop = loop
+        self._beat = time.monotonic()
+        loop.create_task(self.measure())
+        threading.Thread(target=self.watch, daemon=True).start()
+    
+    async def measure(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self._beat = now = time.monotonic()
+            lag = max(0.0, now - started - self.interval)
+            with self._lock:
+                self._lags.append(lag)
+                self._histogram[bisect.bisect_left(self.BUCKETS_MS, lag * 1000)] += 1
+                self._max = max(self._max, lag)
+    
+    def watch(self):
+        stalled_beat = None  # heartbeat the current blocking episode started from
+        while not self._loop.is_closed():
+            time.sleep(self.threshold / 2)
+            beat = self._beat
+            if stalled_beat is not None:
+                if beat != stalled_beat:
+                    self.blocks[-1]['duration_ms'] = round((beat - stalled_beat - self.interval) * 1000)
+                    print(f"🐌 Bot event loop unblocked after {self.blocks[-1]['duration_ms']}ms")
+                    stalled_beat = None
+                continue
+            stalled = time.monotonic() - beat - self.interval
+            if stalled >= self.threshold and self._loop.is_running():
+                stalled_beat = beat
+                self.capture(stalled)
+    
+    def capture(self, stalled):
+        frame = sys._current_frames().get(bot_manager.thread_id)
+        task = asyncio.current_task(self._loop)
+        coroutine = getattr(task.get_coro(), '__qualname__', repr(task.get_coro())) if task else None
+        stack = ''.join(traceback.format_stack(frame)[-12:]) if frame else ''
+        self.blocked += 1
+        self.blocks.append({
+            'at': int(time.time()),
+            'duration_ms': None,  # filled in once the loop moves again
+            'stalled_ms': round(stalled * 1000),
+            'task': task.get_name() if task else None,
+            'coroutine': coroutine,
+            'stack': stack,
+            'collapsed': collapse_stack('bot', stack_codes(frame)) if frame else None
+        })
+        print(f"🐌 Bot event loop blocked for {stalled * 1000:.0f}ms+ in {coroutine or 'a plain callback'}:\n{stack}")
+    
+    def metrics(self):
+        with self._lock:
+            lags = sorted(self._lags)
+            histogram = list(self._histogram)
+            worst = self._max
+        last = self.blocks[-1] if self.blocks else None
+        return {
+            'interval_ms': round(self.interval * 1000),
+            'lag_ms': {
+                'p50': round(percentile(lags, 50) * 1000, 1) if lags else None,
+                'p95': round(percentile(lags, 95) * 1000, 1) if lags else None,
+                'p99': round(percentile(lags, 99) * 1000, 1) if lags else None,
+                'max': round(worst * 1000, 1)
+            },
+            # Lag samples per bucket since start; keys are upper bounds in ms
+            'histogram': {**{f"le_{b}": n for b, n in zip(self.BUCKETS_MS, histogram)}, 'inf': histogram[-1]},
+            'blocked': self.blocked,
+            'last_block': {k: last[k] for k in ('at', 'duration_ms', 'stalled_ms', 'coroutine')} if last else None
+        }
+
+sampling_profiler = SamplingProfiler()
+slow_requests = SlowRequestMonitor(config.slow_request_ms, config.slow_request_keep, config.slow_request_samples)
+loop_watchdog = LoopWatchdog(config.loop_lag_interval, config.loop_block_ms, config.loop_lag_keep)
+
 # ============================================================================
 # FLASK APPLICATION
 # ============================================================================
 
+class DashboardRequest(Request):
+    """Request with a larger body limit for streamed bulk imports"""
+    @property
+    def max_content_length(self):
+        if self.endpoint == 'api_import':
+            return config.import_max_bytes
+        return super().max_content_length
+
+# ============================================================================
+# SESSIONS
+# ============================================================================
+
+class ServerSession(SecureCookieSession):
+    """Session data kept server-side; the cookie carries only the opaque id"""
+    def __init__(self, initial=None, sid=None, expires_at=0):
+        super().__init__(initial)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.persist = True  # cleared for forwarded cluster requests, which must not create sessions
+
+class SessionStore:
+    """Sessions in SQLite behind an in-memory LRU hot tier
+    
+    Rows are keyed by the sha256 of the cookie value, so the table holds no usable id. Hot entries
+    are re-read after hot_ttl seconds, which bounds how long another web process keeps honouring
+    a session revoked elsewhere.
+    """
+    def __init__(self, max_entries, hot_ttl):
+        self.max_entries = max_entries
+        self.hot_ttl = hot_ttl
+        self._entries = OrderedDict()  # key -> (checked_at, user_id, data, expires_at)
+        self._lock = threading.Lock()
+        self._purged_at = 0
+        self.stats = {'hits': 0, 'misses': 0}
+    
+    @staticmethod
+    def key(sid):
+        return hashlib.sha256(sid.encode()).hexdigest()
+    
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def get(self, sid):
+        """(data, expires_at) of a live session, else None"""
+        key = self.key(sid)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+        if entry and now - entry[0] < self.hot_ttl:
+            self.stats['hits'] += 1
+            return (dict(entry[2]), entry[3]) if entry[3] > now else None
+        
+        self.stats['misses'] += 1
+        row = db.get_session(key)
+        if not row or row['expires_at'] <= now:
+            with self._lock:
+                self._entries.pop(key, None)
+            return None
+        data = json.loads(row['data'])
+        self._remember(key, (now, row['user_id'], data, row['expires_at']))
+        return dict(data), row['expires_at']
+    
+    def save(self, sid, data, expires_at):
+        key = self.key(sid)
+        now = time.time()
+        if now - self._purged_at > 3600:
+            self._purged_at = now
+            db.purge_sessions(now)
+        db.save_session(key, data.get('user_id'), json.dumps(data), int(expires_at))
+        self._remember(key, (now, data.get('user_id'), data, int(expires_at)))
+    
+    def touch(self, sid, expires_at):
+        """Extend a session without rewriting its data"""
+        key = self.key(sid)
+        db.touch_session(key, int(expires_at))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries[key] = (*entry[:3], int(expires_at))
+    
+    def delete(self, sid):
+        key = self.key(sid)
+        db.delete_session(key)
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def revoke_user(self, user_id):
+        """End every session of a user (logout everywhere); returns how many there were"""
+        count = db.delete_user_sessions(user_id)
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry[1] == user_id]:
+                del self._entries[key]
+        return count
+    
+    def metrics(self):
+        return {**self.stats, 'hot': len(self._entries)}
+
+class ServerSessionInterface(SessionInterface):
+    """Opaque-id cookies backed by the session store
+    
+    Unchanged sessions send no Set-Cookie; their expiry is extended at most once per
+    session_touch_interval instead of re-signing the whole cookie on every response.
+    """
+    session_class = ServerSession
+    
+    def __init__(self, store):
+        self.store = store
+    
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        found = self.store.get(sid) if sid else None
+        if found:
+            return ServerSession(found[0], sid, found[1])
+        return ServerSession()
+    
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+        
+        if session.accessed:
+            response.vary.add('Cookie')
+        if not session.persist:
+            return
+        if not session:
+            if session.modified and session.sid:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure, samesite=samesite, httponly=httponly)
+            return
+        
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        expires_at = time.time() + lifetime
+        if session.modified or not session.sid:
+            session.sid = session.sid or secrets.token_urlsafe(32)
+            self.store.save(session.sid, dict(session), expires_at)
+        elif session.expires_at - time.time() < lifetime - config.session_touch_interval:
+            self.store.touch(session.sid, expires_at)
+        else:
+            return
+        response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session), httponly=httponly,
+                            domain=domain, path=path, secure=secure, samesite=samesite)
+    
+    def regenerate(self, session):
+        """Give a session a fresh id on login, so an id planted before it cannot be reused"""
+        if session.sid:
+            self.store.delete(session.sid)
+        session.sid = None
+        session.modified = True
+
+session_store = SessionStore(config.session_cache_size, config.session_hot_ttl)
+
 app = Flask(__name__)
+app.request_class = DashboardRequest
+if config.session_backend == 'server':
+    app.session_interface = ServerSessionInterface(session_store)
 app.config['SECRET_KEY'] = config.secret_key
 app.config['SESSION_COOKIE_SECURE'] = True
 app.config['SESSION_COOKIE_HTTPONLY'] = True
@@ -647,6 +4077,35 @@ app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=30)
 app.config['MAX_CONTENT_LENGTH'] = 25 * 1024 * 1024  # 25MB max file size
 
+# Long-lived or deliberately slow endpoints that slow-request capture ignores
+SLOW_REQUEST_EXEMPT = {'api_events', 'api_admin_profile'}
+
+@app.before_request
+def track_slow_request():
+    if request.endpoint not in SLOW_REQUEST_EXEMPT:
+        g.slow_request = slow_requests.begin()
+
+@app.teardown_request
+def finish_slow_request(exc):
+    record = g.pop('slow_request', None)
+    if record:
+        slow_requests.end(record)
+
+def async_to_sync(func):
+    """Flask runs each async view on a fresh event loop thread; tie it to the request for slow capture"""
+    async def run(*args, **kwargs):
+        record = g.get('slow_request')
+        if not record:
+            return await func(*args, **kwargs)
+        slow_requests.attach(record)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            slow_requests.detach(record)
+    return Flask.async_to_sync(app, run)
+
+app.async_to_sync = async_to_sync
+
 # ============================================================================
 # OAUTH ROUTES
 # ============================================================================
@@ -671,7 +4130,7 @@ def callback():
     code = request.args.get('code')
     if not code:
         print("❌ No authorization code in callback")
-        return render_template_string(ERROR_PAGE, error='No authorization code received')
+        return render_page(error_template, error='No authorization code received')
     
     try:
         # Exchange code for token
@@ -679,7 +4138,7 @@ def callback():
         if 'access_token' not in token_data:
             error_msg = token_data.get('error_description', 'Unknown OAuth error')
             print(f"❌ Token exchange failed: {error_msg}")
-            return render_template_string(ERROR_PAGE, error=f"Login failed: {error_msg}")
+            return render_page(error_template, error=f"Login failed: {error_msg}")
         
         # Get user data
         user_data = DiscordOAuth.get_user_data(token_data['access_token'])
@@ -687,9 +4146,11 @@ def callback():
         # Validate user ID
         if 'id' not in user_data:
             print("❌ No user ID in user data")
-            return render_template_string(ERROR_PAGE, error='Invalid user data from Discord')
+            return render_page(error_template, error='Invalid user data from Discord')
         
         # Create session
+        if isinstance(session, ServerSession):
+            app.session_interface.regenerate(session)
         session['user_id'] = int(user_data['id'])
         session['username'] = user_data['username']
         session['avatar'] = f"https://cdn.discordapp.com/avatars/{user_data['id']}/{user_data['avatar']}.png" if user_data.get('avatar') else None
@@ -706,21 +4167,50 @@ def callback():
             int(time.time() + token_data.get('expires_in', 604800))
         )
         
+        # Prime the guild list cache so /api/guilds needs no member cache lookup
+        if config.mutual_guilds_mode == 'oauth':
+            try:
+                user_guild_cache.fetch(session['user_id'], token_data['access_token'])
+            except Exception as e:
+                print(f"❌ Guild list prefetch failed: {e}")
+        
         print(f"✅ LOGIN SUCCESS: {session['username']} (ID: {session['user_id']})")
         return redirect(url_for('dashboard'))
         
     except Exception as e:
         print(f"❌ CALLBACK ERROR: {e}")
-        return render_template_string(ERROR_PAGE, error=f"Login failed: {str(e)}")
+        return render_page(error_template, error=f"Login failed: {str(e)}")
 
 @app.route('/logout')
 def logout():
     """Logout and clear session"""
     user_id = session.get('user_id')
     print(f"👋 LOGOUT: {user_id}")
+    if user_id:
+        user_guild_cache.invalidate(user_id)
     session.clear()
     return redirect(url_for('login'))
 
+def csrf_token():
+    """The session's CSRF token, created on first use; pages hand it to scripts for state-changing POSTs"""
+    if 'csrf_token' not in session:
+        session['csrf_token'] = secrets.token_urlsafe(32)
+    return session['csrf_token']
+
+@app.route('/logout/all', methods=['POST'])
+@require_auth
+def logout_all():
+    """Logout on every device by ending all of the user's server-side sessions"""
+    token = session.get('csrf_token')
+    if not token or not hmac.compare_digest(request.headers.get('X-CSRF-Token', ''), token):
+        return jsonify({'error': 'Invalid CSRF token. Reload the page and try again.'}), 403
+    user_id = session['user_id']
+    ended = session_store.revoke_user(user_id)
+    print(f"👋 LOGOUT EVERYWHERE: {user_id} ({ended} sessions)")
+    user_guild_cache.invalidate(user_id)
+    session.clear()
+    return jsonify({'success': True, 'redirect': url_for('login')})
+
 @app.route('/dashboard')
 @require_auth
 def dashboard():
@@ -732,17 +4222,18 @@ def dashboard():
         
         analytics = db.get_analytics()
         templates = db.get_user_templates(user_id)
-        history = db.get_user_messages(user_id)
         
-        return render_template_string(DASHBOARD_HTML,
+        return render_page(dashboard_template,
+            css_url=STATIC_ASSETS['dashboard.css'].url,
+            js_url=STATIC_ASSETS['dashboard.js'].url,
             user_id=user_id,
             username=username,
             avatar=avatar,
             analytics=analytics,
             templates=templates,
-            history=history,
             oauth_url=DiscordOAuth.get_authorize_url(),
-            bot_ready=bot_manager.ready
+            csrf_token=csrf_token(),
+            bot_ready=shard_router.bot_ready()
         )
         
     except Exception as e:
@@ -757,46 +4248,284 @@ def dashboard():
 @app.route('/api/health')
 def health():
     """Health check for Render"""
+    if shard_router.clustered:
+        shards = []
+        for worker in shard_router.live_workers():
+            for shard in json.loads(worker['stats'] or '[]'):
+                shards.append({**shard, 'worker_id': worker['worker_id']})
+    else:
+        shards = bot_manager.shard_stats() if bot_manager.ready else []
+    
     return jsonify({
         'status': 'healthy',
-        'bot_ready': bot_manager.ready,
+        'bot_ready': shard_router.bot_ready(),
+        'role': config.role,
+        'worker_id': config.worker_id,
+        'shards': shards,
         'timestamp': int(time.time())
     }), 200
 
+@app.route('/api/events')
+@require_auth
+def api_events():
+    """Server-sent event stream: bot status, broadcast progress and scheduler firings"""
+    relay = request.args.get('relay') == '1' and g.get('forwarded', False)
+    subscription = event_hub.subscribe(session['user_id'], relay=relay)
+    if not subscription:
+        return jsonify({'error': 'Too many open event streams', 'retry_after': 30}), 429
+    
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0) or None
+    except ValueError:
+        last_id = None
+    status = {'ready': shard_router.bot_ready(), 'connected': shard_router.bot_ready(), 'worker_id': config.worker_id}
+    initial = [] if relay else [(0, 'bot', None, json.dumps(status))]
+    
+    response = Response(event_hub.stream(subscription, last_id, initial), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Also covers clients that disconnect before the stream starts
+    response.call_on_close(lambda: event_hub.unsubscribe(subscription))
+    return response
+
+@app.route('/api/metrics')
+@require_auth
+def api_metrics():
+    """Outbound queue metrics for this process, or every worker when clustered"""
+    if shard_router.clustered:
+        return jsonify({'success': True, 'workers': shard_router.gather('/api/metrics')})
+    return jsonify({
+        'success': True,
+        'worker_id': config.worker_id,
+        'outbound': outbound_queue.metrics(),
+        'webhooks': webhook_delivery.stats,
+        'channels': channel_breaker.metrics(),
+        'sessions': session_store.metrics(),
+        'token_refresh': token_refresher.metrics(),
+        'bot_loop': loop_watchdog.metrics(),
+        'scheduler': bot_manager.scheduler_stats,
+        'event_connections': event_hub.connections()
+    })
+
+@app.route('/api/admin/profile', methods=['POST'])
+@require_auth
+@require_admin
+def api_admin_profile():
+    """Sample every thread of this process for ?seconds=N; collapsed stacks (flamegraph.pl, speedscope) or ?format=json"""
+    seconds = request.args.get('seconds', 10, type=float)
+    interval_ms = request.args.get('interval_ms', config.profile_interval_ms, type=float)
+    if not 0 < seconds <= config.profile_max_seconds:
+        return jsonify({'error': f"seconds must be between 0 and {config.profile_max_seconds}"}), 400
+    if not 1 <= interval_ms <= 1000:
+        return jsonify({'error': 'interval_ms must be between 1 and 1000'}), 400
+    
+    result = sampling_profiler.profile(seconds, interval_ms / 1000, idle=request.args.get('idle') == '1')
+    if result is None:
+        return jsonify({'error': 'A profile is already running'}), 409
+    stacks, passes = result
+    print(f"🔬 Profiled {seconds:g}s for {session['user_id']}: {passes} passes, {len(stacks)} stacks")
+    
+    if request.args.get('format') == 'json':
+        return jsonify({'success': True, 'worker_id': config.worker_id, 'seconds': seconds, 'interval_ms': interval_ms,
+                        'passes': passes, 'stacks': [{'stack': line, 'samples': n} for line, n in stacks]})
+    return Response(''.join(f"{line} {n}\n" for line, n in stacks), mimetype='text/plain',
+                    headers={'X-Profile-Passes': str(passes)})
+
+@app.route('/api/admin/slow-requests')
+@require_auth
+@require_admin
+def api_admin_slow_requests():
+    """Recent requests slower than SLOW_REQUEST_MS with their sampled stacks; ?format=collapsed merges them"""
+    recent = list(slow_requests.recent)
+    if request.args.get('format') == 'collapsed':
+        merged = {}
+        for record in recent:
+            for line, n in record['stacks']:
+                key = f"{record['endpoint']};{line}"
+                merged[key] = merged.get(key, 0) + n
+        return Response(''.join(f"{line} {n}\n" for line, n in sorted(merged.items(), key=lambda s: -s[1])),
+                        mimetype='text/plain')
+    return jsonify({'success': True, 'worker_id': config.worker_id, 'threshold_ms': config.slow_request_ms,
+                    'requests': [{**r, 'stacks': [{'stack': line, 'samples': n} for line, n in r['stacks']]}
+                                 for r in reversed(recent)]})
+
+@app.route('/api/admin/loop-blocks')
+@require_auth
+@require_admin
+def api_admin_loop_blocks():
+    """Recent stalls of the bot event loop with the blocking task and stack"""
+    return jsonify({'success': True, 'worker_id': config.worker_id, 'threshold_ms': config.loop_block_ms,
+                    'blocks': list(reversed(loop_watchdog.blocks))})
+
 @app.route('/api/guilds')
 @require_auth
 @require_bot_ready
-async def api_guilds():
-    """Get user's guilds where bot is present"""
+async def api_guilds():
+    """Get user's guilds where bot is present; ?since=<version> returns only changes"""
+    try:
+        since = request.args.get('since', type=int)
+        if shard_router.clustered:
+            merged = {}
+            for result in shard_router.gather('/api/guilds'):
+                for guild in result.get('guilds', []):
+                    merged[guild['id']] = guild
+            guilds = sorted(merged.values(), key=lambda g: g['name'].lower())
+        else:
+            guilds = await bot_manager.get_mutual_guilds(session['user_id'])
+        
+        version = max((g['version'] for g in guilds), default=0)
+        if since is not None:
+            # A restarted worker stamps its guilds with its start time, so they all count as changed;
+            # ids lists the whole current selection so the client drops guilds that are gone
+            return jsonify({
+                'success': True,
+                'delta': True,
+                'version': max(version, since),
+                'guilds': [g for g in guilds if g['version'] > since],
+                'ids': [g['id'] for g in guilds]
+            })
+        
+        digest = hashlib.sha256(json.dumps([(g['id'], g['version']) for g in guilds]).encode()).hexdigest()[:24]
+        return versioned_response({'success': True, 'version': version, 'guilds': guilds}, f"g{digest}")
+    except Exception as e:
+        print(f"❌ /api/guilds error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/channels')
+@require_auth
+@require_bot_ready
+async def api_channels():
+    """Get channels for a guild"""
+    guild_id = request.args.get('guild_id')
+    if not guild_id:
+        return jsonify({'error': 'Guild ID is required'}), 400
+    
+    forwarded = shard_router.route(guild_id)
+    if forwarded:
+        return forwarded
+    
+    try:
+        user_id = session['user_id']
+        since = request.args.get('since', type=int)
+        # Answer revalidation from the version alone, before any permission work
+        version = guild_versions.channels_version(int(guild_id), user_id)
+        etag = f"c{guild_id}.{user_id}.{version}"
+        if since is None and etag_matches(etag):
+            return versioned_response(None, etag)
+        
+        result = await bot_manager.get_channel_sync(guild_id, user_id, since)
+        if since is not None:
+            return jsonify({'success': True, **result})
+        return versioned_response({'success': True, **result}, f"c{guild_id}.{user_id}.{result['version']}")
+    except Exception as e:
+        print(f"❌ /api/channels error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/channels/batch')
+@require_auth
+@require_bot_ready
+async def api_channels_batch():
+    """Channels for several guilds in one round trip: ?guild_ids=1,2,3[&since=<version>]"""
+    try:
+        guild_ids = [int(g) for g in request.args.get('guild_ids', '').split(',') if g.strip()]
+        since = request.args.get('since', type=int)
+    except ValueError:
+        return jsonify({'error': 'guild_ids must be a comma-separated list of ids'}), 400
+    if not guild_ids:
+        return jsonify({'error': 'At least one guild ID is required'}), 400
+    if len(guild_ids) > 50:
+        return jsonify({'error': 'At most 50 guilds per request'}), 400
+    
     try:
-        guilds = await bot_manager.get_mutual_guilds(session['user_id'])
-        return jsonify({'success': True, 'guilds': guilds})
+        if shard_router.clustered:
+            by_worker = {}
+            for guild_id in guild_ids:
+                url = shard_router.owner_url(guild_id)
+                if url:
+                    by_worker.setdefault(url, []).append(str(guild_id))
+            suffix = f"&since={since}" if since is not None else ''
+            paths = {url: f"/api/channels/batch?guild_ids={','.join(ids)}{suffix}" for url, ids in by_worker.items()}
+            guilds = {}
+            for result in shard_router.gather(None, paths):
+                guilds.update(result.get('guilds', {}))
+            return jsonify({'success': True, 'guilds': guilds})
+        
+        results = await asyncio.gather(*(bot_manager.get_channel_sync(g, session['user_id'], since) for g in guild_ids))
+        return jsonify({'success': True, 'guilds': {r['guild_id']: r for r in results}})
     except Exception as e:
-        print(f"❌ /api/guilds error: {e}")
+        print(f"❌ /api/channels/batch error: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/channels')
+@app.route('/api/channels/<channel_id>/delivery', methods=['PUT'])
 @require_auth
 @require_bot_ready
-async def api_channels():
-    """Get channels for a guild"""
-    guild_id = request.args.get('guild_id')
+async def api_channel_delivery(channel_id):
+    """Choose how a channel is sent to: {guild_id, backend: 'bot' | 'webhook' | null for the default}"""
+    data = request.get_json(silent=True) or {}
+    guild_id = data.get('guild_id')
+    backend = data.get('backend')
     if not guild_id:
         return jsonify({'error': 'Guild ID is required'}), 400
+    if backend not in (None, *WebhookDelivery.BACKENDS):
+        return jsonify({'error': 'backend must be "bot", "webhook" or null'}), 400
+    
+    forwarded = shard_router.route(guild_id)
+    if forwarded:
+        return forwarded
     
     try:
         channels = await bot_manager.get_guild_channels(guild_id, session['user_id'])
-        return jsonify({'success': True, 'channels': channels})
+        if str(channel_id) not in {c['id'] for c in channels}:
+            return jsonify({'error': 'Channel not found'}), 404
+        if backend == 'webhook':
+            channel = bot_manager.bot.get_channel(int(channel_id))
+            if not channel.permissions_for(channel.guild.me).manage_webhooks:
+                return jsonify({'error': 'Bot needs the Manage Webhooks permission in this channel'}), 400
+        webhook_delivery.set_backend(channel_id, guild_id, backend)
+        return jsonify({'success': True, 'channel_id': str(channel_id), 'backend': backend or config.delivery_backend})
     except Exception as e:
-        print(f"❌ /api/channels error: {e}")
+        print(f"❌ /api/channels/delivery error: {e}")
+        return jsonify({'error': 'Failed to update delivery'}), 500
+
+@app.route('/api/channels/health')
+@require_auth
+@require_bot_ready
+async def api_channel_health():
+    """Channels of a guild the circuit breaker considers dead, with the reason and next probe time"""
+    guild_id = request.args.get('guild_id')
+    if not guild_id:
+        return jsonify({'error': 'Guild ID is required'}), 400
+    
+    forwarded = shard_router.route(guild_id)
+    if forwarded:
+        return forwarded
+    
+    try:
+        guild = bot_manager.bot.get_guild(int(guild_id))
+        if not guild or not await bot_manager.resolve_member(guild, session['user_id']):
+            return jsonify({'error': 'Guild not found'}), 404
+        return jsonify({'success': True, 'channels': [
+            {'channel_id': row['channel_id'], 'reason': row['reason'], 'failures': row['failures'],
+             'probe_at': row['probe_at']}
+            for row in db.get_channel_health(guild_id)
+        ]})
+    except Exception as e:
+        print(f"❌ /api/channels/health error: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/send', methods=['POST'])
 @require_auth
+@idempotent
 @require_bot_ready
 async def api_send():
     """Send message to selected channels"""
     data = request.json
+    guild_id = data.get('guild_id')
+    forwarded = shard_router.route(guild_id)
+    if forwarded:
+        return forwarded
+    
     channel_ids = data.get('channel_ids', [])
     content = data.get('content', '').strip()
     embeds = data.get('embeds', [])
@@ -809,59 +4538,295 @@ async def api_send():
         return jsonify({'error': 'Message cannot be empty'}), 400
     if len(content) > 2000:
         return jsonify({'error': 'Message exceeds 2000 character limit'}), 400
+    delivery = data.get('delivery')
+    if delivery not in (None, *WebhookDelivery.BACKENDS):
+        return jsonify({'error': 'delivery must be "bot" or "webhook"'}), 400
+    
+    throttled = admission.check('send', session['user_id'], len(channel_ids))
+    if throttled:
+        return throttled
     
     try:
-        results = []
-        for channel_id in channel_ids:
-            success, message = await bot_manager.send_message(channel_id, content, embeds, files)
-            results.append({'channel_id': channel_id, 'success': success, 'message': message})
-        
-        # Save to history if at least one success
-        if any(r['success'] for r in results):
-            db.save_message(session['user_id'], None, channel_ids, content, embeds, files)
-        
+        progress = None
+        if data.get('broadcast_id'):
+            progress = event_hub.delivery_progress(session['user_id'], str(data['broadcast_id'])[:64], len(channel_ids))
+        outcomes = await bot_manager.broadcast('interactive', session['user_id'], channel_ids, content, embeds, files,
+                                               progress=progress, backend=delivery, guild_id=guild_id)
+        results = record_broadcast(session['user_id'], guild_id, channel_ids, content, embeds, files, outcomes)
         return jsonify({'success': True, 'results': results})
         
     except Exception as e:
         print(f"❌ /api/send error: {e}")
         return jsonify({'error': 'Failed to send messages'}), 500
 
+@app.route('/api/resend/<int:msg_id>', methods=['POST'])
+@require_auth
+@idempotent
+@require_bot_ready
+async def api_resend(msg_id):
+    """Resend a stored message to all or some of its original channels"""
+    data = request.get_json(silent=True) or {}
+    msg = db.get_message(msg_id, session['user_id'])
+    if not msg:
+        return jsonify({'error': 'Message not found'}), 404
+    
+    forwarded = shard_router.route(msg['guild_id'])
+    if forwarded:
+        return forwarded
+    
+    original_ids = json.loads(msg['channel_id'])
+    channel_ids = data.get('channel_ids') or original_ids
+    if not set(channel_ids) <= set(original_ids):
+        return jsonify({'error': 'Channels must be a subset of the original message channels'}), 400
+    delivery = data.get('delivery')
+    if delivery not in (None, *WebhookDelivery.BACKENDS):
+        return jsonify({'error': 'delivery must be "bot" or "webhook"'}), 400
+    
+    throttled = admission.check('send', session['user_id'], len(channel_ids))
+    if throttled:
+        return throttled
+    
+    try:
+        prepared = payload_cache.get_or_build(msg['content'], msg['embed_data'], msg['files'])
+        outcomes = await bot_manager.broadcast('interactive', session['user_id'], channel_ids, None, prepared=prepared,
+                                               backend=delivery, guild_id=msg['guild_id'])
+        results = record_broadcast(session['user_id'], msg['guild_id'], channel_ids, msg['content'],
+                                   json.loads(msg['embed_data'] or '[]'), json.loads(msg['files'] or '[]'), outcomes)
+        return jsonify({'success': any(r['success'] for r in results), 'results': results})
+        
+    except Exception as e:
+        print(f"❌ /api/resend error: {e}")
+        return jsonify({'error': 'Failed to resend message'}), 500
+
+def record_broadcast(user_id, guild_id, channel_ids, content, embeds, files, outcomes):
+    """Save history and queue retries for a finished broadcast; returns per-channel results"""
+    results = []
+    retryable = []
+    for channel_id, (success, message, retry_after) in outcomes:
+        result = {'channel_id': channel_id, 'success': success, 'message': message}
+        if not success and retry_after is not None:
+            result['retry_queued'] = True
+            retryable.append((channel_id, message, retry_after))
+        results.append(result)
+    
+    # Save to history if at least one success or a retry is pending
+    msg_id = None
+    if any(r['success'] for r in results) or retryable:
+        msg_id = db.save_message(user_id, guild_id, channel_ids, content, embeds, files)
+        if not any(r['success'] for r in results):
+            db.update_message_status(msg_id, 'retrying')
+    
+    for channel_id, error, retry_after in retryable:
+        db.enqueue_retry(user_id, guild_id, channel_id, content, embeds, files,
+                         error, time.time() + retry_delay(1, retry_after), msg_id)
+    return results
+
 @app.route('/api/schedule', methods=['POST'])
 @require_auth
+@idempotent
 @require_bot_ready
 async def api_schedule():
     """Schedule message for later"""
     data = request.json
+    guild_id = data.get('guild_id')
     channel_ids = data.get('channel_ids', [])
     content = data.get('content', '').strip()
     embeds = data.get('embeds', [])
     files = data.get('files', [])
     scheduled_time = data.get('scheduled_time')
+    recurrence = data.get('recurrence')
     
     # Validation
     if not channel_ids:
         return jsonify({'error': 'Select at least one channel'}), 400
     if not content and not embeds and not files:
         return jsonify({'error': 'Message cannot be empty'}), 400
-    if not scheduled_time:
+    if not scheduled_time and not recurrence:
         return jsonify({'error': 'Schedule time is required'}), 400
     
+    now = int(time.time())
+    rule = None
     try:
-        scheduled_timestamp = int(scheduled_time)
-        if scheduled_timestamp <= int(time.time()):
-            return jsonify({'error': 'Schedule time must be in the future'}), 400
-        
-        db.save_message(session['user_id'], None, channel_ids, content, embeds, files, scheduled_timestamp)
+        scheduled_timestamp = int(scheduled_time) if scheduled_time else None
+        if recurrence:
+            # A series starts at scheduled_time (or now); only its first occurrence is stored
+            if isinstance(recurrence, dict) and scheduled_timestamp:
+                recurrence = {'start': scheduled_timestamp, **recurrence}
+            rule = RecurrenceRule.parse(recurrence)
+            scheduled_timestamp = rule.next_fire(max(scheduled_timestamp - 1 if scheduled_timestamp else now, now))
+            if scheduled_timestamp is None:
+                return jsonify({'error': 'Recurrence never fires'}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e) if recurrence else 'Invalid schedule time'}), 400
+    if scheduled_timestamp <= now:
+        return jsonify({'error': 'Schedule time must be in the future'}), 400
+    
+    throttled = admission.check('schedule', session['user_id'], len(channel_ids), queued=False)
+    if throttled:
+        return throttled
+    
+    try:
+        msg_id = db.save_message(session['user_id'], guild_id, channel_ids, content, embeds, files, scheduled_timestamp,
+                                 rule.to_json() if rule else None)
         
-        return jsonify({
+        response = {
             'success': True,
             'message': f'Message scheduled for {datetime.fromtimestamp(scheduled_timestamp).strftime("%Y-%m-%d %H:%M:%S")}'
-        })
+        }
+        if rule:
+            response['series_id'] = msg_id
+            response['upcoming'] = [scheduled_timestamp] + rule.upcoming(scheduled_timestamp, 1, 2)
+            response['message'] = f'Recurring message scheduled, first at {datetime.fromtimestamp(scheduled_timestamp).strftime("%Y-%m-%d %H:%M:%S")}'
+        return jsonify(response)
         
     except Exception as e:
         print(f"❌ /api/schedule error: {e}")
         return jsonify({'error': 'Failed to schedule message'}), 500
 
+@app.route('/api/import', methods=['POST'])
+@require_auth
+def api_import():
+    """Bulk send/schedule from a streamed JSONL or CSV body; returns a job to poll for progress"""
+    fmt = BulkImporter.detect_format(request.args.get('format'), request.content_type)
+    if not fmt:
+        return jsonify({'error': 'Send JSONL (application/x-ndjson) or CSV (text/csv)'}), 415
+    
+    job_id = bulk_importer.start(session['user_id'], fmt, request.stream)
+    if not job_id:
+        return jsonify({'error': 'An import is already running'}), 409
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': url_for('api_import_status', job_id=job_id)
+    }), 202
+
+@app.route('/api/import/<job_id>', methods=['GET'])
+@require_auth
+def api_import_status(job_id):
+    """Progress of a bulk import job"""
+    job = db.get_import_job(job_id, session['user_id'])
+    if not job:
+        return jsonify({'error': 'Import job not found'}), 404
+    job = dict(job)
+    job['errors'] = json.loads(job['errors']) if job['errors'] else []
+    return jsonify({'success': True, 'job': job})
+
+@app.route('/api/schedule/<int:series_id>', methods=['DELETE'])
+@require_auth
+def api_cancel_series(series_id):
+    """Stop a recurring series; occurrences already sent stay in the history"""
+    if db.cancel_series(series_id, session['user_id']):
+        return jsonify({'success': True, 'message': 'Recurring message stopped'})
+    return jsonify({'error': 'Recurring series not found'}), 404
+
+@app.route('/api/deliveries/dead', methods=['GET'])
+@require_auth
+def api_dead_deliveries():
+    """Dead-letter view of deliveries that exhausted their retries"""
+    try:
+        limit = min(int(request.args.get('limit', 50)), 200)
+        deliveries = db.get_dead_deliveries(session['user_id'], limit)
+        return jsonify({'success': True, 'deliveries': [{
+            'id': d['id'],
+            'message_id': d['message_id'],
+            'channel_id': d['channel_id'],
+            'content': d['content'],
+            'attempts': d['attempts'],
+            'last_error': d['last_error'],
+            'updated_at': d['updated_at']
+        } for d in deliveries]})
+    except Exception as e:
+        print(f"❌ /api/deliveries/dead error: {e}")
+        return jsonify({'error': 'Failed to fetch dead deliveries'}), 500
+
+@app.route('/api/deliveries/<int:retry_id>/requeue', methods=['POST'])
+@require_auth
+def api_requeue_delivery(retry_id):
+    """Put a dead-lettered delivery back on the retry queue"""
+    if db.requeue_delivery(retry_id, session['user_id']):
+        return jsonify({'success': True, 'message': 'Delivery requeued'})
+    return jsonify({'error': 'Delivery not found or not dead-lettered'}), 404
+
+@app.route('/api/search', methods=['GET'])
+@require_auth
+def api_search():
+    """Ranked full-text search over the user's templates and message history"""
+    text = request.args.get('q', '').strip()
+    scope = request.args.get('type', 'all')
+    if not text:
+        return jsonify({'error': 'Search query is required'}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 50))
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError:
+        return jsonify({'error': 'Invalid limit or offset'}), 400
+    
+    try:
+        user_id = session['user_id']
+        result = {'success': True, 'templates': [], 'messages': []}
+        if scope in ('all', 'templates'):
+            result['templates'] = [{
+                'id': t['id'],
+                'name': t['name'],
+                'preview': (t['content'] or '')[:100]
+            } for t in db.search_templates(user_id, text, limit, offset)]
+        if scope in ('all', 'messages'):
+            result['messages'] = [{
+                'id': m['id'],
+                'preview': (m['content'] or embed_text(m['embed_data']))[:100],
+                'status': m['status'],
+                'sent_time': m['sent_time'],
+                'created_at': m['created_at']
+            } for m in db.search_messages(user_id, text, limit, offset)]
+        return jsonify(result)
+    except Exception as e:
+        print(f"❌ /api/search error: {e}")
+        return jsonify({'error': 'Search failed'}), 500
+
+def encode_history_cursor(message):
+    return base64.urlsafe_b64encode(f"{message['created_at']}:{message['id']}".encode()).decode()
+
+def decode_history_cursor(cursor):
+    created_at, msg_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+    return int(created_at), int(msg_id)
+
+@app.route('/api/history', methods=['GET'])
+@require_auth
+def api_history():
+    """Cursor-paginated message history with status and channel filters"""
+    try:
+        limit = max(1, min(int(request.args.get('limit', 25)), 100))
+        cursor = request.args.get('cursor')
+        before = decode_history_cursor(cursor) if cursor else None
+    except (ValueError, UnicodeDecodeError):
+        return jsonify({'error': 'Invalid cursor or limit'}), 400
+    
+    try:
+        # One extra row tells us whether another page exists
+        messages = db.get_message_history(session['user_id'], limit + 1, before,
+                                          request.args.get('status'), request.args.get('channel_id'))
+        page = messages[:limit]
+        return jsonify({
+            'success': True,
+            'messages': [{
+                'id': m['id'],
+                'guild_id': m['guild_id'],
+                'channel_ids': json.loads(m['channel_id']),
+                'preview': (m['content'] or '')[:100],
+                'has_embeds': m['embed_data'] not in (None, '', '[]'),
+                'status': m['status'],
+                'scheduled_time': m['scheduled_time'],
+                'sent_time': m['sent_time'],
+                'created_at': m['created_at'],
+                'series_id': m['series_id'],
+                'recurring': m['recurrence'] is not None
+            } for m in page],
+            'next_cursor': encode_history_cursor(page[-1]) if len(messages) > limit else None
+        })
+    except Exception as e:
+        print(f"❌ /api/history error: {e}")
+        return jsonify({'error': 'Failed to fetch history'}), 500
+
 @app.route('/api/templates', methods=['GET', 'POST', 'DELETE'])
 @require_auth
 def api_templates():
@@ -883,6 +4848,8 @@ def api_templates():
         
         if not name:
             return jsonify({'error': 'Template name is required'}), 400
+        if not is_embed_list(embeds):
+            return jsonify({'error': 'embeds must be a list of objects'}), 400
         
         try:
             template_id = db.save_template(user_id, name, content, embeds)
@@ -947,86 +4914,276 @@ async def api_upload():
     
     return jsonify({'success': True, 'files': uploaded_files})
 
-@app.route('/api/welcome/config', methods=['GET', 'POST'])
-@require_auth
-@require_bot_ready
-async def api_welcome():
-    """Welcome message configuration"""
-    if request.method == 'GET':
-        guild_id = request.args.get('guild_id')
-        if not guild_id:
-            return jsonify({'error': 'Guild ID required'}), 400
-        
-        config = db.get_welcome_config(guild_id)
-        if config:
-            return jsonify({
-                'success': True,
-                'config': {
-                    'channel_id': config['channel_id'],
-                    'message': config['message'],
-                    'embeds': json.loads(config['embed_data']) if config['embed_data'] else [],
-                    'enabled': bool(config['enabled'])
-                }
-            })
-        return jsonify({'success': True, 'config': {'channel_id': '', 'message': '', 'enabled': False, 'embeds': []}})
-    
-    elif request.method == 'POST':
-        data = request.json
-        guild_id = data.get('guild_id')
-        channel_id = data.get('channel_id')
-        message = data.get('message', '')
-        embeds = data.get('embeds', [])
-        enabled = data.get('enabled', False)
-        
-        if not guild_id or not channel_id:
-            return jsonify({'error': 'Guild ID and Channel ID are required'}), 400
-        
-        # Validate channel exists and bot can send
-        try:
-            channel = bot_manager.bot.get_channel(int(channel_id))
-            if not channel:
-                return jsonify({'error': 'Channel not found'}), 400
-            if not channel.permissions_for(channel.guild.me).send_messages:
-                return jsonify({'error': 'Bot cannot send messages in this channel'}), 400
-        except:
-            return jsonify({'error': 'Invalid channel ID'}), 400
-        
-        try:
-            db.save_welcome_config(guild_id, channel_id, message, embeds, enabled, session['user_id'])
-            return jsonify({'success': True, 'message': 'Welcome configuration saved successfully'})
-        except Exception as e:
-            print(f"❌ Save welcome config error: {e}")
-            return jsonify({'error': 'Failed to save welcome configuration'}), 500
+@app.route('/api/welcome/config', methods=['GET', 'POST'])
+@require_auth
+@require_bot_ready
+async def api_welcome():
+    """Welcome message configuration"""
+    if request.method == 'GET':
+        guild_id = request.args.get('guild_id')
+        if not guild_id:
+            return jsonify({'error': 'Guild ID required'}), 400
+        
+        config = db.get_welcome_config(guild_id)
+        if config:
+            return jsonify({
+                'success': True,
+                'config': {
+                    'channel_id': config['channel_id'],
+                    'message': config['message'],
+                    'embeds': json.loads(config['embed_data']) if config['embed_data'] else [],
+                    'enabled': bool(config['enabled']),
+                    'disabled_reason': config['disabled_reason']
+                }
+            })
+        return jsonify({'success': True, 'config': {'channel_id': '', 'message': '', 'enabled': False, 'embeds': []}})
+    
+    elif request.method == 'POST':
+        data = request.json
+        guild_id = data.get('guild_id')
+        channel_id = data.get('channel_id')
+        message = data.get('message', '')
+        embeds = data.get('embeds', [])
+        enabled = data.get('enabled', False)
+        
+        if not guild_id or not channel_id:
+            return jsonify({'error': 'Guild ID and Channel ID are required'}), 400
+        
+        forwarded = shard_router.route(guild_id)
+        if forwarded:
+            return forwarded
+        
+        # Validate channel exists and bot can send
+        try:
+            channel = bot_manager.bot.get_channel(int(channel_id))
+            if not channel:
+                return jsonify({'error': 'Channel not found'}), 400
+            if not channel.permissions_for(channel.guild.me).send_messages:
+                return jsonify({'error': 'Bot cannot send messages in this channel'}), 400
+        except:
+            return jsonify({'error': 'Invalid channel ID'}), 400
+        
+        try:
+            db.save_welcome_config(guild_id, channel_id, message, embeds, enabled, session['user_id'])
+            # The bot can see and post to the channel again; let the next send probe it
+            channel_breaker.probe_soon(guild_id, int(channel_id))
+            return jsonify({'success': True, 'message': 'Welcome configuration saved successfully'})
+        except Exception as e:
+            print(f"❌ Save welcome config error: {e}")
+            return jsonify({'error': 'Failed to save welcome configuration'}), 500
+
+@app.route('/api/analytics', methods=['GET'])
+@require_auth
+def api_analytics():
+    """Get analytics data"""
+    try:
+        analytics = db.get_analytics()
+        return jsonify({'success': True, 'analytics': analytics})
+    except Exception as e:
+        print(f"❌ Analytics error: {e}")
+        return jsonify({'error': 'Failed to fetch analytics'}), 500
+
+@app.route('/uploads/<path:filename>')
+@require_auth
+def serve_upload(filename):
+    """Serve uploaded file"""
+    return send_from_directory(UPLOAD_DIR, filename)
+
+# ============================================================================
+# COMPLETE HTML TEMPLATE
+# ============================================================================
+
+DASHBOARD_HTML = '''
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Discord Message Dashboard</title>
+    <link rel="stylesheet" href="{{ css_url }}">
+</head>
+<body>
+    {% if user_id %}
+    <div class="header">
+        <div class="header-left">
+            <button class="hamburger" onclick="toggleSidebar()" aria-label="Toggle sidebar">☰</button>
+            <div class="logo">Discord Dashboard</div>
+        </div>
+        <div class="user-info">
+            {% if avatar %}<img src="{{ avatar }}" class="avatar" alt="{{ username }}">{% else %}<div class="avatar">{{ username[0] }}</div>{% endif %}
+            <span>{{ username }}</span>
+            <button class="logout-btn" onclick="logout()">Logout</button>
+            <button class="logout-btn" onclick="logout(true)" title="End sessions on all devices">Logout everywhere</button>
+        </div>
+    </div>
+
+    <div class="container">
+        <div class="sidebar" id="sidebar">
+            <div class="card">
+                <h2>Servers <span id="serverCount" style="color: #b9bbbe; font-size: 12px;">(0)</span></h2>
+                <div class="server-list" id="serverList">
+                    <div class="loading" style="margin: 20px auto;"></div>
+                </div>
+                <div class="error-message" id="serverError"></div>
+            </div>
+
+            <div class="card">
+                <h2>Channels</h2>
+                <div class="channel-list" id="channelList">
+                    <i style="color: #b9bbbe;">Select a server to view channels</i>
+                </div>
+            </div>
+
+            <div class="card welcome-config" id="welcomeCard" style="display: none;">
+                <h2>Welcome Setup</h2>
+                <div class="form-group">
+                    <label>Welcome Channel</label>
+                    <select id="welcomeChannel">
+                        <option value="">Choose a channel...</option>
+                    </select>
+                </div>
+                <div class="form-group">
+                    <label>Message (use {user}, {server})</label>
+                    <textarea id="welcomeMsg" rows="2" placeholder="Welcome {user} to {server}!">Welcome {user} to {server}!</textarea>
+                </div>
+                <div id="welcomeNotice" style="display: none; color: #faa61a; font-size: 12px; margin-top: 8px;"></div>
+                <div class="checkbox-group" style="margin: 10px 0;">
+                    <input type="checkbox" id="welcomeEnabled">
+                    <span>Enable auto-welcome for new members</span>
+                </div>
+                <button class="btn" onclick="saveWelcome()" style="width: 100%; padding: 8px;">Save Welcome Config</button>
+            </div>
+        </div>
+
+        <div class="main-content" id="mainContent">
+            <div class="card">
+                <h2>Message Composer</h2>
+                <div class="form-group">
+                    <label>Message Content</label>
+                    <textarea id="messageContent" rows="4" placeholder="Enter your message here..."></textarea>
+                    <div class="char-counter" id="charCounter">0 / 2000</div>
+                </div>
+
+                <div class="section-title">Embeds</div>
+                <button class="btn btn-secondary" onclick="addEmbed()" style="margin-bottom: 15px;">+ Add Embed (Max 10)</button>
+                <div id="embedList"></div>
+
+                <div class="section-title">File Attachments</div>
+                <div class="file-upload" onclick="document.getElementById('fileInput').click()">
+                    <p>📎 Click here or drag files to upload</p>
+                    <small style="color: #b9bbbe;">Max 25MB per file, supports images, PDFs, text</small>
+                </div>
+                <input type="file" id="fileInput" multiple accept="*" style="display: none;">
+                <div class="file-list" id="fileList"></div>
+
+                <div class="form-group">
+                    <label>Delivery</label>
+                    <select id="deliveryBackend">
+                        <option value="">Channel default</option>
+                        <option value="bot">Bot</option>
+                        <option value="webhook">Webhook (falls back to the bot)</option>
+                    </select>
+                </div>
+
+                <div class="button-group">
+                    <button class="btn" onclick="sendMessage()">Send Now</button>
+                    <button class="btn btn-secondary" onclick="scheduleMessage()">Schedule</button>
+                    <button class="btn btn-secondary" onclick="saveTemplate()">Save Template</button>
+                </div>
+            </div>
+
+            <div class="card">
+                <h2>Search</h2>
+                <input type="text" id="searchInput" placeholder="Search templates and sent messages..." oninput="scheduleSearch()">
+                <div id="searchResults" style="margin-top: 10px;"></div>
+            </div>
+
+            <div class="card">
+                <h2>Saved Templates</h2>
+                <div id="templateList">
+                    {% for t in templates %}
+                    <div class="template-item">
+                        <span>{{ t.name }}</span>
+                        <div>
+                            <button class="btn btn-secondary" onclick="loadTemplate({{ t.id }})">Load</button>
+                            <button class="btn btn-danger" onclick="deleteTemplate({{ t.id }})">Delete</button>
+                        </div>
+                    </div>
+                    {% else %}
+                    <i style="color: #b9bbbe;">No templates saved yet</i>
+                    {% endfor %}
+                </div>
+            </div>
+
+            <div class="card">
+                <h2>Message History</h2>
+                <div class="button-group" style="margin-bottom: 10px;">
+                    <select id="historyStatus" onchange="loadHistory(true)">
+                        <option value="">All statuses</option>
+                        <option value="sent">Sent</option>
+                        <option value="pending">Scheduled</option>
+                        <option value="retrying">Retrying</option>
+                        <option value="failed">Failed</option>
+                        <option value="cancelled">Cancelled</option>
+                    </select>
+                    <select id="historyChannel" onchange="loadHistory(true)">
+                        <option value="">All channels</option>
+                    </select>
+                </div>
+                <div id="historyList">
+                    <div class="loading" style="margin: 20px auto;"></div>
+                </div>
+                <button class="btn btn-secondary" id="historyMore" onclick="loadHistory(false)" style="display: none; width: 100%; margin-top: 10px;">Load more</button>
+            </div>
+        </div>
 
-@app.route('/api/analytics', methods=['GET'])
-@require_auth
-def api_analytics():
-    """Get analytics data"""
-    try:
-        analytics = db.get_analytics()
-        return jsonify({'success': True, 'analytics': analytics})
-    except Exception as e:
-        print(f"❌ Analytics error: {e}")
-        return jsonify({'error': 'Failed to fetch analytics'}), 500
+        <div class="stats-bar">
+            <div class="stat-item">
+                <div class="stat-value">{{ analytics.today }}</div>
+                <div class="stat-label">Messages Today</div>
+            </div>
+            <div class="stat-item">
+                <div class="stat-value">{{ analytics.week }}</div>
+                <div class="stat-label">This Week</div>
+            </div>
+            <div class="stat-item">
+                <div class="stat-value">{{ analytics.month }}</div>
+                <div class="stat-label">This Month</div>
+            </div>
+            <div class="stat-item">
+                <div class="stat-value">{{ analytics.files_today }}</div>
+                <div class="stat-label">Files Today</div>
+            </div>
+        </div>
+    </div>
 
-@app.route('/uploads/<path:filename>')
-@require_auth
-def serve_upload(filename):
-    """Serve uploaded file"""
-    return send_from_directory(UPLOAD_DIR, filename)
+    <div id="toast" class="toast"></div>
 
-# ============================================================================
-# COMPLETE HTML TEMPLATE
-# ============================================================================
+    {% else %}
+    <div style="display: flex; justify-content: center; align-items: center; height: 100vh; background: #1e1f29;">
+        <div class="card" style="text-align: center; max-width: 400px; padding: 30px;">
+            <h1 style="color: #5865F2; margin-bottom: 20px;">Discord Dashboard</h1>
+            <p style="margin-bottom: 30px; color: #b9bbbe;">Professional Discord message management at your fingertips</p>
+            <a href="{{ oauth_url }}" class="btn" style="display: block; text-decoration: none; padding: 15px;">Login with Discord</a>
+            <p style="margin-top: 20px; font-size: 12px; color: #72747e;">Secure OAuth2 authentication</p>
+        </div>
+    </div>
+    {% endif %}
 
-DASHBOARD_HTML = '''
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Discord Message Dashboard</title>
-    <style>
+    <script>
+        window.DASHBOARD_STATE = {
+            botReady: {{ 'true' if bot_ready else 'false' }},
+            userId: {{ user_id|default('null') }},
+            csrfToken: {{ csrf_token|default(none)|tojson }}
+        };
+    </script>
+    <script src="{{ js_url }}"></script>
+</body>
+</html>
+'''
+
+# Served from /assets/ under a content fingerprint (see STATIC ASSETS below)
+DASHBOARD_CSS = '''
         /* ===== CSS RESET & BASE STYLES ===== */
         * {
             margin: 0;
@@ -1208,6 +5365,15 @@ DASHBOARD_HTML = '''
             box-shadow: 0 0 0 2px rgba(88, 101, 242, 0.3);
         }
 
+        .channel-item.dead {
+            opacity: 0.6;
+        }
+
+        .channel-item.dead::after {
+            content: '⚠️';
+            margin-left: auto;
+        }
+
         .server-icon {
             width: 32px;
             height: 32px;
@@ -1456,227 +5622,83 @@ DASHBOARD_HTML = '''
         .stat-label {
             font-size: 11px;
             color: #b9bbbe;
-            text-transform: uppercase;
-        }
-
-        /* ===== EMBED BUILDER ===== */
-        .embed-builder {
-            margin-top: 15px;
-            padding: 15px;
-            background: #2a2b38;
-            border-radius: 6px;
-            border: 1px solid #40424e;
-        }
-
-        .embed-preview {
-            background: #40424e;
-            padding: 15px;
-            border-radius: 6px;
-            margin-top: 15px;
-            border-left: 4px solid #5865F2;
-        }
-
-        /* ===== RESPONSIVE ===== */
-        @media (max-width: 768px) {
-            .sidebar {
-                width: 100%;
-                height: 300px;
-                position: absolute;
-                z-index: 50;
-            }
-            
-            .sidebar.collapsed {
-                transform: translateY(-300px);
-            }
-            
-            .main-content {
-                padding: 15px;
-            }
-            
-            .stats-bar {
-                flex-wrap: wrap;
-                gap: 10px;
-            }
-            
-            .stat-item { flex: 1; }
-        }
-
-        /* ===== SCROLLBAR STYLING ===== */
-        ::-webkit-scrollbar {
-            width: 8px;
-            height: 8px;
-        }
-
-        ::-webkit-scrollbar-track {
-            background: #1e1f29;
-        }
-
-        ::-webkit-scrollbar-thumb {
-            background: #40424e;
-            border-radius: 4px;
-        }
-
-        ::-webkit-scrollbar-thumb:hover {
-            background: #5865F2;
-        }
-    </style>
-</head>
-<body>
-    {% if user_id %}
-    <div class="header">
-        <div class="header-left">
-            <button class="hamburger" onclick="toggleSidebar()" aria-label="Toggle sidebar">☰</button>
-            <div class="logo">Discord Dashboard</div>
-        </div>
-        <div class="user-info">
-            {% if avatar %}<img src="{{ avatar }}" class="avatar" alt="{{ username }}">{% else %}<div class="avatar">{{ username[0] }}</div>{% endif %}
-            <span>{{ username }}</span>
-            <button class="logout-btn" onclick="logout()">Logout</button>
-        </div>
-    </div>
-
-    <div class="container">
-        <div class="sidebar" id="sidebar">
-            <div class="card">
-                <h2>Servers <span id="serverCount" style="color: #b9bbbe; font-size: 12px;">(0)</span></h2>
-                <div class="server-list" id="serverList">
-                    <div class="loading" style="margin: 20px auto;"></div>
-                </div>
-                <div class="error-message" id="serverError"></div>
-            </div>
-
-            <div class="card">
-                <h2>Channels</h2>
-                <div class="channel-list" id="channelList">
-                    <i style="color: #b9bbbe;">Select a server to view channels</i>
-                </div>
-            </div>
-
-            <div class="card welcome-config" id="welcomeCard" style="display: none;">
-                <h2>Welcome Setup</h2>
-                <div class="form-group">
-                    <label>Welcome Channel</label>
-                    <select id="welcomeChannel">
-                        <option value="">Choose a channel...</option>
-                    </select>
-                </div>
-                <div class="form-group">
-                    <label>Message (use {user}, {server})</label>
-                    <textarea id="welcomeMsg" rows="2" placeholder="Welcome {user} to {server}!">Welcome {user} to {server}!</textarea>
-                </div>
-                <div class="checkbox-group" style="margin: 10px 0;">
-                    <input type="checkbox" id="welcomeEnabled">
-                    <span>Enable auto-welcome for new members</span>
-                </div>
-                <button class="btn" onclick="saveWelcome()" style="width: 100%; padding: 8px;">Save Welcome Config</button>
-            </div>
-        </div>
-
-        <div class="main-content" id="mainContent">
-            <div class="card">
-                <h2>Message Composer</h2>
-                <div class="form-group">
-                    <label>Message Content</label>
-                    <textarea id="messageContent" rows="4" placeholder="Enter your message here..."></textarea>
-                    <div class="char-counter" id="charCounter">0 / 2000</div>
-                </div>
-
-                <div class="section-title">Embeds</div>
-                <button class="btn btn-secondary" onclick="addEmbed()" style="margin-bottom: 15px;">+ Add Embed (Max 10)</button>
-                <div id="embedList"></div>
+            text-transform: uppercase;
+        }
 
-                <div class="section-title">File Attachments</div>
-                <div class="file-upload" onclick="document.getElementById('fileInput').click()">
-                    <p>📎 Click here or drag files to upload</p>
-                    <small style="color: #b9bbbe;">Max 25MB per file, supports images, PDFs, text</small>
-                </div>
-                <input type="file" id="fileInput" multiple accept="*" style="display: none;">
-                <div class="file-list" id="fileList"></div>
+        /* ===== EMBED BUILDER ===== */
+        .embed-builder {
+            margin-top: 15px;
+            padding: 15px;
+            background: #2a2b38;
+            border-radius: 6px;
+            border: 1px solid #40424e;
+        }
 
-                <div class="button-group">
-                    <button class="btn" onclick="sendMessage()">Send Now</button>
-                    <button class="btn btn-secondary" onclick="scheduleMessage()">Schedule</button>
-                    <button class="btn btn-secondary" onclick="saveTemplate()">Save Template</button>
-                </div>
-            </div>
+        .embed-preview {
+            background: #40424e;
+            padding: 15px;
+            border-radius: 6px;
+            margin-top: 15px;
+            border-left: 4px solid #5865F2;
+        }
 
-            <div class="card">
-                <h2>Saved Templates</h2>
-                <div id="templateList">
-                    {% for t in templates %}
-                    <div class="template-item">
-                        <span>{{ t.name }}</span>
-                        <div>
-                            <button class="btn btn-secondary" onclick="loadTemplate({{ t.id }})">Load</button>
-                            <button class="btn btn-danger" onclick="deleteTemplate({{ t.id }})">Delete</button>
-                        </div>
-                    </div>
-                    {% else %}
-                    <i style="color: #b9bbbe;">No templates saved yet</i>
-                    {% endfor %}
-                </div>
-            </div>
+        /* ===== RESPONSIVE ===== */
+        @media (max-width: 768px) {
+            .sidebar {
+                width: 100%;
+                height: 300px;
+                position: absolute;
+                z-index: 50;
+            }
+            
+            .sidebar.collapsed {
+                transform: translateY(-300px);
+            }
+            
+            .main-content {
+                padding: 15px;
+            }
+            
+            .stats-bar {
+                flex-wrap: wrap;
+                gap: 10px;
+            }
+            
+            .stat-item { flex: 1; }
+        }
 
-            <div class="card">
-                <h2>Message History <small style="color: #b9bbbe; font-size: 12px;">(Last 50)</small></h2>
-                <div id="historyList">
-                    {% for h in history %}
-                    <div class="history-item">
-                        <div>
-                            <strong>{{ h.sent_time|default('Scheduled', true) }}</strong><br>
-                            <small style="color: #b9bbbe;">{{ (h.content[:60] + '...') if h.content and h.content|length > 60 else (h.content or 'No text') }}</small>
-                        </div>
-                        <button class="btn btn-secondary" onclick="resendMessage({{ h.id }})">Resend</button>
-                    </div>
-                    {% else %}
-                    <i style="color: #b9bbbe;">No messages yet</i>
-                    {% endfor %}
-                </div>
-            </div>
-        </div>
+        /* ===== SCROLLBAR STYLING ===== */
+        ::-webkit-scrollbar {
+            width: 8px;
+            height: 8px;
+        }
 
-        <div class="stats-bar">
-            <div class="stat-item">
-                <div class="stat-value">{{ analytics.today }}</div>
-                <div class="stat-label">Messages Today</div>
-            </div>
-            <div class="stat-item">
-                <div class="stat-value">{{ analytics.week }}</div>
-                <div class="stat-label">This Week</div>
-            </div>
-            <div class="stat-item">
-                <div class="stat-value">{{ analytics.month }}</div>
-                <div class="stat-label">This Month</div>
-            </div>
-            <div class="stat-item">
-                <div class="stat-value">{{ analytics.files_today }}</div>
-                <div class="stat-label">Files Today</div>
-            </div>
-        </div>
-    </div>
+        ::-webkit-scrollbar-track {
+            background: #1e1f29;
+        }
 
-    <div id="toast" class="toast"></div>
+        ::-webkit-scrollbar-thumb {
+            background: #40424e;
+            border-radius: 4px;
+        }
 
-    {% else %}
-    <div style="display: flex; justify-content: center; align-items: center; height: 100vh; background: #1e1f29;">
-        <div class="card" style="text-align: center; max-width: 400px; padding: 30px;">
-            <h1 style="color: #5865F2; margin-bottom: 20px;">Discord Dashboard</h1>
-            <p style="margin-bottom: 30px; color: #b9bbbe;">Professional Discord message management at your fingertips</p>
-            <a href="{{ oauth_url }}" class="btn" style="display: block; text-decoration: none; padding: 15px;">Login with Discord</a>
-            <p style="margin-top: 20px; font-size: 12px; color: #72747e;">Secure OAuth2 authentication</p>
-        </div>
-    </div>
-    {% endif %}
+        ::-webkit-scrollbar-thumb:hover {
+            background: #5865F2;
+        }
+'''
 
-    <script>
+DASHBOARD_JS = '''
         // ===== GLOBAL STATE =====
         let servers = [];
         let selectedServer = null;
         let selectedChannels = [];
         let uploadedFiles = [];
         let embeds = [];
-        let botReady = {{ 'true' if bot_ready else 'false' }};
-        let currentUserId = {{ user_id|default('null') }};
+        let botReady = window.DASHBOARD_STATE.botReady;
+        let currentUserId = window.DASHBOARD_STATE.userId;
+        // One key per composed message, so double-clicks and retried fetches are replayed, not resent
+        let sendKey = null;
+        let scheduleKey = null;
 
         // ===== INITIALIZATION =====
         document.addEventListener('DOMContentLoaded', async function() {
@@ -1688,27 +5710,49 @@ DASHBOARD_HTML = '''
         async function initializeDashboard() {
             showToast('Initializing dashboard...', 'info');
             
-            // Wait for bot to be ready
-            const checkBotReady = async () => {
-                try {
-                    const health = await fetch('/api/health');
-                    const data = await health.json();
-                    if (data.bot_ready) {
-                        botReady = true;
-                        await loadServers();
-                        setupEventListeners();
-                        showToast('Dashboard ready!', 'success');
-                    } else {
-                        setTimeout(checkBotReady, 5000);
-                        showToast('Waiting for bot to connect...', 'info');
-                    }
-                } catch (e) {
-                    showToast('Connection error. Retrying...', 'error');
-                    setTimeout(checkBotReady, 5000);
+            // Bot status arrives as the first event and on every transition
+            let initialized = false;
+            const events = new EventSource('/api/events');
+            
+            events.addEventListener('bot', async e => {
+                const data = JSON.parse(e.data);
+                if (data.ready && !initialized) {
+                    initialized = true;
+                    botReady = true;
+                    await loadServers();
+                    setupEventListeners();
+                    prefetchChannels();
+                    showToast('Dashboard ready!', 'success');
+                } else if (!data.ready) {
+                    showToast('Waiting for bot to connect...', 'info');
+                } else if (!data.connected) {
+                    showToast('Bot connection lost, reconnecting...', 'error');
                 }
-            };
+            });
+            
+            events.addEventListener('delivery', e => {
+                const data = JSON.parse(e.data);
+                if (data.broadcast_id === sendKey) {
+                    showToast(`Delivered ${data.done}/${data.total} channel(s)...`, 'info');
+                }
+            });
+            
+            events.addEventListener('scheduled', e => {
+                const data = JSON.parse(e.data);
+                if (data.status === 'firing') {
+                    showToast(`Scheduled message #${data.message_id} is being sent...`, 'info');
+                } else {
+                    showToast(`Scheduled message #${data.message_id}: ${data.status}`, data.status === 'failed' ? 'error' : 'success');
+                    loadHistory(true);
+                }
+            });
+            
+            // The server dropped events for this connection; refetch state instead
+            events.addEventListener('resync', () => loadHistory(true));
             
-            checkBotReady();
+            events.onerror = () => {
+                if (!initialized) showToast('Connection error. Retrying...', 'error');
+            };
         }
 
         async function loadServers() {
@@ -1764,14 +5808,10 @@ DASHBOARD_HTML = '''
             
             // Load channels
             try {
-                const response = await fetch(`/api/channels?guild_id=${serverId}`);
-                const data = await response.json();
+                const channels = await fetchChannels(serverId);
                 
-                if (!response.ok) {
-                    throw new Error(data.error || 'Failed to load channels');
-                }
-                
-                const channels = data.channels || data;
+                document.getElementById('historyChannel').innerHTML = '<option value="">All channels</option>' +
+                    channels.map(c => `<option value="${c.id}">#${escapeHtml(c.name)}</option>`).join('');
                 
                 if (channels.length === 0) {
                     document.getElementById('channelList').innerHTML = '<div style="color: #b9bbbe;">No channels where you can send messages.</div>';
@@ -1781,6 +5821,8 @@ DASHBOARD_HTML = '''
                     `).join('');
                 }
                 
+                loadChannelHealth(serverId);
+                
                 // Load welcome config for this server
                 await loadWelcomeConfig(serverId);
                 document.getElementById('welcomeCard').style.display = 'block';
@@ -1791,6 +5833,67 @@ DASHBOARD_HTML = '''
             }
         }
 
+        // ===== CHANNEL CACHE =====
+        // guild id -> {version, channels}; refreshed with ?since= deltas
+        const channelCache = {};
+
+        async function fetchChannels(serverId) {
+            const cached = channelCache[serverId];
+            const since = cached ? `&since=${cached.version}` : '';
+            const response = await fetch(`/api/channels?guild_id=${serverId}${since}`);
+            const data = await response.json();
+            
+            if (!response.ok) {
+                throw new Error(data.error || 'Failed to load channels');
+            }
+            return mergeChannels(serverId, data);
+        }
+
+        function mergeChannels(serverId, data) {
+            let channels = data.channels;
+            if (data.delta) {
+                const byId = {};
+                channelCache[serverId].channels.forEach(c => byId[c.id] = c);
+                data.channels.forEach(c => byId[c.id] = c);
+                channels = data.ids.map(id => byId[id]).filter(Boolean);
+            }
+            channelCache[serverId] = {version: data.version, channels: channels};
+            return channels;
+        }
+
+        async function prefetchChannels() {
+            const ids = servers.slice(0, 10).map(s => s.id);
+            if (ids.length === 0) return;
+            
+            try {
+                const response = await fetch(`/api/channels/batch?guild_ids=${ids.join(',')}`);
+                const data = await response.json();
+                if (response.ok) {
+                    Object.values(data.guilds).forEach(g => mergeChannels(g.guild_id, g));
+                }
+            } catch (e) {
+                console.error('Prefetch channels error:', e);
+            }
+        }
+
+        async function loadChannelHealth(serverId) {
+            try {
+                const response = await fetch(`/api/channels/health?guild_id=${serverId}`);
+                const data = await response.json();
+                if (!response.ok || selectedServer !== serverId) return;
+                
+                data.channels.forEach(h => {
+                    const el = document.querySelector(`.channel-item[data-channel-id="${h.channel_id}"]`);
+                    if (el) {
+                        el.classList.add('dead');
+                        el.title = `${h.reason} (next check ${new Date(h.probe_at * 1000).toLocaleTimeString()})`;
+                    }
+                });
+            } catch (e) {
+                console.error('Load channel health error:', e);
+            }
+        }
+
         function selectChannel(channelId, element) {
             element.classList.toggle('selected');
             if (element.classList.contains('selected')) {
@@ -1811,10 +5914,14 @@ DASHBOARD_HTML = '''
                     document.getElementById('welcomeChannel').value = data.config.channel_id || '';
                     document.getElementById('welcomeMsg').value = data.config.message || 'Welcome {user} to {server}!';
                     document.getElementById('welcomeEnabled').checked = data.config.enabled || false;
+                    const notice = document.getElementById('welcomeNotice');
+                    notice.textContent = data.config.disabled_reason ? `⚠️ Turned off automatically: ${data.config.disabled_reason}` : '';
+                    notice.style.display = data.config.disabled_reason ? 'block' : 'none';
                 } else {
                     document.getElementById('welcomeChannel').value = '';
                     document.getElementById('welcomeMsg').value = 'Welcome {user} to {server}!';
                     document.getElementById('welcomeEnabled').checked = false;
+                    document.getElementById('welcomeNotice').style.display = 'none';
                 }
                 
                 // Update channel options
@@ -1870,6 +5977,7 @@ DASHBOARD_HTML = '''
                 
                 if (data.success) {
                     showToast(data.message || 'Welcome config saved!', 'success');
+                    document.getElementById('welcomeNotice').style.display = 'none';
                 } else {
                     showToast(data.error || 'Failed to save', 'error');
                 }
@@ -2062,20 +6170,25 @@ DASHBOARD_HTML = '''
             }
             
             showToast('Sending messages...', 'info');
+            sendKey = sendKey || crypto.randomUUID();
             
             try {
-                const response = await fetch('/api/send', {
+                const response = await fetchWithRetry('/api/send', {
                     method: 'POST',
-                    headers: {'Content-Type': 'application/json'},
+                    headers: {'Content-Type': 'application/json', 'Idempotency-Key': sendKey},
                     body: JSON.stringify({
+                        guild_id: selectedServer,
                         channel_ids: selectedChannels,
                         content: content,
                         embeds: embeds,
-                        files: uploadedFiles.map(f => f.path)
+                        files: uploadedFiles.map(f => f.path),
+                        broadcast_id: sendKey,
+                        delivery: document.getElementById('deliveryBackend').value || null
                     })
                 });
                 
                 const data = await response.json();
+                if (!isRetryableStatus(response.status)) sendKey = null;
                 
                 if (data.success) {
                     showToast(`Messages sent to ${selectedChannels.length} channel(s)!`, 'success');
@@ -2093,6 +6206,23 @@ DASHBOARD_HTML = '''
             }
         }
 
+        function parseRecurrence(text) {
+            text = text.trim();
+            if (!text) return null;
+            const timezone = Intl.DateTimeFormat().resolvedOptions().timeZone;
+            const interval = text.match(/^every\\s+(\\d+)\\s+(minutes|hours|days|weeks)$/i);
+            if (interval) return {every: parseInt(interval[1]), unit: interval[2].toLowerCase(), timezone: timezone};
+            return {cron: text, timezone: timezone};
+        }
+
+        async function stopSeries(seriesId) {
+            if (!confirm('Stop this recurring message?')) return;
+            const response = await fetch(`/api/schedule/${seriesId}`, {method: 'DELETE'});
+            const data = await response.json();
+            showToast(data.message || data.error, response.ok ? 'success' : 'error');
+            if (response.ok) loadHistory(true);
+        }
+
         async function scheduleMessage() {
             if (!botReady) {
                 showToast('Bot is initializing...', 'error');
@@ -2120,28 +6250,40 @@ DASHBOARD_HTML = '''
             
             if (!scheduledTime) return;
             
+            const repeat = prompt(
+                `Repeat? Leave empty to send once.\\n\\n` +
+                `Cron: "0 9 * * mon" (Mondays 09:00)\\n` +
+                `Interval: "every 1 days" (minutes, hours, days, weeks)`
+            );
+            if (repeat === null) return;
+            
             try {
                 const timestamp = parseInt(scheduledTime);
                 if (isNaN(timestamp) || timestamp <= now) {
                     showToast('Invalid time. Must be in future.', 'error');
                     return;
                 }
+                const recurrence = parseRecurrence(repeat);
                 
                 showToast('Scheduling...', 'info');
+                scheduleKey = scheduleKey || crypto.randomUUID();
                 
-                const response = await fetch('/api/schedule', {
+                const response = await fetchWithRetry('/api/schedule', {
                     method: 'POST',
-                    headers: {'Content-Type': 'application/json'},
+                    headers: {'Content-Type': 'application/json', 'Idempotency-Key': scheduleKey},
                     body: JSON.stringify({
+                        guild_id: selectedServer,
                         channel_ids: selectedChannels,
                         content: content,
                         embeds: embeds,
                         files: uploadedFiles.map(f => f.path),
-                        scheduled_time: timestamp
+                        scheduled_time: timestamp,
+                        recurrence: recurrence
                     })
                 });
                 
                 const data = await response.json();
+                if (!isRetryableStatus(response.status)) scheduleKey = null;
                 
                 if (data.success) {
                     showToast(data.message || 'Message scheduled!', 'success');
@@ -2225,8 +6367,10 @@ DASHBOARD_HTML = '''
             showToast('Resending...', 'info');
             
             try {
-                const response = await fetch(`/api/resend/${msgId}`, {
-                    method: 'POST'
+                const response = await fetchWithRetry(`/api/resend/${msgId}`, {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json', 'Idempotency-Key': crypto.randomUUID()},
+                    body: JSON.stringify({})
                 });
                 
                 const data = await response.json();
@@ -2242,7 +6386,113 @@ DASHBOARD_HTML = '''
             }
         }
 
+        // ===== HISTORY =====
+        let historyCursor = null;
+
+        async function loadHistory(reset) {
+            const list = document.getElementById('historyList');
+            const more = document.getElementById('historyMore');
+            if (reset) {
+                historyCursor = null;
+                list.innerHTML = '<div class="loading" style="margin: 20px auto;"></div>';
+            }
+            
+            const params = new URLSearchParams({limit: 25});
+            const status = document.getElementById('historyStatus').value;
+            const channel = document.getElementById('historyChannel').value;
+            if (status) params.set('status', status);
+            if (channel) params.set('channel_id', channel);
+            if (historyCursor) params.set('cursor', historyCursor);
+            
+            try {
+                const response = await fetch(`/api/history?${params}`);
+                const data = await response.json();
+                if (!response.ok) throw new Error(data.error || 'Failed to load history');
+                
+                const items = data.messages.map(h => `
+                    <div class="history-item">
+                        <div>
+                            <strong>${h.recurring ? '🔁 ' : ''}${h.sent_time ? new Date(h.sent_time * 1000).toLocaleString() : (h.scheduled_time ? 'Scheduled ' + new Date(h.scheduled_time * 1000).toLocaleString() : h.status)}</strong><br>
+                            <small style="color: #b9bbbe;">${escapeHtml(h.preview ? (h.preview.length > 60 ? h.preview.slice(0, 60) + '...' : h.preview) : (h.has_embeds ? 'Embed' : 'No text'))}</small>
+                        </div>
+                        <button class="btn btn-secondary" onclick="resendMessage(${h.id})">Resend</button>
+                        ${h.recurring && h.status === 'pending' ? `<button class="btn btn-secondary" onclick="stopSeries(${h.series_id})">Stop</button>` : ''}
+                    </div>
+                `).join('');
+                
+                if (reset) list.innerHTML = items || '<i style="color: #b9bbbe;">No messages yet</i>';
+                else list.insertAdjacentHTML('beforeend', items);
+                historyCursor = data.next_cursor;
+                more.style.display = historyCursor ? 'block' : 'none';
+            } catch (e) {
+                list.innerHTML = `<div style="color: #ff6b6b;">❌ ${escapeHtml(e.message)}</div>`;
+            }
+        }
+
+        // ===== SEARCH =====
+        let searchTimer = null;
+
+        function scheduleSearch() {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(runSearch, 250);
+        }
+
+        async function runSearch() {
+            const query = document.getElementById('searchInput').value.trim();
+            const results = document.getElementById('searchResults');
+            if (!query) {
+                results.innerHTML = '';
+                return;
+            }
+            
+            try {
+                const response = await fetch(`/api/search?${new URLSearchParams({q: query})}`);
+                const data = await response.json();
+                if (!response.ok) throw new Error(data.error || 'Search failed');
+                
+                const templates = data.templates.map(t => `
+                    <div class="template-item">
+                        <span>📝 ${escapeHtml(t.name)}</span>
+                        <button class="btn btn-secondary" onclick="loadTemplate(${t.id})">Load</button>
+                    </div>
+                `);
+                const messages = data.messages.map(m => `
+                    <div class="history-item">
+                        <div><small style="color: #b9bbbe;">${escapeHtml(m.preview || 'No text')}</small></div>
+                        <button class="btn btn-secondary" onclick="resendMessage(${m.id})">Resend</button>
+                    </div>
+                `);
+                results.innerHTML = templates.concat(messages).join('') || '<i style="color: #b9bbbe;">No matches</i>';
+            } catch (e) {
+                results.innerHTML = `<div style="color: #ff6b6b;">❌ ${escapeHtml(e.message)}</div>`;
+            }
+        }
+
         // ===== UTILITY FUNCTIONS =====
+        function escapeHtml(text) {
+            const div = document.createElement('div');
+            div.textContent = text;
+            return div.innerHTML;
+        }
+
+        async function fetchWithRetry(url, options, attempts = 3) {
+            for (let attempt = 1; ; attempt++) {
+                try {
+                    const response = await fetch(url, options);
+                    // 409: the same Idempotency-Key is still being processed
+                    if (response.status !== 409 || attempt >= attempts) return response;
+                } catch (e) {
+                    if (attempt >= attempts) throw e;
+                }
+                await new Promise(resolve => setTimeout(resolve, 1000 * attempt));
+            }
+        }
+
+        function isRetryableStatus(status) {
+            // Anything else is final for its Idempotency-Key; the next submit needs a fresh key
+            return status === 409 || status === 429 || status >= 500;
+        }
+
         function toggleSidebar() {
             const sidebar = document.getElementById('sidebar');
             const mainContent = document.getElementById('mainContent');
@@ -2254,9 +6504,25 @@ DASHBOARD_HTML = '''
             localStorage.setItem('sidebarCollapsed', isCollapsed);
         }
 
-        function logout() {
-            if (confirm('Are you sure you want to logout?')) {
+        async function logout(everywhere = false) {
+            if (!confirm(everywhere ? 'Logout on every device?' : 'Are you sure you want to logout?')) return;
+            if (!everywhere) {
                 window.location.href = '/logout';
+                return;
+            }
+            try {
+                const response = await fetch('/logout/all', {
+                    method: 'POST',
+                    headers: {'X-CSRF-Token': window.DASHBOARD_STATE.csrfToken}
+                });
+                const data = await response.json();
+                if (!response.ok) {
+                    showToast(data.error || 'Logout failed', 'error');
+                    return;
+                }
+                window.location.href = data.redirect;
+            } catch (error) {
+                showToast('Logout failed', 'error');
             }
         }
 
@@ -2270,17 +6536,15 @@ DASHBOARD_HTML = '''
             }, 3000);
         }
 
-        // Load sidebar preference
+        // Load sidebar preference, then history once the page has painted
         window.addEventListener('load', () => {
+            if (currentUserId) setTimeout(() => loadHistory(true), 0);
             const isCollapsed = localStorage.getItem('sidebarCollapsed') === 'true';
             if (isCollapsed) {
                 document.getElementById('sidebar').classList.add('collapsed');
                 document.getElementById('mainContent').classList.add('expanded');
             }
         });
-    </script>
-</body>
-</html>
 '''
 
 # ============================================================================
@@ -2336,6 +6600,103 @@ ERROR_PAGE = '''
 </html>
 '''
 
+# ============================================================================
+# STATIC ASSETS & RESPONSE COMPRESSION
+# ============================================================================
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('text/html', 'text/css', 'application/javascript', 'application/json')
+
+def gzip_bytes(data, level):
+    """gzip-framed deflate of data"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+class StaticAsset:
+    """In-memory asset with a content fingerprint and precompressed variants"""
+    def __init__(self, name, body, mimetype):
+        self.body = body.encode('utf-8')
+        self.mimetype = mimetype
+        self.fingerprint = hashlib.sha256(self.body).hexdigest()[:16]
+        stem, ext = name.rsplit('.', 1)
+        self.filename = f"{stem}.{self.fingerprint}.{ext}"
+        self.variants = {'gzip': gzip_bytes(self.body, 9)}
+        if brotli:
+            self.variants['br'] = brotli.compress(self.body, quality=11)
+    
+    @property
+    def url(self):
+        return f"/assets/{self.filename}"
+
+def preferred_encoding(available):
+    """Best content coding the client accepts out of available ('br' before 'gzip')"""
+    accepted = request.accept_encodings
+    for encoding in ('br', 'gzip'):
+        if encoding in available and accepted.quality(encoding) > 0:
+            return encoding
+    return None
+
+STATIC_ASSETS = {
+    'dashboard.css': StaticAsset('dashboard.css', DASHBOARD_CSS, 'text/css'),
+    'dashboard.js': StaticAsset('dashboard.js', DASHBOARD_JS, 'application/javascript'),
+}
+ASSETS_BY_FILENAME = {asset.filename: asset for asset in STATIC_ASSETS.values()}
+
+# Compiled once; render_template_string would re-parse the page on every request
+dashboard_template = app.jinja_env.from_string(DASHBOARD_HTML)
+error_template = app.jinja_env.from_string(ERROR_PAGE)
+
+def render_page(template, **context):
+    app.update_template_context(context)
+    return template.render(context)
+
+@app.route('/assets/<filename>')
+def serve_asset(filename):
+    """Fingerprinted dashboard assets; the name changes with the content, so cache forever"""
+    asset = ASSETS_BY_FILENAME.get(filename)
+    if not asset:
+        return jsonify({'error': 'Not found'}), 404
+    
+    etag = f'"{asset.fingerprint}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = app.response_class(status=304)
+    else:
+        encoding = preferred_encoding(asset.variants)
+        response = app.response_class(asset.variants[encoding] if encoding else asset.body, mimetype=asset.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+@app.after_request
+def compress_response(response):
+    """gzip/brotli HTML and JSON responses for clients that accept it"""
+    if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+            or response.status_code in (204, 304) or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    
+    data = response.get_data()
+    if len(data) < config.compress_min_size:
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    encoding = preferred_encoding(('br', 'gzip') if brotli else ('gzip',))
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=config.brotli_quality))
+    elif encoding == 'gzip':
+        response.set_data(gzip_bytes(data, config.gzip_level))
+    else:
+        return response
+    response.headers['Content-Encoding'] = encoding
+    return response
+
 # ============================================================================
 # APPLICATION RUNNER
 # ============================================================================
@@ -2345,6 +6706,34 @@ def run_bot():
     print("\n🤖 Starting Discord bot...")
     bot_manager.run()
 
+def launch_shard_workers():
+    """Spawn one bot worker process per shard range; this process becomes the web tier"""
+    shard_count = config.shard_count or config.shard_workers
+    per_worker = math.ceil(shard_count / config.shard_workers)
+    children = []
+    
+    for index in range(config.shard_workers):
+        first = index * per_worker
+        last = min(first + per_worker, shard_count) - 1
+        if first > last:
+            break
+        port = config.port + 1 + index
+        env = dict(os.environ,
+            ROLE='worker',
+            SHARD_WORKERS='1',
+            SHARD_COUNT=str(shard_count),
+            SHARD_IDS=f"{first}-{last}",
+            HOST='127.0.0.1',
+            PORT=str(port),
+            WORKER_ID=f"{socket.gethostname()}:worker-{index}",
+            WORKER_URL=f"http://127.0.0.1:{port}"
+        )
+        children.append(subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env))
+        print(f"🧩 Worker {index}: shards {first}-{last} on port {port}")
+    
+    atexit.register(lambda: [child.terminate() for child in children])
+    config.role = 'web'
+
 def run_app():
     """Run Flask app"""
     print("\n🌐 Starting Flask server...")
@@ -2364,12 +6753,22 @@ if __name__ == '__main__':
     print(f"🤖 Bot User: Loading...")
     print("="*60 + "\n")
     
-    # Start bot in thread
-    bot_thread = threading.Thread(target=run_bot, daemon=True)
-    bot_thread.start()
+    if config.role == 'all' and config.shard_workers > 1:
+        launch_shard_workers()
+    
+    if config.role == 'web':
+        event_hub.start_relays()
     
-    # Give bot time to start
-    time.sleep(2)
+    if config.role != 'worker':
+        token_refresher.start()
+    
+    if config.role != 'web':
+        # Start bot in thread
+        bot_thread = threading.Thread(target=run_bot, daemon=True)
+        bot_thread.start()
+        
+        # Give bot time to start
+        time.sleep(2)
     
     # Start Flask app
     run_app()
@@ -0,0 +1,47 @@
+"""Import main.py once against a scratch directory with placeholder credentials."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TEST_ENV = {
+    'DISCORD_CLIENT_ID': 'test-client',
+    'DISCORD_CLIENT_SECRET': 'test-secret',
+    'DISCORD_BOT_TOKEN': 'test-token',
+    'FLASK_SECRET_KEY': 'test-secret-key-with-enough-length',
+    'DISCORD_REDIRECT_URI': 'http://127.0.0.1/callback',
+}
+
+
+@pytest.fixture(scope='session')
+def main():
+    # main.py opens dashboard.db in the working directory at import time
+    os.chdir(tempfile.mkdtemp(prefix='dashboard-test-'))
+    for key, value in TEST_ENV.items():
+        os.environ.setdefault(key, value)
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    import main
+    return main
+
+
+@pytest.fixture
+def db(main, tmp_path, monkeypatch):
+    """A fresh database, also installed as main.db for the code under test"""
+    database = main.Database(str(tmp_path / 'dashboard.db'))
+    monkeypatch.setattr(main, 'db', database)
+    return database
+
+
+@pytest.fixture
+def client(main, db, monkeypatch):
+    """Test client logged in as user 42, with the bot reported ready"""
+    monkeypatch.setitem(main.app.config, 'SESSION_COOKIE_SECURE', False)
+    monkeypatch.setattr(main.shard_router, 'bot_ready', lambda: True)
+    client = main.app.test_client()
+    with client.session_transaction() as s:
+        s['user_id'], s['username'], s['avatar'] = 42, 'tester', None
+    return client
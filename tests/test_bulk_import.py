@@ -0,0 +1,63 @@
+import json
+import time
+
+import pytest
+
+
+@pytest.fixture
+def clock(main, monkeypatch):
+    """Fake monotonic clock that time.sleep advances, so quota waits take no real time"""
+    now = [time.monotonic()]
+    slept = []
+    monkeypatch.setattr(main.time, 'monotonic', lambda: now[0])
+
+    def sleep(seconds):
+        slept.append(seconds)
+        now[0] += seconds
+    monkeypatch.setattr(main.time, 'sleep', sleep)
+    return slept
+
+
+@pytest.fixture
+def importer(main, db, monkeypatch):
+    monkeypatch.setattr(main, 'admission', main.AdmissionControl())
+    return main.BulkImporter(1)
+
+
+def run_import(main, db, importer, tmp_path, rows, user_id=42):
+    path = tmp_path / 'rows.jsonl'
+    path.write_text(''.join(json.dumps(row) + '\n' for row in rows))
+    job_id = f'job-{len(rows)}'
+    assert db.create_import_job(job_id, user_id, 'jsonl')
+    importer.run(job_id, user_id, 'jsonl', str(path))
+    job = dict(db.get_import_job(job_id, user_id))
+    job['errors'] = json.loads(job['errors'] or '[]')
+    return job
+
+
+def test_import_larger_than_the_default_bursts_is_paced_not_failed(main, db, importer, tmp_path, clock):
+    later = int(time.time()) + 3600
+    send_burst = main.config.quota_send_burst
+    schedule_burst = main.config.quota_schedule_burst
+    rows = ([{'guild_id': '1', 'channel_ids': ['5'], 'content': f'now {i}'} for i in range(send_burst * 2 + 7)] +
+            [{'guild_id': '1', 'channel_ids': ['5', '6'], 'content': f'later {i}', 'scheduled_time': later}
+             for i in range(schedule_burst + 11)])
+    job = run_import(main, db, importer, tmp_path, rows)
+    assert job['status'] == 'done' and job['errors'] == []
+    assert job['rows_imported'] == len(rows)
+    assert clock and all(s > 0 for s in clock)
+
+
+def test_import_within_the_burst_does_not_wait(main, db, importer, tmp_path, clock):
+    job = run_import(main, db, importer, tmp_path, [{'guild_id': '1', 'channel_ids': ['5'], 'content': 'hi'}])
+    assert job['status'] == 'done' and job['rows_imported'] == 1
+    assert clock == []
+
+
+def test_malformed_embeds_fail_their_row_only(main, db, importer, tmp_path, clock):
+    rows = [{'guild_id': '1', 'channel_ids': ['5'], 'content': 'bad', 'embeds': embeds}
+            for embeds in ({'title': 'x'}, ['a string'], 'str')]
+    rows.append({'guild_id': '1', 'channel_ids': ['5'], 'content': 'good', 'embeds': [{'title': 'ok'}]})
+    job = run_import(main, db, importer, tmp_path, rows)
+    assert job['status'] == 'done'
+    assert job['rows_imported'] == 1 and job['rows_failed'] == 3
@@ -0,0 +1,48 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+
+@pytest.fixture
+def breaker(main, db, monkeypatch):
+    breaker = main.ChannelBreaker()
+    monkeypatch.setattr(main, 'channel_breaker', breaker)
+    return breaker
+
+
+def forbidden(code, text):
+    return discord.Forbidden(SimpleNamespace(status=403, reason='Forbidden'), {'code': code, 'message': text})
+
+
+def send_refused(main, monkeypatch, error):
+    async def send(**kwargs):
+        raise error
+    channel = SimpleNamespace(id=5, guild=SimpleNamespace(id=1), send=send)
+
+    async def resolve_channel(channel_id):
+        return channel
+    monkeypatch.setattr(main.bot_manager, 'resolve_channel', resolve_channel)
+    return asyncio.run(main.bot_manager.send_to_channel(5, 'hi', None, [], None, 'bot', '1'))
+
+
+def test_missing_permissions_does_not_mark_the_channel_dead(main, breaker, monkeypatch):
+    success, error, retry_after = send_refused(main, monkeypatch, forbidden(50013, 'Missing Permissions'))
+    assert not success and retry_after is None
+    assert breaker.check(5) is None and breaker.metrics()['open'] == 0
+
+
+@pytest.mark.parametrize('code', [50001, 10003])
+def test_missing_access_or_unknown_channel_marks_it_dead(main, breaker, monkeypatch, code):
+    success, error, _ = send_refused(main, monkeypatch, forbidden(code, 'Missing Access'))
+    assert not success and error == main.ChannelBreaker.DEAD_CODES[code]
+    assert breaker.check(5) == error
+
+
+def test_probe_soon_opens_the_guild_for_a_probe(breaker):
+    breaker.failed(5, '1', 'Channel not found')
+    breaker.failed(6, '2', 'Channel not found')
+    breaker.probe_soon(1)
+    assert breaker.check(5) is None
+    assert breaker.check(6) == 'Channel not found'
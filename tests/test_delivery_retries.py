@@ -0,0 +1,45 @@
+import time
+
+
+def count(db, sql):
+    conn = db.get_connection()
+    n = conn.execute(sql).fetchone()[0]
+    conn.close()
+    return n
+
+
+def test_retries_share_the_message_payload(db):
+    embeds = [{'title': 'Launch', 'description': 'Today'}]
+    msg_id = db.save_message(7, '1', ['5', '6', '8'], 'Big news', embeds, [])
+    for channel_id in ('5', '6', '8'):
+        db.enqueue_retry(7, '1', channel_id, 'Big news', embeds, [], '503', time.time() - 1, msg_id)
+    assert count(db, 'SELECT COUNT(*) FROM message_payloads') == 1
+    assert count(db, 'SELECT COUNT(*) FROM delivery_retries WHERE content IS NOT NULL OR embed_data IS NOT NULL') == 0
+
+    retries = db.claim_due_retries('a', 300, 10)
+    assert [(r['channel_id'], r['content'], r['embed_data']) for r in retries] == [
+        (channel_id, 'Big news', '[{"title": "Launch", "description": "Today"}]') for channel_id in ('5', '6', '8')]
+
+
+def test_retry_without_a_stored_message_stores_its_payload(db):
+    db.enqueue_retry(7, '1', '5', 'Only here', [], ['a.png'], '503', time.time() - 1)
+    [retry] = db.claim_due_retries('a', 300, 10)
+    assert (retry['content'], retry['files']) == ('Only here', '["a.png"]')
+
+
+def test_dead_deliveries_show_their_content(db):
+    retry_id = db.enqueue_retry(7, '1', '5', 'Gone', [], [], '404', time.time() - 1)
+    db.claim_due_retries('a', 300, 10)
+    db.finish_retry(retry_id, 'a', 'dead', 'Unknown Channel')
+    [dead] = db.get_dead_deliveries(7)
+    assert dead['content'] == 'Gone' and dead['last_error'] == 'Unknown Channel'
+
+
+def test_rows_from_before_payload_hash_still_read(db):
+    conn = db.get_connection()
+    conn.execute('''INSERT INTO delivery_retries (user_id, guild_id, channel_id, content, embed_data, files, next_attempt_at)
+                    VALUES (7, '1', '5', 'Legacy', '[]', '[]', ?)''', (int(time.time()) - 1,))
+    conn.commit()
+    conn.close()
+    [retry] = db.claim_due_retries('a', 300, 10)
+    assert retry['content'] == 'Legacy'
@@ -0,0 +1,28 @@
+import json
+
+import pytest
+
+
+@pytest.mark.parametrize('embeds', [{'title': 'x'}, ['a string'], 'str', [{'fields': 'x', 'author': 'y'}],
+                                    [{'fields': ['z', {'name': 'n'}], 'footer': ['f']}], 5])
+def test_embed_text_skips_malformed_entries(main, embeds):
+    text = main.embed_text(json.dumps(embeds))
+    assert text in ('', 'n')
+
+
+def test_embed_text_reads_titles_fields_and_footers(main):
+    embeds = [{'title': 'Title', 'fields': [{'name': 'Name', 'value': 'Value'}], 'footer': {'text': 'Foot'}}]
+    assert main.embed_text(json.dumps(embeds)) == 'Title Foot Name Value'
+
+
+@pytest.mark.parametrize('embeds', [{'title': 'x'}, ['a string'], 'str'])
+def test_templates_reject_embeds_that_are_not_a_list_of_objects(client, db, embeds):
+    response = client.post('/api/templates', json={'name': 'Bad', 'content': 'hi', 'embeds': embeds})
+    assert response.status_code == 400
+    assert db.get_user_templates(42) == []
+
+
+def test_stored_malformed_template_still_lists_and_searches(client, db):
+    # Rows written before validation existed must not break the FTS triggers
+    db.save_template(42, 'Legacy', 'hello', ['a string'])
+    assert client.get('/api/templates').get_json()['templates'][0]['name'] == 'Legacy'
@@ -0,0 +1,93 @@
+import time
+
+import pytest
+
+
+@pytest.fixture
+def store(main, db, monkeypatch):
+    store = main.IdempotencyStore(ttl=60, max_entries=100)
+    monkeypatch.setattr(main, 'idempotency_store', store)
+    return store
+
+
+def age_keys(db, seconds):
+    conn = db.get_connection()
+    conn.execute('UPDATE idempotency_keys SET created_at = created_at - ?', (seconds,))
+    conn.commit()
+    conn.close()
+
+
+def test_new_key_then_in_progress(main, store):
+    assert store.begin(1, '/api/send', 'k', 'h') is None
+    assert store.begin(1, '/api/send', 'k', 'h') is main.IdempotencyStore.IN_PROGRESS
+
+
+def test_completed_key_replays_from_memory_and_database(main, db, store):
+    store.begin(1, '/api/send', 'k', 'h')
+    store.complete(1, '/api/send', 'k', 'h', 200, {'ok': True})
+    assert store.begin(1, '/api/send', 'k', 'h') == ('h', 200, {'ok': True})
+    # Another process only has the database row
+    other = main.IdempotencyStore(ttl=60, max_entries=100)
+    assert other.begin(1, '/api/send', 'k', 'h') == ('h', 200, {'ok': True})
+
+
+def test_keys_are_scoped_by_user_and_endpoint(store):
+    store.begin(1, '/api/send', 'k', 'h')
+    assert store.begin(2, '/api/send', 'k', 'h') is None
+    assert store.begin(1, '/api/schedule', 'k', 'h') is None
+
+
+def test_abandoned_key_can_be_reused(store):
+    store.begin(1, '/api/send', 'k', 'h')
+    store.abandon(1, '/api/send', 'k')
+    assert store.begin(1, '/api/send', 'k', 'h') is None
+
+
+def test_expired_database_row_is_a_new_request(main, db, store):
+    store.begin(1, '/api/send', 'k', 'h')
+    store.complete(1, '/api/send', 'k', 'h', 200, {'ok': True})
+    age_keys(db, 61)
+    # Whether or not the purge has run, a key past its TTL is never replayed
+    other = main.IdempotencyStore(ttl=60, max_entries=100)
+    other._purged_at = time.time()
+    assert other.begin(1, '/api/send', 'k', 'other-hash') is None
+    assert other.begin(1, '/api/send', 'k', 'other-hash') is main.IdempotencyStore.IN_PROGRESS
+
+
+def test_expired_memory_entry_falls_through(main, db, store):
+    store.begin(1, '/api/send', 'k', 'h')
+    store.complete(1, '/api/send', 'k', 'h', 200, {'ok': True})
+    key = (1, '/api/send', 'k')
+    store._entries[key] = (time.time() - 1, *store._entries[key][1:])
+    age_keys(db, 61)
+    assert store.begin(1, '/api/send', 'k', 'h') is None
+
+
+def test_cache_is_bounded(main, store):
+    store.max_entries = 3
+    for n in range(5):
+        store.begin(1, '/api/send', f'k{n}', 'h')
+    assert list(store._entries) == [(1, '/api/send', f'k{n}') for n in (2, 3, 4)]
+
+
+def test_route_replays_and_rejects_a_different_body(client, store):
+    body = {'channel_ids': ['5'], 'content': 'Later', 'scheduled_time': int(time.time()) + 3600, 'guild_id': '1'}
+    first = client.post('/api/schedule', json=body, headers={'Idempotency-Key': 'abc'})
+    assert first.status_code == 200
+    again = client.post('/api/schedule', json=body, headers={'Idempotency-Key': 'abc'})
+    assert again.headers.get('Idempotent-Replayed') == 'true'
+    assert again.get_json() == first.get_json()
+    changed = client.post('/api/schedule', json={**body, 'content': 'Other'}, headers={'Idempotency-Key': 'abc'})
+    assert changed.status_code == 422
+
+
+def test_route_releases_the_key_on_validation_errors(client, store):
+    # A rejected body can be corrected and resubmitted under the same key
+    bad = client.post('/api/schedule', json={'channel_ids': []}, headers={'Idempotency-Key': 'bad'})
+    assert bad.status_code == 400
+    body = {'channel_ids': ['5'], 'content': 'Fixed', 'scheduled_time': int(time.time()) + 3600, 'guild_id': '1'}
+    fixed = client.post('/api/schedule', json=body, headers={'Idempotency-Key': 'bad'})
+    assert fixed.status_code == 200
+    assert fixed.headers.get('Idempotent-Replayed') is None
+    assert client.post('/api/schedule', json=body,
+                       headers={'Idempotency-Key': 'bad'}).headers.get('Idempotent-Replayed') == 'true'
@@ -0,0 +1,58 @@
+import asyncio
+
+
+async def run_queue(main, jobs, concurrency=1):
+    """Start a queue on the running loop, submit (lane, factory) jobs and gather their outcomes"""
+    queue = main.OutboundQueue(concurrency)
+    queue.start(asyncio.get_running_loop())
+    futures = [queue.submit(lane, 1, factory, budget=False) for lane, factory in jobs]
+    outcomes = await asyncio.wait_for(asyncio.gather(*(asyncio.wrap_future(f) for f in futures),
+                                                     return_exceptions=True), 5)
+    return queue, outcomes
+
+
+def test_results_and_errors_reach_the_caller(main):
+    async def ok():
+        return 'sent'
+
+    async def fails():
+        raise RuntimeError('boom')
+
+    queue, outcomes = asyncio.run(run_queue(main, [('interactive', ok), ('scheduled', fails)]))
+    assert outcomes[0] == 'sent' and isinstance(outcomes[1], RuntimeError)
+    assert queue.metrics()['interactive']['completed'] == 1
+    assert queue.metrics()['scheduled']['completed'] == 1
+
+
+def test_cancelled_job_does_not_hang_its_caller(main):
+    async def cancelled():
+        raise asyncio.CancelledError()
+
+    async def ok():
+        return 'sent'
+
+    # Two senders: the one running the cancelled job stops, the other keeps draining
+    queue, outcomes = asyncio.run(run_queue(main, [('welcome', cancelled), ('welcome', ok)], concurrency=2))
+    assert isinstance(outcomes[0], asyncio.CancelledError)
+    assert outcomes[1] == 'sent'
+    assert queue.metrics()['welcome']['completed'] == 2
+
+
+def test_lanes_are_weighted(main):
+    order = []
+
+    def job(lane):
+        async def run():
+            order.append(lane)
+        return lane, run
+
+    jobs = [job('scheduled') for _ in range(3)] + [job('interactive') for _ in range(10)]
+
+    async def scenario():
+        queue = main.OutboundQueue(1)
+        futures = [queue.submit(lane, 1, factory, budget=False) for lane, factory in jobs]
+        queue.start(asyncio.get_running_loop())
+        await asyncio.wait_for(asyncio.gather(*(asyncio.wrap_future(f) for f in futures)), 5)
+
+    asyncio.run(scenario())
+    assert order[:9] == ['interactive'] * 8 + ['scheduled']
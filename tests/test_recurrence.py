@@ -0,0 +1,200 @@
+import json
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+
+def utc(*args):
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp())
+
+
+def fires(rule, after, n):
+    return [datetime.fromtimestamp(t, timezone.utc).strftime('%Y-%m-%d %H:%M') for t in rule.upcoming(after, 0, n)]
+
+
+# ---- cron fields ------------------------------------------------------------
+
+def test_ranges_steps_and_names(main):
+    cron = main.CronExpression('*/15 9-17/4 * jan,jul mon-fri')
+    assert cron.minutes == [0, 15, 30, 45]
+    assert cron.hours == [9, 13, 17]
+    assert cron.months == [1, 7]
+    assert cron.weekdays == {1, 2, 3, 4, 5}
+
+
+def test_aliases_and_sunday_as_seven(main):
+    assert main.CronExpression('@daily').next_after(datetime(2026, 5, 4, 10, 0)) == datetime(2026, 5, 5, 0, 0)
+    assert main.CronExpression('0 8 * * 7').weekdays == {0}
+
+
+@pytest.mark.parametrize('expression', ['* * * *', '60 * * * *', '* 24 * * *', '* * 0 * *', '* * * 13 *',
+                                        '5-1 * * * *', '*/0 * * * *', '* * * * 8', 'L * * * *'])
+def test_invalid_expressions(main, expression):
+    with pytest.raises(ValueError):
+        main.CronExpression(expression)
+
+
+def test_day_of_month_or_weekday(main):
+    # Both day fields restricted: the 13th or any Friday
+    cron = main.CronExpression('0 12 13 * fri')
+    moment = datetime(2026, 4, 1)
+    hits = []
+    for _ in range(5):
+        moment = cron.next_after(moment)
+        hits.append(moment.day)
+    assert hits == [3, 10, 13, 17, 24]
+
+
+def test_weekday_only_and_month_rollover(main):
+    cron = main.CronExpression('0 9 * * mon')
+    assert cron.next_after(datetime(2026, 12, 29, 10, 0)) == datetime(2027, 1, 4, 9, 0)
+
+
+def test_missing_day_rolls_into_next_matching_month(main):
+    cron = main.CronExpression('30 23 31 * *')
+    assert cron.next_after(datetime(2026, 4, 1)) == datetime(2026, 5, 31, 23, 30)
+    assert main.CronExpression('0 0 29 2 *').next_after(datetime(2026, 3, 1)) == datetime(2028, 2, 29, 0, 0)
+
+
+def test_last_day_of_month(main):
+    cron = main.CronExpression('0 18 L * *')
+    moment, hits = datetime(2027, 1, 31, 19, 0), []
+    for _ in range(4):
+        moment = cron.next_after(moment)
+        hits.append(moment.date().isoformat())
+    assert hits == ['2027-02-28', '2027-03-31', '2027-04-30', '2027-05-31']
+    assert cron.next_after(datetime(2028, 2, 1)) == datetime(2028, 2, 29, 18, 0)
+    assert main.CronExpression('0 0 1,L * *').next_after(datetime(2026, 6, 2)) == datetime(2026, 6, 30, 0, 0)
+
+
+def test_never_matching_expression(main):
+    assert main.CronExpression('0 0 31 2 *').next_after(datetime(2026, 1, 1)) is None
+
+
+# ---- rules and DST ----------------------------------------------------------
+
+def test_cron_skipped_by_dst_gap_fires_once_after_it(main):
+    rule = main.RecurrenceRule('America/New_York', cron='30 2 * * *')
+    # 02:30 does not exist on 2026-03-08; it runs an hour late that day and at 02:30 EDT after
+    assert fires(rule, utc(2026, 3, 7, 12, 0), 3) == ['2026-03-08 07:30', '2026-03-09 06:30', '2026-03-10 06:30']
+
+
+def test_cron_repeated_by_dst_overlap_fires_once(main):
+    rule = main.RecurrenceRule('America/New_York', cron='30 1 * * *')
+    assert fires(rule, utc(2026, 10, 31, 12, 0), 3) == ['2026-11-01 05:30', '2026-11-02 06:30', '2026-11-03 06:30']
+    # Asked between the two 01:30s, the second one is skipped
+    assert fires(rule, utc(2026, 11, 1, 6, 0), 1) == ['2026-11-02 06:30']
+
+
+def test_daily_interval_keeps_wall_clock_across_dst(main):
+    start = utc(2026, 3, 6, 14, 0)  # 09:00 EST
+    rule = main.RecurrenceRule('America/New_York', every=1, unit='days', start=start)
+    assert fires(rule, start - 1, 3) == ['2026-03-06 14:00', '2026-03-07 14:00', '2026-03-08 13:00']
+
+
+def test_hour_interval_is_fixed_length(main):
+    start = utc(2026, 3, 8, 5, 0)
+    rule = main.RecurrenceRule('America/New_York', every=2, unit='hours', start=start)
+    assert rule.next_fire(start) == start + 7200
+    assert rule.next_fire(start + 7199) == start + 7200
+    assert rule.next_fire(start - 10) == start
+
+
+def test_weekly_interval_from_later_point(main):
+    start = utc(2026, 1, 5, 9, 0)
+    rule = main.RecurrenceRule('UTC', every=2, unit='weeks', start=start)
+    assert fires(rule, utc(2026, 1, 20, 0, 0), 2) == ['2026-02-02 09:00', '2026-02-16 09:00']
+
+
+def test_count_and_until_end_the_series(main):
+    rule = main.RecurrenceRule('UTC', cron='0 * * * *', count=3)
+    assert rule.next_fire(utc(2026, 1, 1), occurrence=2) is not None
+    assert rule.next_fire(utc(2026, 1, 1), occurrence=3) is None
+    rule = main.RecurrenceRule('UTC', cron='0 * * * *', until=utc(2026, 1, 1, 2, 0))
+    assert fires(rule, utc(2026, 1, 1), 5) == ['2026-01-01 01:00', '2026-01-01 02:00']
+
+
+@pytest.mark.parametrize('spec', [
+    {'cron': '0 * * * *', 'every': 1, 'unit': 'days'},
+    {'every': 1, 'unit': 'fortnights'},
+    {'every': 1, 'unit': 'minutes'},
+    {'cron': '0 * * * *', 'timezone': 'Mars/Olympus'},
+    {'cron': '0 * * * *', 'count': 0},
+    {'cron': '0 * * * *', 'colour': 'red'},
+    'daily',
+])
+def test_invalid_rules(main, spec):
+    with pytest.raises(ValueError):
+        main.RecurrenceRule.parse(spec)
+
+
+# The last one is 23:59 then 00:00 the next day
+@pytest.mark.parametrize('cron', ['* * * * *', '*/2 * * * *', '0,4 9 * * *', '0,59 0,23 * * *'])
+def test_cron_more_frequent_than_the_minimum_is_rejected(main, cron):
+    with pytest.raises(ValueError, match='more often'):
+        main.RecurrenceRule('UTC', cron=cron)
+
+
+@pytest.mark.parametrize('cron', ['*/5 * * * *', '0,5 9 * * *', '55 23 * * *', '@hourly'])
+def test_cron_at_the_minimum_is_accepted(main, cron):
+    assert main.RecurrenceRule('UTC', cron=cron).cron.min_gap() >= main.config.recurrence_min_interval
+
+
+def test_rule_round_trips_through_json(main):
+    rule = main.RecurrenceRule.parse({'timezone': 'Europe/Berlin', 'cron': '0  9 * *  mon', 'count': 4})
+    assert main.RecurrenceRule.parse(json.loads(rule.to_json())).to_json() == rule.to_json()
+
+
+# ---- next occurrence materialization ----------------------------------------
+
+def claim(db, owner='worker-a'):
+    return db.claim_pending_messages(owner, 300, 10)
+
+
+def test_release_materializes_the_next_occurrence(main, db):
+    now = int(time.time())
+    rule = main.RecurrenceRule('UTC', cron='0 * * * *')
+    series_id = db.save_message(7, '1', ['5'], 'Hourly', [], [], now - 1, rule.to_json())
+    [msg] = claim(db)
+    next_time = main.DiscordBot.next_occurrence(msg)
+    assert next_time == rule.next_fire(now)
+
+    assert db.release_message(msg['id'], 'worker-a', 'sent', now, next_time)
+    conn = db.get_connection()
+    rows = conn.execute('SELECT * FROM messages WHERE series_id = ? ORDER BY id', (series_id,)).fetchall()
+    conn.close()
+    assert [(r['status'], r['occurrence']) for r in rows] == [('sent', 1), ('pending', 2)]
+    assert rows[1]['scheduled_time'] == next_time
+    assert rows[1]['payload_hash'] == rows[0]['payload_hash']
+    assert rows[1]['recurrence'] == rows[0]['recurrence']
+
+
+def test_release_without_the_lease_does_not_materialize(main, db):
+    now = int(time.time())
+    db.save_message(7, '1', ['5'], 'Hourly', [], [], now - 1, main.RecurrenceRule('UTC', cron='0 * * * *').to_json())
+    [msg] = claim(db)
+    assert not db.release_message(msg['id'], 'worker-b', 'sent', now, now + 3600)
+    conn = db.get_connection()
+    assert conn.execute('SELECT COUNT(*) FROM messages').fetchone()[0] == 1
+    conn.close()
+
+
+def test_cancelled_series_stops_materializing(main, db):
+    now = int(time.time())
+    series_id = db.save_message(7, '1', ['5'], 'Hourly', [], [], now - 1,
+                                main.RecurrenceRule('UTC', cron='0 * * * *').to_json())
+    [msg] = claim(db)
+    assert db.cancel_series(series_id, 7)
+    assert db.release_message(msg['id'], 'worker-a', 'sent', now, now + 3600)
+    conn = db.get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM messages WHERE status = 'pending'").fetchone()[0] == 0
+    conn.close()
+
+
+def test_count_limited_series_ends(main, db):
+    now = int(time.time())
+    db.save_message(7, '1', ['5'], 'Twice', [], [], now - 1,
+                    main.RecurrenceRule('UTC', cron='0 * * * *', count=1).to_json())
+    [msg] = claim(db)
+    assert main.DiscordBot.next_occurrence(msg) is None
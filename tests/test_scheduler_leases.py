@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+
+def due(db, n=1, guild_id='1'):
+    now = int(time.time())
+    return [db.save_message(7, guild_id, ['5'], f'Due {i}', [], [], now - 1) for i in range(n)]
+
+
+def expire_leases(db):
+    conn = db.get_connection()
+    conn.execute("UPDATE messages SET lease_expires = ? WHERE status = 'in_flight'", (int(time.time()) - 1,))
+    conn.commit()
+    conn.close()
+
+
+def test_claim_is_exclusive(db):
+    due(db, 3)
+    first = db.claim_pending_messages('a', 300, 2)
+    second = db.claim_pending_messages('b', 300, 10)
+    assert len(first) == 2 and len(second) == 1
+    assert not {m['id'] for m in first} & {m['id'] for m in second}
+    assert db.claim_pending_messages('c', 300, 10) == []
+
+
+def test_future_rows_are_not_claimed(db):
+    db.save_message(7, '1', ['5'], 'Later', [], [], int(time.time()) + 3600)
+    assert db.claim_pending_messages('a', 300, 10) == []
+
+
+def test_expired_lease_is_reclaimed_and_loser_cannot_release(db):
+    [msg_id] = due(db)
+    db.claim_pending_messages('a', 300, 10)
+    expire_leases(db)
+    [row] = db.claim_pending_messages('b', 300, 10)
+    assert row['id'] == msg_id and row['lease_owner'] == 'b'
+    assert not db.release_message(msg_id, 'a', 'sent', int(time.time()))
+    assert db.release_message(msg_id, 'b', 'sent', int(time.time()))
+
+
+def test_renewal_keeps_the_lease(db):
+    ids = due(db, 2)
+    db.claim_pending_messages('a', 1, 10)
+    expire_leases(db)
+    assert db.renew_message_leases(ids, 'a', 300) == 2
+    assert db.claim_pending_messages('b', 300, 10) == []
+    # Released and foreign rows are left alone
+    db.release_message(ids[0], 'a', 'sent', int(time.time()))
+    assert db.renew_message_leases(ids, 'a', 300) == 1
+    assert db.renew_message_leases(ids, 'b', 300) == 0
+
+
+def test_claim_respects_shards(db):
+    shard_one_guild = str((1 << 22) | 5)  # (id >> 22) % 2 == 1
+    due(db, 1, guild_id=shard_one_guild)
+    due(db, 1, guild_id=None)
+    assert [m['guild_id'] for m in db.claim_pending_messages('a', 300, 10, 2, [1])] == [shard_one_guild]
+    assert [m['guild_id'] for m in db.claim_pending_messages('b', 300, 10, 2, [0])] == [None]
+
+
+def test_delivery_reports_a_lost_lease(main, db, monkeypatch):
+    bot = main.bot_manager
+    [msg_id] = due(db)
+    [msg] = db.claim_pending_messages(main.config.worker_id, 300, 10)
+    expire_leases(db)
+    db.claim_pending_messages('another-worker', 300, 10)
+
+    async def broadcast(lane, user_key, channel_ids, *args, **kwargs):
+        return [(channel_id, (True, 'Message sent successfully', None)) for channel_id in channel_ids]
+    monkeypatch.setattr(bot, 'broadcast', broadcast)
+    monkeypatch.setitem(bot.scheduler_stats, 'leases_lost', 0)
+    asyncio.run(bot.deliver_scheduled(msg))
+    assert bot.scheduler_stats['leases_lost'] == 1
+    assert db.get_message(msg_id, 7)['lease_owner'] == 'another-worker'
+
+
+def test_leases_are_renewed_while_a_batch_is_delivering(main, db, monkeypatch):
+    bot = main.bot_manager
+    ids = due(db, 2)
+    monkeypatch.setattr(main.config, 'scheduler_lease_seconds', 3)
+    db.claim_pending_messages(main.config.worker_id, 3, 10)
+    monkeypatch.setitem(bot.scheduler_stats, 'lease_renewals', 0)
+
+    async def slow_batch():
+        renewer = asyncio.create_task(bot.renew_leases(ids))
+        await asyncio.sleep(1.3)
+        renewer.cancel()
+    asyncio.run(slow_batch())
+    assert bot.scheduler_stats['lease_renewals'] == 2
+    conn = db.get_connection()
+    expires = [r[0] for r in conn.execute('SELECT lease_expires FROM messages')]
+    conn.close()
+    assert all(e >= int(time.time()) + 1 for e in expires)
@@ -0,0 +1,99 @@
+import time
+
+import pytest
+
+
+@pytest.fixture
+def store(main, db):
+    return main.SessionStore(max_entries=100, hot_ttl=30)
+
+
+def rows(db):
+    conn = db.get_connection()
+    result = conn.execute('SELECT * FROM sessions').fetchall()
+    conn.close()
+    return result
+
+
+def test_round_trip_and_hashed_key(main, db, store):
+    store.save('sid-1', {'user_id': 1, 'username': 'a'}, time.time() + 60)
+    data, expires_at = store.get('sid-1')
+    assert data == {'user_id': 1, 'username': 'a'}
+    [row] = rows(db)
+    assert row['id'] != 'sid-1' and row['id'] == main.SessionStore.key('sid-1')
+    assert store.get('sid-2') is None
+
+
+def test_hot_tier_serves_repeat_reads(store):
+    store.save('sid', {'user_id': 1}, time.time() + 60)
+    store.get('sid')
+    store.get('sid')
+    assert store.stats == {'hits': 2, 'misses': 0}
+
+
+def test_revocation_elsewhere_is_seen_after_hot_ttl(main, db, store):
+    store.save('sid', {'user_id': 1}, time.time() + 60)
+    other_process = main.SessionStore(max_entries=100, hot_ttl=30)
+    other_process.revoke_user(1)
+    assert store.get('sid') is not None  # still trusted within hot_ttl
+    store.hot_ttl = 0
+    assert store.get('sid') is None
+
+
+def test_expired_sessions_are_refused(store):
+    store.save('sid', {'user_id': 1}, time.time() - 1)
+    assert store.get('sid') is None
+    store.hot_ttl = 0
+    assert store.get('sid') is None
+
+
+def test_touch_extends_without_rewriting(db, store):
+    store.save('sid', {'user_id': 1}, time.time() + 60)
+    store.touch('sid', time.time() + 3600)
+    store.hot_ttl = 0
+    data, expires_at = store.get('sid')
+    assert data == {'user_id': 1} and expires_at > time.time() + 3000
+
+
+def test_revoke_user_ends_every_session(store):
+    for sid in ('a', 'b', 'c'):
+        store.save(sid, {'user_id': 1}, time.time() + 60)
+    store.save('d', {'user_id': 2}, time.time() + 60)
+    assert store.revoke_user(1) == 3
+    assert [store.get(sid) for sid in 'abc'] == [None] * 3
+    assert store.get('d') is not None
+
+
+def test_hot_tier_is_bounded(store):
+    store.max_entries = 2
+    for sid in ('a', 'b', 'c'):
+        store.save(sid, {'user_id': 1}, time.time() + 60)
+    assert store.metrics()['hot'] == 2
+    assert store.get('a') is not None  # evicted from memory, still in the database
+    assert store.stats['misses'] == 1
+
+
+def test_cookie_carries_only_an_opaque_id(main, client):
+    cookie = client.get_cookie(main.app.config['SESSION_COOKIE_NAME'])
+    assert cookie and 'tester' not in cookie.value and len(cookie.value) < 64
+    response = client.get('/api/history')
+    assert response.status_code == 200
+    assert 'Set-Cookie' not in response.headers
+
+
+def test_regenerate_drops_the_old_id(main, store):
+    session = main.ServerSession({'user_id': 1}, 'planted', time.time() + 60)
+    store.save('planted', dict(session), time.time() + 60)
+    main.ServerSessionInterface(store).regenerate(session)
+    assert session.sid is None and session.modified
+    assert store.get('planted') is None
+
+
+def test_logout_everywhere_needs_post_and_csrf(main, client):
+    assert client.get('/logout/all').status_code == 405
+    assert client.post('/logout/all').status_code == 403
+    with client.session_transaction() as s:
+        token = s['csrf_token'] = 'token'
+    response = client.post('/logout/all', headers={'X-CSRF-Token': token})
+    assert response.status_code == 200 and response.get_json()['redirect'] == '/login'
+    assert client.get('/api/history').status_code == 401
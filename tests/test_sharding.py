@@ -0,0 +1,16 @@
+from types import SimpleNamespace
+
+
+def owned_shards(main, monkeypatch, bot):
+    monkeypatch.setattr(main.bot_manager, 'bot', bot)
+    return main.bot_manager.owned_shards()
+
+
+def test_unsharded_bot_owns_shard_zero(main, monkeypatch):
+    # commands.Bot has shard_count but no shard_ids attribute at all
+    assert owned_shards(main, monkeypatch, SimpleNamespace(shard_count=None)) == (1, [0])
+
+
+def test_auto_sharded_bot_owns_its_shard_ids(main, monkeypatch):
+    assert owned_shards(main, monkeypatch, SimpleNamespace(shard_count=4, shard_ids=[2, 3])) == (4, [2, 3])
+    assert owned_shards(main, monkeypatch, SimpleNamespace(shard_count=4, shard_ids=None)) == (4, [0, 1, 2, 3])
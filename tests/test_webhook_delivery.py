@@ -0,0 +1,59 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+
+@pytest.fixture
+def channel(main, db, monkeypatch):
+    """Text channel whose bot sends are recorded; manage_webhooks is switchable per test"""
+    sent = []
+
+    async def send(**kwargs):
+        sent.append(kwargs)
+    channel = SimpleNamespace(id=5, guild=SimpleNamespace(id=1, me=object()), send=send, sent=sent,
+                              manage_webhooks=True, create_webhook=None)
+    channel.permissions_for = lambda member: SimpleNamespace(manage_webhooks=channel.manage_webhooks)
+
+    async def resolve_channel(channel_id):
+        return channel
+    monkeypatch.setattr(main.bot_manager, 'resolve_channel', resolve_channel)
+    monkeypatch.setattr(main, 'channel_breaker', main.ChannelBreaker())
+    monkeypatch.setattr(main, 'webhook_delivery', main.WebhookDelivery())
+    return channel
+
+
+def webhook_fails(main, monkeypatch, error):
+    calls = []
+
+    async def send(channel, bot, prepared, files):
+        calls.append(channel.id)
+        raise error
+    monkeypatch.setattr(main.webhook_delivery, 'send', send)
+    return calls
+
+
+def deliver(main):
+    return asyncio.run(main.bot_manager.send_to_channel(5, 'hi', None, [], None, 'webhook', '1'))
+
+
+def test_no_answer_from_the_webhook_is_retried_not_resent_by_the_bot(main, channel, monkeypatch):
+    calls = webhook_fails(main, monkeypatch, asyncio.TimeoutError())
+    success, _, retry_after = deliver(main)
+    assert calls == [5] and channel.sent == []
+    assert not success and retry_after == 0
+
+
+def test_webhook_error_from_discord_falls_back_to_the_bot(main, channel, monkeypatch):
+    webhook_fails(main, monkeypatch, discord.HTTPException(SimpleNamespace(status=400, reason='Bad'), 'bad'))
+    success, message, _ = deliver(main)
+    assert success and message == 'Message sent successfully'
+    assert len(channel.sent) == 1
+
+
+def test_without_manage_webhooks_the_bot_sends(main, channel, monkeypatch):
+    calls = webhook_fails(main, monkeypatch, AssertionError('webhook used'))
+    channel.manage_webhooks = False
+    success, message, _ = deliver(main)
+    assert success and calls == [] and len(channel.sent) == 1